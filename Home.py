@@ -1,11 +1,35 @@
-# Import Libraries
+# Import Libraries - only the light ones: pandas, plotly and the data layer are
+# imported by the warm-up in the background, so the home page never waits for them
 import streamlit as st
 
+from netflix.diagnostics import is_diagnostics_requested
+from netflix.metrics import set_current_page
+from netflix.warmup import is_warmed_up
+
 # -------------------------------------------------------------------------------------------------
 # Page Configuration
 st.set_page_config(
     page_title="Netflix Content Trend Analysisl", page_icon=":tv:", layout="wide"
 )
+# The first run of the server process starts the warm-up of the other pages
+set_current_page("home", pin_dataset=False)
+
+# The timings, cache hit rates and memory of the server process are shown at
+# /?diagnostics instead of the home page
+if is_diagnostics_requested():
+    from netflix.diagnostics import render_diagnostics
+
+    render_diagnostics()
+    st.stop()
+
+# Show the version of the dataset served once the warm-up has loaded it - it
+# changes when the data file is reloaded
+if is_warmed_up():
+    from netflix.reload import begin_dataset_run
+    from netflix.sidebar import render_dataset_version
+
+    begin_dataset_run()
+    render_dataset_version()
 
 # -------------------------------------------------------------------------------------------------
 # Page Title
@@ -0,0 +1,4 @@
+# Shared data layer for the Netflix Content Trend Analysis web app.
+#
+# The Streamlit pages under `pages/` import from this package instead of
+# reading the CSV files themselves.
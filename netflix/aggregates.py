@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from netflix.filters import CatalogFilter
+from netflix.loader import get_dataset_version, get_live_dataset_versions
+from netflix.metrics import record_cache_access, timed
+from netflix.schema import UNKNOWN
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Dimensions of the count cube - every combination present in the catalog is one row
+CUBE_DIMENSIONS = ["type", "release_year", "year_added", "rating"]
+COUNT_COLUMN = "count"
+
+# Number of count cubes of filtered catalogs kept in memory
+MAX_CACHED_CUBES = 32
+
+# Process-wide cache - the count cube per dataset version and active filter
+_lock = threading.Lock()
+_count_cubes: "OrderedDict[Tuple[str, Optional[CatalogFilter]], pd.DataFrame]" = (
+    OrderedDict()
+)
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to count the titles of every (type, release_year, year_added, rating) combination
+#
+# Titles without a year_added are kept, so summing the cube over any dimension
+# gives the same totals as counting the rows of the catalog.
+def build_count_cube(netflix_data: pd.DataFrame) -> pd.DataFrame:
+    count_cube = (
+        netflix_data.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+        .size()
+        .rename(COUNT_COLUMN)
+        .reset_index()
+    )
+    count_cube[COUNT_COLUMN] = count_cube[COUNT_COLUMN].astype("int64")
+    return count_cube
+
+
+# Function to get the shared count cube of the current dataset version
+#
+# With an active filter the cube only counts the titles kept by the filter. The
+# cubes of the most recent filters are cached.
+def get_count_cube(catalog_filter: Optional[CatalogFilter] = None) -> pd.DataFrame:
+    if catalog_filter is not None and not catalog_filter.is_active():
+        catalog_filter = None
+    dataset_version = get_dataset_version()
+    key = (dataset_version, catalog_filter)
+    count_cube = _count_cubes.get(key)
+    record_cache_access("count_cube", count_cube is not None)
+    if count_cube is not None:
+        return count_cube
+
+    with _lock:
+        if key not in _count_cubes:
+            # Drop the cubes of retired dataset versions
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _count_cubes if k[0] not in live_versions]:
+                del _count_cubes[old_key]
+
+            # The cube is counted by the query backend - see netflix.backends
+            from netflix.backends import get_query_backend
+
+            _count_cubes[key] = get_query_backend().get_count_cube(catalog_filter)
+            if len(_count_cubes) > MAX_CACHED_CUBES:
+                # Evict the oldest cube of a filtered catalog, never the full one
+                oldest_key = next(k for k in _count_cubes if k[1] is not None)
+                del _count_cubes[oldest_key]
+    return _count_cubes[key]
+
+
+# Function to get the number of titles per value of a dimension and type, in long format
+#
+# The rows (dimension, type, count) are the bar heights of a histogram - see
+# netflix.charts.build_count_histogram.
+@timed("aggregate")
+def get_counts(
+    dimension: str, catalog_filter: Optional[CatalogFilter] = None
+) -> pd.DataFrame:
+    return sum_count_cube(get_count_cube(catalog_filter), dimension)
+
+
+# Function to get the number of titles per value of a dimension, one column per type
+#
+# Same table as netflix_data.pivot_table(index=dimension, columns="type",
+# aggfunc="count", values="show_id") - missing combinations are NaN. There is
+# always one column per type, even if a filter leaves no title of that type.
+@timed("aggregate")
+def get_counts_by_type(
+    dimension: str, catalog_filter: Optional[CatalogFilter] = None
+) -> pd.DataFrame:
+    return pivot_counts_by_type(get_counts(dimension, catalog_filter), dimension)
+
+
+# Function to sum a count cube over every dimension but one and the type
+#
+# The titles without a value of the dimension, e.g. the ones with an unknown
+# year_added, are kept in a last UNKNOWN bin, so the counts add up to the number
+# of titles. The values are then labels (strings) rather than numbers.
+def sum_count_cube(count_cube: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    counts = (
+        count_cube.groupby([dimension, "type"], observed=True, dropna=False)[
+            COUNT_COLUMN
+        ]
+        .sum()
+        .reset_index()
+    )
+    if counts[dimension].isna().any():
+        counts[dimension] = counts[dimension].astype("string").fillna(UNKNOWN)
+    return counts
+
+
+# Function to pivot the counts of a dimension (see get_counts) to one column per type
+def pivot_counts_by_type(counts: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    counts_by_type = counts.pivot(index=dimension, columns="type", values=COUNT_COLUMN)
+    return counts_by_type.reindex(columns=counts["type"].cat.categories)
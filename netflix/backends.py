@@ -0,0 +1,531 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.aggregates import COUNT_COLUMN, CUBE_DIMENSIONS, build_count_cube
+from netflix.explorer import get_page
+from netflix.filters import CatalogFilter, apply_filter
+from netflix.loader import (
+    get_dataset_file,
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.schema import ALL_COLUMNS, CATALOG_COLUMNS, apply_schema, validate_columns
+from netflix.snapshot import get_snapshot_path, is_snapshot_fresh
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+QUERY_BACKENDS = ["pandas", "duckdb", "polars"]
+
+# Engine running the queries of the pages - set the environment variable
+# NETFLIX_QUERY_BACKEND to one of QUERY_BACKENDS. The DuckDB and Polars engines
+# scan the memory-mapped snapshot instead of the DataFrames loaded in memory, and
+# fall back to pandas when the engine is not installed or there is no snapshot.
+QUERY_BACKEND = os.environ.get("NETFLIX_QUERY_BACKEND", "pandas")
+
+# Columns a filter is evaluated on, per dimension of CatalogFilter
+FILTER_DIMENSION_COLUMNS = {
+    "types": "type",
+    "countries": "country",
+    "genres": "listed_in",
+    "ratings": "rating",
+    "release_years": "release_year",
+    "years_added": "year_added",
+}
+LIST_DIMENSIONS = ["countries", "genres"]
+RANGE_DIMENSIONS = ["release_years", "years_added"]
+ROW_ID_COLUMN = "row_id"
+
+# Columns the titles are counted by per day - see netflix.growth
+DAILY_COUNT_COLUMNS = ["type", "date_added"]
+
+logger = logging.getLogger(__name__)
+
+# Process-wide cache - the query backend per dataset version
+_lock = threading.Lock()
+_backends: Dict[Tuple[str, str], "QueryBackend"] = {}
+
+
+# -------------------------------------------------------------------------------------------------
+# Queries of the pages, run by an interchangeable engine
+#
+# Every query returns pandas objects typed as per CATALOG_SCHEMA, whatever the
+# engine, so the pages and charts do not depend on it.
+class QueryBackend(ABC):
+    name = "base"
+
+    # Function to get the count cube of the titles kept by a filter (see build_count_cube)
+    @abstractmethod
+    def get_count_cube(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        raise NotImplementedError
+
+    # Function to get the number of titles added on every day, per type, kept by a filter
+    #
+    # One row per (type, date_added) - the titles without a date_added are
+    # counted under NaT.
+    @abstractmethod
+    def get_daily_counts(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        raise NotImplementedError
+
+    # Function to get the (release_year, duration) of the titles of a type kept by a filter
+    @abstractmethod
+    def get_durations(
+        self,
+        content_type: str,
+        duration_column: str,
+        catalog_filter: Optional[CatalogFilter] = None,
+    ) -> pd.DataFrame:
+        raise NotImplementedError
+
+    # Function to get the durations that could not be parsed into a number
+    @abstractmethod
+    def get_malformed_durations(self) -> pd.Series:
+        raise NotImplementedError
+
+    # Function to get the number of titles of the catalog
+    @abstractmethod
+    def get_row_count(self) -> int:
+        raise NotImplementedError
+
+    # Function to get one page of rows, optionally sorted and projected (see get_page)
+    @abstractmethod
+    def get_page(
+        self,
+        page_number: int,
+        page_size: int,
+        columns: Optional[Sequence[str]] = None,
+        sort_by: Optional[str] = None,
+        ascending: bool = True,
+    ) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+# Eager pandas queries on the shared DataFrames and their cached filter masks
+class PandasBackend(QueryBackend):
+    name = "pandas"
+
+    def get_count_cube(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        netflix_data = get_netflix_data(CUBE_DIMENSIONS)
+        return build_count_cube(apply_filter(netflix_data, catalog_filter))
+
+    def get_daily_counts(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        netflix_data = apply_filter(
+            get_netflix_data(DAILY_COUNT_COLUMNS), catalog_filter
+        )
+        daily_counts = (
+            netflix_data.groupby(DAILY_COUNT_COLUMNS, observed=True, dropna=False)
+            .size()
+            .rename(COUNT_COLUMN)
+            .reset_index()
+        )
+        daily_counts[COUNT_COLUMN] = daily_counts[COUNT_COLUMN].astype("int64")
+        return daily_counts
+
+    def get_durations(
+        self,
+        content_type: str,
+        duration_column: str,
+        catalog_filter: Optional[CatalogFilter] = None,
+    ) -> pd.DataFrame:
+        netflix_data = apply_filter(
+            get_netflix_data(["type", "release_year", duration_column]),
+            catalog_filter,
+        )
+        is_type = netflix_data["type"] == content_type
+        is_type &= netflix_data[duration_column].notna()
+        return netflix_data.loc[is_type, ["release_year", duration_column]]
+
+    def get_malformed_durations(self) -> pd.Series:
+        from netflix.schema import get_malformed_durations
+
+        return get_malformed_durations(
+            get_netflix_data(["duration", "duration_minutes", "season_count"])
+        )
+
+    def get_row_count(self) -> int:
+        return len(get_netflix_data())
+
+    def get_page(
+        self,
+        page_number: int,
+        page_size: int,
+        columns: Optional[Sequence[str]] = None,
+        sort_by: Optional[str] = None,
+        ascending: bool = True,
+    ) -> pd.DataFrame:
+        return get_page(
+            get_netflix_data(), page_number, page_size, columns, sort_by, ascending
+        )
+
+
+# Function to quote column names in SQL - some are keywords, e.g. cast
+def _quote(columns: Sequence[str]) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+# Function to get the SQL condition of a filter and its parameters
+def _get_sql_condition(catalog_filter: Optional[CatalogFilter]) -> Tuple[str, list]:
+    conditions: List[str] = []
+    parameters: list = []
+    if catalog_filter is None:
+        return "TRUE", parameters
+    for dimension, selected in vars(catalog_filter).items():
+        if not selected:
+            continue
+        column = FILTER_DIMENSION_COLUMNS[dimension]
+        if dimension in LIST_DIMENSIONS:
+            conditions.append(
+                f"list_has_any(regexp_split_to_array(CAST({column} AS VARCHAR), "
+                r"'\s*,\s*'), ?::VARCHAR[])"
+            )
+            parameters.append([term.strip() for term in selected])
+        elif dimension in RANGE_DIMENSIONS:
+            conditions.append(f"{column} BETWEEN ? AND ?")
+            parameters.extend(selected)
+        else:
+            conditions.append(f"list_contains(?::VARCHAR[], CAST({column} AS VARCHAR))")
+            parameters.append(list(selected))
+    return " AND ".join(conditions) or "TRUE", parameters
+
+
+# Function to read the memory-mapped table of the snapshot of the data file (None if stale)
+def _read_snapshot_table(csv_path: Path):
+    import pyarrow as pa
+
+    snapshot_path = get_snapshot_path(csv_path)
+    if not snapshot_path.exists():
+        return None
+    reader = pa.ipc.open_file(pa.memory_map(str(snapshot_path), "r"))
+    if not is_snapshot_fresh(reader.schema.metadata or {}, csv_path):
+        return None
+    if not all(column in reader.schema.names for column in ALL_COLUMNS):
+        return None
+    return reader.read_all()
+
+
+# Queries on the memory-mapped snapshot of the data file, run by another engine
+#
+# The results are typed as the pandas ones - categorical columns get every
+# category of the snapshot, in the same order, even the ones no row has.
+class SnapshotBackend(QueryBackend):
+    def __init__(self, table) -> None:
+        import pyarrow as pa
+
+        self._row_count = table.num_rows
+        self._dtypes: Dict[str, pd.CategoricalDtype] = {}
+        for field in table.schema:
+            if pa.types.is_dictionary(field.type):
+                categories: Dict[str, None] = {}
+                for chunk in table.column(field.name).chunks:
+                    categories.update(dict.fromkeys(chunk.dictionary.to_pylist()))
+                self._dtypes[field.name] = pd.CategoricalDtype(list(categories))
+
+    # Function to type some columns returned by the engine as per CATALOG_SCHEMA
+    def _to_frame(self, frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        frame = frame.copy()
+        for column in columns:
+            if column in self._dtypes:
+                frame[column] = (
+                    frame[column].astype(object).astype(self._dtypes[column])
+                )
+        return apply_schema(frame, columns)[columns]
+
+    # Function to type the count cube returned by the engine as the pandas one
+    def _to_count_cube(self, count_cube: pd.DataFrame) -> pd.DataFrame:
+        typed_cube = self._to_frame(count_cube, CUBE_DIMENSIONS)
+        typed_cube[COUNT_COLUMN] = count_cube[COUNT_COLUMN].astype("int64")
+        return typed_cube
+
+    # Function to type the daily counts returned by the engine as the pandas ones
+    def _to_daily_counts(self, daily_counts: pd.DataFrame) -> pd.DataFrame:
+        typed_counts = self._to_frame(daily_counts, DAILY_COUNT_COLUMNS)
+        typed_counts[COUNT_COLUMN] = daily_counts[COUNT_COLUMN].astype("int64")
+        return typed_counts
+
+    # Function to type a page of rows returned by the engine, indexed by row position
+    def _to_page(self, page: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        typed_page = self._to_frame(page, columns)
+        typed_page.index = pd.Index(page[ROW_ID_COLUMN].to_numpy(dtype=np.int64))
+        return typed_page
+
+    def get_row_count(self) -> int:
+        return self._row_count
+
+
+# SQL queries run by DuckDB on the memory-mapped snapshot
+#
+# DuckDB scans the Arrow buffers of the snapshot in place, with the projection
+# and the filters pushed down, so only the pages of the columns a query reads
+# are brought in memory.
+class DuckDbBackend(SnapshotBackend):
+    name = "duckdb"
+
+    def __init__(self, table) -> None:
+        import duckdb
+        import pyarrow as pa
+
+        super().__init__(table)
+        self._database = duckdb.connect()
+        # The row position breaks ties of sorts, the same way a stable sort does
+        self._table = table.append_column(
+            ROW_ID_COLUMN, pa.array(np.arange(table.num_rows, dtype=np.int64))
+        )
+
+    # Function to run a query on the snapshot, registered as the view catalog
+    def _query(self, sql: str, parameters: Optional[list] = None) -> pd.DataFrame:
+        # A cursor per query, as a DuckDB connection is not thread-safe
+        cursor = self._database.cursor()
+        try:
+            cursor.register("catalog", self._table)
+            return cursor.execute(sql, parameters or []).df()
+        finally:
+            cursor.close()
+
+    def get_count_cube(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        condition, parameters = _get_sql_condition(catalog_filter)
+        dimensions = ", ".join(CUBE_DIMENSIONS)
+        count_cube = self._query(
+            f"SELECT {dimensions}, COUNT(*) AS {COUNT_COLUMN} FROM catalog "
+            f"WHERE {condition} GROUP BY {dimensions} ORDER BY {dimensions}",
+            parameters,
+        )
+        return self._to_count_cube(count_cube)
+
+    def get_daily_counts(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        condition, parameters = _get_sql_condition(catalog_filter)
+        dimensions = ", ".join(DAILY_COUNT_COLUMNS)
+        daily_counts = self._query(
+            f"SELECT {dimensions}, COUNT(*) AS {COUNT_COLUMN} FROM catalog "
+            f"WHERE {condition} GROUP BY {dimensions} ORDER BY {dimensions}",
+            parameters,
+        )
+        return self._to_daily_counts(daily_counts)
+
+    def get_durations(
+        self,
+        content_type: str,
+        duration_column: str,
+        catalog_filter: Optional[CatalogFilter] = None,
+    ) -> pd.DataFrame:
+        validate_columns([duration_column])
+        condition, parameters = _get_sql_condition(catalog_filter)
+        durations = self._query(
+            f"SELECT release_year, {duration_column} FROM catalog "
+            f"WHERE {condition} AND CAST(type AS VARCHAR) = ? "
+            f"AND {duration_column} IS NOT NULL",
+            parameters + [content_type],
+        )
+        return self._to_frame(durations, ["release_year", duration_column])
+
+    def get_malformed_durations(self) -> pd.Series:
+        durations = self._query(
+            "SELECT duration FROM catalog WHERE duration_minutes IS NULL "
+            "AND season_count IS NULL"
+        )
+        return self._to_frame(durations, ["duration"])["duration"]
+
+    def get_page(
+        self,
+        page_number: int,
+        page_size: int,
+        columns: Optional[Sequence[str]] = None,
+        sort_by: Optional[str] = None,
+        ascending: bool = True,
+    ) -> pd.DataFrame:
+        columns = list(columns or CATALOG_COLUMNS)
+        validate_columns(columns + ([sort_by] if sort_by else []))
+        start = (page_number - 1) * page_size
+        selected_columns = _quote([ROW_ID_COLUMN] + columns)
+        if sort_by is None:
+            # A range of row positions - pushed down to the scan, nothing is sorted
+            page = self._query(
+                f"SELECT {selected_columns} FROM catalog "
+                f"WHERE {ROW_ID_COLUMN} >= ? AND {ROW_ID_COLUMN} < ? "
+                f"ORDER BY {ROW_ID_COLUMN}",
+                [start, start + page_size],
+            )
+        else:
+            direction = "ASC" if ascending else "DESC"
+            page = self._query(
+                f"SELECT {selected_columns} FROM catalog ORDER BY "
+                f"{_quote([sort_by])} {direction} NULLS LAST, {ROW_ID_COLUMN} "
+                "LIMIT ? OFFSET ?",
+                [page_size, start],
+            )
+        return self._to_page(page, columns)
+
+
+# Lazy Polars queries on the memory-mapped snapshot
+#
+# Every query is a lazy frame scanning the snapshot, so Polars pushes the
+# projection and the filters down to the scan and only reads what it needs.
+class PolarsBackend(SnapshotBackend):
+    name = "polars"
+
+    def __init__(self, table, snapshot_path: Path) -> None:
+        import polars as pl
+
+        super().__init__(table)
+        self._catalog = pl.scan_ipc(snapshot_path)
+
+    # Function to get the lazy frame of the titles kept by a filter
+    def _filter(self, catalog_filter: Optional[CatalogFilter]):
+        import polars as pl
+
+        catalog = self._catalog
+        if catalog_filter is None:
+            return catalog
+        for dimension, selected in vars(catalog_filter).items():
+            if not selected:
+                continue
+            column = pl.col(FILTER_DIMENSION_COLUMNS[dimension])
+            if dimension in LIST_DIMENSIONS:
+                terms = [term.strip() for term in selected]
+                catalog = catalog.filter(
+                    column.cast(pl.Utf8)
+                    .str.split(",")
+                    .list.eval(pl.element().str.strip_chars().is_in(terms))
+                    .list.any()
+                )
+            elif dimension in RANGE_DIMENSIONS:
+                catalog = catalog.filter(column.is_between(*selected))
+            else:
+                catalog = catalog.filter(column.cast(pl.Utf8).is_in(list(selected)))
+        return catalog
+
+    def get_count_cube(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        import polars as pl
+
+        count_cube = (
+            self._filter(catalog_filter)
+            .group_by(CUBE_DIMENSIONS)
+            .agg(pl.len().alias(COUNT_COLUMN))
+            .sort(CUBE_DIMENSIONS)
+            .collect()
+        )
+        return self._to_count_cube(count_cube.to_pandas())
+
+    def get_daily_counts(self, catalog_filter: Optional[CatalogFilter]) -> pd.DataFrame:
+        import polars as pl
+
+        daily_counts = (
+            self._filter(catalog_filter)
+            .group_by(DAILY_COUNT_COLUMNS)
+            .agg(pl.len().alias(COUNT_COLUMN))
+            .sort(DAILY_COUNT_COLUMNS)
+            .collect()
+        )
+        return self._to_daily_counts(daily_counts.to_pandas())
+
+    def get_durations(
+        self,
+        content_type: str,
+        duration_column: str,
+        catalog_filter: Optional[CatalogFilter] = None,
+    ) -> pd.DataFrame:
+        import polars as pl
+
+        validate_columns([duration_column])
+        durations = (
+            self._filter(catalog_filter)
+            .filter(
+                (pl.col("type").cast(pl.Utf8) == content_type)
+                & pl.col(duration_column).is_not_null()
+            )
+            .select(["release_year", duration_column])
+            .collect()
+        )
+        return self._to_frame(durations.to_pandas(), ["release_year", duration_column])
+
+    def get_malformed_durations(self) -> pd.Series:
+        import polars as pl
+
+        durations = (
+            self._catalog.filter(
+                pl.col("duration_minutes").is_null() & pl.col("season_count").is_null()
+            )
+            .select("duration")
+            .collect()
+        )
+        return self._to_frame(durations.to_pandas(), ["duration"])["duration"]
+
+    def get_page(
+        self,
+        page_number: int,
+        page_size: int,
+        columns: Optional[Sequence[str]] = None,
+        sort_by: Optional[str] = None,
+        ascending: bool = True,
+    ) -> pd.DataFrame:
+        columns = list(columns or CATALOG_COLUMNS)
+        validate_columns(columns + ([sort_by] if sort_by else []))
+        start = (page_number - 1) * page_size
+        if sort_by is None:
+            # Only the rows of the page are read from the scan
+            page = self._catalog.slice(start, page_size).with_row_index(
+                ROW_ID_COLUMN, offset=start
+            )
+        else:
+            # A stable sort, so ties keep the order of the catalog
+            page = (
+                self._catalog.with_row_index(ROW_ID_COLUMN)
+                .sort(
+                    sort_by,
+                    descending=not ascending,
+                    nulls_last=True,
+                    maintain_order=True,
+                )
+                .slice(start, page_size)
+            )
+        page = page.select([ROW_ID_COLUMN] + columns).collect()
+        return self._to_page(page.to_pandas(), columns)
+
+
+# Function to create a query backend for the current dataset version
+#
+# Falls back to pandas, with a warning, when the engine is not installed or the
+# snapshot of the data file is missing or stale.
+def create_query_backend(name: str = QUERY_BACKEND) -> QueryBackend:
+    if name not in QUERY_BACKENDS:
+        raise ValueError(f"Unknown query backend: {name}")
+    if name == "pandas":
+        return PandasBackend()
+    data_file = get_dataset_file()
+    try:
+        table = _read_snapshot_table(data_file)
+        if table is None:
+            logger.warning(
+                "No fresh snapshot of %s for the %s backend, using pandas",
+                data_file,
+                name,
+            )
+            return PandasBackend()
+        if name == "duckdb":
+            return DuckDbBackend(table)
+        return PolarsBackend(table, get_snapshot_path(data_file))
+    except ImportError as error:
+        logger.warning("Cannot use the %s backend (%s), using pandas", name, error)
+        return PandasBackend()
+
+
+# Function to get the shared query backend of the current dataset version
+def get_query_backend(name: str = QUERY_BACKEND) -> QueryBackend:
+    key = (get_dataset_version(), name)
+    query_backend = _backends.get(key)
+    if query_backend is not None:
+        return query_backend
+
+    with _lock:
+        if key not in _backends:
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _backends if k[0] not in live_versions]:
+                del _backends[old_key]
+            _backends[key] = create_query_backend(name)
+    return _backends[key]
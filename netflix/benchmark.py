@@ -0,0 +1,488 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from netflix.loader import CLEAN_DATA_FILE, PROJECT_ROOT
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Every scale is a synthetic catalog this many times the size of the shipped one
+BENCHMARK_SCALES = [1, 10, 100, 1000]
+
+BENCHMARK_DIR = PROJECT_ROOT / "benchmarks"
+DATA_DIR = BENCHMARK_DIR / "data"
+BASELINE_FILE = BENCHMARK_DIR / "baseline.json"
+
+# A case regresses when it is this much slower (or its figure this much larger)
+# than in the baseline ...
+REGRESSION_THRESHOLD = 0.25
+# ... and slower by at least this many seconds, so timer noise is ignored
+MIN_REGRESSION_SECONDS = 0.005
+
+DEFAULT_REPEAT = 3
+
+# Dimension and title of the histograms of pages 2 - 4
+HISTOGRAM_CASES = {
+    "release_year": None,
+    "rating": "Distribution of number of Movies and TV shows based on their ratings",
+    "year_added": "Frequency of content additions to Netflix over time",
+}
+# Titles whose similar titles are searched, exactly and approximately
+NO_OF_SIMILARITY_QUERIES = 20
+
+DURATION_COLUMNS = [
+    "type",
+    "release_year",
+    "duration",
+    "duration_minutes",
+    "season_count",
+]
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to time a function - the best of some runs, each after its own setup
+def _time_case(
+    function: Callable, repeat: int, setup: Optional[Callable] = None
+) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    case = {"seconds": min(timings), "median_seconds": float(np.median(timings))}
+    # Figures also report the size of the JSON sent to the browser
+    if isinstance(result, go.Figure):
+        case["bytes"] = len(result.to_json())
+    return case
+
+
+# Function to run every benchmark case against the catalog of the current process
+#
+# The catalog is the file NETFLIX_DATA_FILE points at. It runs in a process of
+# its own per scale, so caches and memory start from scratch.
+def run_cases(repeat: int = DEFAULT_REPEAT) -> Dict[str, object]:
+    from netflix import explorer
+    from netflix.aggregates import (
+        CUBE_DIMENSIONS,
+        build_count_cube,
+        get_count_cube,
+        get_counts,
+        get_counts_by_type,
+    )
+    from netflix.charts import (
+        build_cooccurrence_heatmap,
+        build_count_histogram,
+        build_duration_scatter,
+    )
+    from netflix.cooccurrence import (
+        COOCCURRENCE_PAIRS,
+        DEFAULT_TOP_N,
+        build_cooccurrence_matrix,
+    )
+    from netflix.backends import PandasBackend
+    from netflix.explorer import get_page
+    from netflix.growth import GRANULARITIES, build_growth_series
+    from netflix.loader import get_netflix_data, get_rss_bytes, read_netflix_data
+    from netflix.similarity import (
+        SIMILARITY_COLUMNS,
+        build_title_vectors,
+        find_similar_titles,
+        find_similar_titles_batch,
+        measure_approximate_search,
+    )
+    from netflix.sketches import (
+        DISTINCT_COLUMNS,
+        SKETCH_COLUMNS,
+        build_catalog_sketches,
+    )
+    from netflix.snapshot import CHUNK_ROWS
+
+    cases = {}
+    query_backend = PandasBackend()
+    logger.info("Benchmarking %s", CLEAN_DATA_FILE)
+
+    # Data load - parsing the whole CSV file, as on a cold start without snapshot
+    cases["load.csv"] = _time_case(lambda: read_netflix_data(CLEAN_DATA_FILE), repeat)
+    netflix_data = get_netflix_data()
+
+    # Aggregation - the count cube behind pages 2 - 4, then the per page tables
+    # taken from the cached cube on every rerun
+    cube_data = get_netflix_data(CUBE_DIMENSIONS)
+    cases["aggregate.count_cube"] = _time_case(
+        lambda: build_count_cube(cube_data), repeat
+    )
+    get_count_cube()
+    for dimension, title in HISTOGRAM_CASES.items():
+        cases[f"aggregate.{dimension}"] = _time_case(
+            lambda: (get_counts(dimension), get_counts_by_type(dimension)), repeat
+        )
+        counts = get_counts(dimension)
+        for histnorm in [None, "percent"]:
+            cases[f"figure.{dimension}.{histnorm or 'count'}"] = _time_case(
+                lambda: build_count_histogram(
+                    counts, dimension, histnorm=histnorm, title=title
+                ),
+                repeat,
+            )
+
+    # Page 4 - the daily growth series, then the lookups run on every rerun
+    cases["growth.series"] = _time_case(
+        lambda: build_growth_series(query_backend.get_daily_counts(None)), repeat
+    )
+    growth_series = build_growth_series(query_backend.get_daily_counts(None))
+    cases["growth.window"] = _time_case(
+        lambda: growth_series.get_additions(
+            growth_series.first_date, growth_series.last_date
+        ),
+        repeat,
+    )
+    for granularity in GRANULARITIES:
+        cases[f"growth.resample.{granularity.lower()}"] = _time_case(
+            lambda: growth_series.resample(
+                growth_series.first_date, growth_series.last_date, granularity
+            ),
+            repeat,
+        )
+
+    # Pages 2 and 5 - the sketches of the catalog, built in one pass over chunks
+    # as when compiled with the snapshot, then the estimates read on every rerun
+    sketch_data = get_netflix_data(SKETCH_COLUMNS)
+    sketch_chunks = [
+        sketch_data.iloc[start : start + CHUNK_ROWS]
+        for start in range(0, len(sketch_data), CHUNK_ROWS)
+    ]
+    cases["sketches.build"] = _time_case(
+        lambda: build_catalog_sketches(sketch_chunks), repeat
+    )
+    release_year_sketches = build_catalog_sketches(sketch_chunks)["release_year"]
+    cases["sketches.distinct_counts"] = _time_case(
+        lambda: [
+            release_year_sketches.get_distinct_counts(column)
+            for column in DISTINCT_COLUMNS
+        ],
+        repeat,
+    )
+    cases["sketches.quantiles"] = _time_case(
+        release_year_sketches.get_duration_quantiles, repeat
+    )
+
+    # Page 7 - the co-occurrence counts, one sparse product of the incidence
+    # matrices of every pair, of the whole catalog and of the movies only
+    is_movie = (get_netflix_data(["type"])["type"] == "Movie").to_numpy()
+    for pair, (row_column, column_column) in COOCCURRENCE_PAIRS.items():
+        name = f"{row_column}.{column_column}"
+        cases[f"cooccurrence.{name}"] = _time_case(
+            lambda: build_cooccurrence_matrix(row_column, column_column), repeat
+        )
+        cases[f"cooccurrence.{name}.filtered"] = _time_case(
+            lambda: build_cooccurrence_matrix(row_column, column_column, is_movie),
+            repeat,
+        )
+        top_counts = build_cooccurrence_matrix(row_column, column_column).get_top(
+            DEFAULT_TOP_N
+        )
+        cases[f"figure.cooccurrence.{name}"] = _time_case(
+            lambda: build_cooccurrence_heatmap(top_counts, title=pair), repeat
+        )
+
+    # Page 6 - the sparse title vectors, then exact and approximate search, whose
+    # recall is measured against exact search
+    similarity_data = get_netflix_data(SIMILARITY_COLUMNS)
+    cases["similarity.build"] = _time_case(
+        lambda: build_title_vectors(similarity_data), repeat
+    )
+    query_ids = np.random.RandomState(0).choice(
+        len(similarity_data),
+        min(NO_OF_SIMILARITY_QUERIES, len(similarity_data)),
+        replace=False,
+    )
+    cases["similarity.exact"] = _time_case(
+        lambda: find_similar_titles_batch(query_ids), repeat
+    )
+    cases["similarity.approximate"] = _time_case(
+        lambda: [
+            find_similar_titles(int(row_id), approximate=True) for row_id in query_ids
+        ],
+        repeat,
+    )
+    similarity_recall, candidate_share = measure_approximate_search(query_ids)
+
+    # Page 5 - the duration scatter plots
+    duration_data = get_netflix_data(DURATION_COLUMNS)
+    for content_type, y in [("Movie", "duration_minutes"), ("TV Show", "season_count")]:
+        is_type = (duration_data["type"] == content_type) & duration_data[y].notna()
+        titles = duration_data.loc[is_type, ["release_year", y]]
+        cases[f"figure.duration.{y}"] = _time_case(
+            lambda: build_duration_scatter(titles, x="release_year", y=y, title=y),
+            repeat,
+        )
+
+    # Page 1 - a page of rows, unsorted and sorted by title (cold and cached order)
+    last_page = max(1, len(netflix_data) // 10)
+    cases["explorer.page"] = _time_case(
+        lambda: get_page(netflix_data, last_page, 10), repeat
+    )
+    cases["explorer.sorted_page.cold"] = _time_case(
+        lambda: get_page(netflix_data, last_page, 10, sort_by="title"),
+        repeat,
+        setup=explorer._sort_orders.clear,
+    )
+    cases["explorer.sorted_page"] = _time_case(
+        lambda: get_page(netflix_data, last_page, 10, sort_by="title"), repeat
+    )
+
+    # Query backends - the same queries run by every engine installed, on the snapshot
+    cases.update(run_backend_cases(last_page, repeat))
+
+    return {
+        "rows": len(netflix_data),
+        "rss_bytes": get_rss_bytes(),
+        "similarity": {"recall": similarity_recall, "candidate_share": candidate_share},
+        "cases": cases,
+    }
+
+
+# Function to time the queries of the pages with every query backend installed
+#
+# The DuckDB and Polars backends need a fresh snapshot of the catalog - they are
+# skipped without one, as they would fall back to pandas.
+def run_backend_cases(last_page: int, repeat: int) -> Dict[str, dict]:
+    from netflix.backends import QUERY_BACKENDS, create_query_backend
+    from netflix.filters import CatalogFilter
+
+    catalog_filter = CatalogFilter(genres=("Dramas",), release_years=(2000, 2015))
+    cases = {}
+    for name in QUERY_BACKENDS:
+        query_backend = create_query_backend(name)
+        if query_backend.name != name:
+            logger.info("Skipping the %s backend", name)
+            continue
+        prefix = f"backend.{name}."
+        cases[prefix + "count_cube"] = _time_case(
+            lambda: query_backend.get_count_cube(None), repeat
+        )
+        cases[prefix + "count_cube.filtered"] = _time_case(
+            lambda: query_backend.get_count_cube(catalog_filter), repeat
+        )
+        cases[prefix + "daily_counts"] = _time_case(
+            lambda: query_backend.get_daily_counts(None), repeat
+        )
+        cases[prefix + "durations"] = _time_case(
+            lambda: query_backend.get_durations("Movie", "duration_minutes"), repeat
+        )
+        cases[prefix + "page"] = _time_case(
+            lambda: query_backend.get_page(last_page, 10), repeat
+        )
+        cases[prefix + "sorted_page"] = _time_case(
+            lambda: query_backend.get_page(last_page, 10, sort_by="title"), repeat
+        )
+    return cases
+
+
+# Function to write a synthetic catalog some times the size of the shipped one
+#
+# An existing file is reused unless the shipped catalog is newer. Synthetic
+# catalogs are generated with a fixed seed, so every run times the same rows.
+# Their snapshot is compiled too, for the query backends reading it.
+def write_scaled_catalog(scale: int, data_dir: Path = DATA_DIR) -> Path:
+    from netflix.snapshot import compile_snapshot, get_snapshot_path
+    from netflix.synthetic import generate_catalog, read_catalog_model
+
+    if scale == 1:
+        return CLEAN_DATA_FILE
+    path = Path(data_dir) / f"{CLEAN_DATA_FILE.stem}.x{scale}.csv"
+    if path.exists() and path.stat().st_mtime >= CLEAN_DATA_FILE.stat().st_mtime:
+        if not get_snapshot_path(path).exists():
+            compile_snapshot(path)
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    no_of_rows = len(pd.read_csv(CLEAN_DATA_FILE, usecols=["show_id"]))
+    generate_catalog(path, no_of_rows * scale, read_catalog_model())
+    compile_snapshot(path)
+    return path
+
+
+# Function to time the cold start of the pages 2 - 5 - the imports, data load,
+# aggregates and default figures run by the warm-up, each time in a fresh process
+def run_startup_cases(path: Path, repeat: int) -> Dict[str, dict]:
+    step_timings: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-m", "netflix.warmup", "--json"],
+            env=dict(os.environ, NETFLIX_DATA_FILE=str(path)),
+            cwd=PROJECT_ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        for step, seconds in json.loads(process.stdout).items():
+            step_timings.setdefault(step, []).append(seconds)
+    return {
+        f"startup.{step}": {
+            "seconds": min(timings),
+            "median_seconds": float(np.median(timings)),
+        }
+        for step, timings in step_timings.items()
+    }
+
+
+# Function to run the benchmark cases of one scale in a fresh process
+def run_scale(scale: int, repeat: int, data_dir: Path = DATA_DIR) -> Dict[str, object]:
+    path = write_scaled_catalog(scale, data_dir)
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "netflix.benchmark",
+            "--worker",
+            "--repeat",
+            str(repeat),
+        ],
+        env=dict(os.environ, NETFLIX_DATA_FILE=str(path)),
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    scale_results = json.loads(process.stdout)
+    scale_results["cases"].update(run_startup_cases(path, repeat))
+    return scale_results
+
+
+# Function to compare benchmark results against a baseline
+#
+# Returns one message per regressed (scale, case) - slower or, for figures,
+# larger than the baseline by more than the threshold.
+def compare_results(
+    results: Dict[str, object],
+    baseline: Dict[str, object],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> List[str]:
+    regressions = []
+    for scale, scale_results in results["scales"].items():
+        baseline_cases = baseline["scales"].get(scale, {}).get("cases", {})
+        for name, case in scale_results["cases"].items():
+            baseline_case = baseline_cases.get(name)
+            if baseline_case is None:
+                continue
+            seconds, baseline_seconds = case["seconds"], baseline_case["seconds"]
+            if (
+                seconds > baseline_seconds * (1 + threshold)
+                and seconds - baseline_seconds > MIN_REGRESSION_SECONDS
+            ):
+                regressions.append(
+                    "%s %s: %.4fs vs %.4fs in the baseline (%+.0f%%)"
+                    % (
+                        scale,
+                        name,
+                        seconds,
+                        baseline_seconds,
+                        (seconds / baseline_seconds - 1) * 100,
+                    )
+                )
+            if "bytes" in case and "bytes" in baseline_case:
+                if case["bytes"] > baseline_case["bytes"] * (1 + threshold):
+                    regressions.append(
+                        "%s %s: figure of %d bytes vs %d bytes in the baseline"
+                        % (scale, name, case["bytes"], baseline_case["bytes"])
+                    )
+    return regressions
+
+
+# Function to run the benchmarks of every scale
+def run_benchmarks(
+    scales: Sequence[int] = BENCHMARK_SCALES,
+    repeat: int = DEFAULT_REPEAT,
+    data_dir: Path = DATA_DIR,
+) -> Dict[str, object]:
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "scales": {},
+    }
+    for scale in scales:
+        logger.info("Running the benchmarks at %dx scale", scale)
+        results["scales"][f"{scale}x"] = run_scale(scale, repeat, data_dir)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the data load, aggregation and figure building of every "
+        "page against the shipped catalog and synthetic catalogs scaled up from it"
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=BENCHMARK_SCALES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument(
+        "--output", type=Path, default=None, help="write the results to this file"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing them",
+    )
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.worker:
+        json.dump(run_cases(args.repeat), sys.stdout)
+        return
+
+    results = run_benchmarks(args.scales, args.repeat, args.data_dir)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        logger.info("Wrote the results to %s", args.output)
+    for scale, scale_results in results["scales"].items():
+        for name, case in scale_results["cases"].items():
+            logger.info(
+                "%6s %-32s %9.4fs%s",
+                scale,
+                name,
+                case["seconds"],
+                " %9d bytes" % case["bytes"] if "bytes" in case else "",
+            )
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        logger.info("Stored the results as the baseline %s", args.baseline)
+        return
+    if not args.baseline.exists():
+        logger.warning("No baseline %s to compare against", args.baseline)
+        return
+    regressions = compare_results(
+        results, json.loads(args.baseline.read_text()), args.threshold
+    )
+    for regression in regressions:
+        logger.error("Regression: %s", regression)
+    if regressions:
+        sys.exit(1)
+    logger.info("No regression against the baseline %s", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
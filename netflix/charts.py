@@ -0,0 +1,316 @@
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from plotly import express as px
+from plotly import graph_objects as go
+
+from netflix.aggregates import COUNT_COLUMN
+from netflix.growth import ADDITIONS_COLUMN, LIBRARY_SIZE_COLUMN, PERIOD_COLUMN
+from netflix.metrics import timed
+from netflix.sketches import BAND_QUANTILES, DISTINCT_COUNT_COLUMN
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+CONTENT_TYPE_LABELS = {"type": "Types of Content on Netflix"}
+CONTENT_TYPE_COLORS = {"Movie": "DodgerBlue", "TV Show": "Red"}
+PERCENT_COLUMN = "percent"
+
+# Ship pre-binned bars instead of letting the browser bin the data - set the
+# environment variable NETFLIX_SERVER_SIDE_BINNING=0 to go back to client-side binning
+SERVER_SIDE_BINNING = os.environ.get("NETFLIX_SERVER_SIDE_BINNING", "1") != "0"
+
+# Above this number of points the duration scatter plots are drawn as a density heatmap
+MAX_SCATTER_POINTS = int(os.environ.get("NETFLIX_MAX_SCATTER_POINTS", "20000"))
+MAX_HEATMAP_BINS = 120
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the bar heights of a histogram per type from aggregated counts
+#
+# With histnorm="percent" every type is normalized on its own, the same way
+# plotly normalizes every trace of a histogram.
+def get_binned_counts(
+    counts: pd.DataFrame, dimension: str, histnorm: Optional[str] = None
+) -> pd.DataFrame:
+    binned_counts = counts[[dimension, "type", COUNT_COLUMN]]
+    if histnorm is None:
+        return binned_counts
+    if histnorm != PERCENT_COLUMN:
+        raise ValueError(f"Unsupported histnorm: {histnorm}")
+    totals = binned_counts.groupby("type", observed=True)[COUNT_COLUMN].transform("sum")
+    return binned_counts.assign(
+        **{PERCENT_COLUMN: binned_counts[COUNT_COLUMN] / totals * 100}
+    )
+
+
+# Function to build the overlaid histogram of Movies and TV shows per value of a dimension
+#
+# counts has one row per (dimension, type) with the number of titles - see
+# netflix.aggregates.get_counts. Numeric dimensions get one bar per value.
+@timed("figure")
+def build_count_histogram(
+    counts: pd.DataFrame,
+    dimension: str,
+    histnorm: Optional[str] = None,
+    title: Optional[str] = None,
+    server_side_binning: bool = SERVER_SIDE_BINNING,
+) -> go.Figure:
+    is_numeric = pd.api.types.is_numeric_dtype(counts[dimension])
+    # Labels are drawn in the order of the counts, e.g. with the UNKNOWN bin last
+    category_orders = (
+        {} if is_numeric else {dimension: list(pd.unique(counts[dimension]))}
+    )
+    if server_side_binning:
+        binned_counts = get_binned_counts(counts, dimension, histnorm)
+        fig = px.bar(
+            binned_counts,
+            x=dimension,
+            y=COUNT_COLUMN if histnorm is None else PERCENT_COLUMN,
+            color="type",
+            title=title,
+            labels=CONTENT_TYPE_LABELS,
+            color_discrete_map=CONTENT_TYPE_COLORS,
+            category_orders=category_orders,
+            barmode="overlay",
+            opacity=0.5,
+        )
+        # Bars touch each other like the bins of a histogram
+        fig.update_layout(bargap=0)
+        if is_numeric:
+            fig.update_traces(width=1)
+        return fig
+
+    fig = px.histogram(
+        counts,
+        x=dimension,
+        y=COUNT_COLUMN,
+        histfunc="sum",
+        color="type",
+        title=title,
+        labels=CONTENT_TYPE_LABELS,
+        color_discrete_map=CONTENT_TYPE_COLORS,
+        category_orders=category_orders,
+        barmode="overlay",
+        histnorm=histnorm,
+    )
+    if is_numeric:
+        # One bar per value, as the counts are already aggregated per value
+        fig.update_traces(xbins_size=1)
+    return fig
+
+
+# Function to get the edges of integer-aligned bins covering some integer values
+def get_integer_bin_edges(
+    values: np.ndarray, max_bins: int = MAX_HEATMAP_BINS
+) -> np.ndarray:
+    value_min, value_max = int(values.min()), int(values.max())
+    bin_size = max(1, -(-(value_max - value_min + 1) // max_bins))
+    return np.arange(value_min, value_max + bin_size + 1, bin_size) - 0.5
+
+
+# Function to build the scatter plot of duration against release year of some titles
+#
+# Up to max_points titles are drawn as WebGL markers. Above that the points are
+# binned on the server with NumPy and drawn as a heatmap of the number of
+# titles, so the figure size does not depend on the number of titles.
+@timed("figure")
+def build_duration_scatter(
+    titles: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str,
+    labels: Optional[dict] = None,
+    height: int = 800,
+    max_points: int = MAX_SCATTER_POINTS,
+) -> go.Figure:
+    labels = labels or {}
+    if len(titles) <= max_points:
+        return px.scatter(
+            titles,
+            x=x,
+            y=y,
+            title=title,
+            labels=labels,
+            height=height,
+            render_mode="webgl",
+        )
+
+    x_values = titles[x].to_numpy(dtype="int64")
+    y_values = titles[y].to_numpy(dtype="int64")
+    x_edges = get_integer_bin_edges(x_values)
+    y_edges = get_integer_bin_edges(y_values)
+    counts, _, _ = np.histogram2d(x_values, y_values, bins=(x_edges, y_edges))
+    # Leave the empty bins blank, and transpose as heatmap rows are y values
+    counts[counts == 0] = np.nan
+    fig = go.Figure(
+        go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2,
+            y=(y_edges[:-1] + y_edges[1:]) / 2,
+            z=counts.T,
+            colorscale="Reds",
+            colorbar={"title": "Titles"},
+            hovertemplate=labels.get(x, x)
+            + "=%{x}<br>"
+            + labels.get(y, y)
+            + "=%{y}<br>titles=%{z}<extra></extra>",
+        )
+    )
+    fig.update_layout(title=title, height=height)
+    return fig
+
+
+# Function to build the chart of the growth of the library per type over some buckets
+#
+# growth has one row per (period, type) - see netflix.growth.GrowthSeries.resample.
+# The titles added in every bucket are bars and the size of the library at the
+# end of every bucket is a line on a second axis.
+@timed("figure")
+def build_growth_chart(
+    growth: pd.DataFrame, title: Optional[str] = None, height: int = 600
+) -> go.Figure:
+    fig = go.Figure()
+    for content_type, type_growth in growth.groupby("type", observed=True):
+        color = CONTENT_TYPE_COLORS.get(content_type)
+        fig.add_trace(
+            go.Bar(
+                x=type_growth[PERIOD_COLUMN],
+                y=type_growth[ADDITIONS_COLUMN],
+                name=f"{content_type} added",
+                marker_color=color,
+                opacity=0.5,
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=type_growth[PERIOD_COLUMN],
+                y=type_growth[LIBRARY_SIZE_COLUMN],
+                name=f"{content_type} in the library",
+                mode="lines",
+                line={"color": color},
+                yaxis="y2",
+            )
+        )
+    fig.update_layout(
+        title=title,
+        height=height,
+        barmode="overlay",
+        bargap=0,
+        yaxis={"title": "Titles added"},
+        yaxis2={"title": "Titles in the library", "overlaying": "y", "side": "right"},
+        legend={"orientation": "h", "y": -0.15},
+    )
+    return fig
+
+
+# Function to build the quantile bands of the duration of one type of content
+#
+# duration_quantiles has one row per value of x and one column per quantile
+# (see GroupedSketches.get_duration_quantiles). The outermost quantiles bound
+# the lightest band, the next ones a darker band, and the median is a line.
+@timed("figure")
+def build_quantile_bands(
+    duration_quantiles: pd.DataFrame,
+    x: str,
+    color: Optional[str] = None,
+    title: Optional[str] = None,
+    quantiles=BAND_QUANTILES,
+    height: int = 600,
+) -> go.Figure:
+    duration_quantiles = duration_quantiles.sort_values(x)
+    fig = go.Figure()
+    for band in range(len(quantiles) // 2):
+        lower, upper = quantiles[band], quantiles[-1 - band]
+        fig.add_trace(
+            go.Scatter(
+                x=duration_quantiles[x],
+                y=duration_quantiles[lower],
+                mode="lines",
+                line={"width": 0, "color": color},
+                showlegend=False,
+                hoverinfo="skip",
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=duration_quantiles[x],
+                y=duration_quantiles[upper],
+                name=f"{lower:.0%} - {upper:.0%}",
+                mode="lines",
+                line={"width": 0, "color": color},
+                fill="tonexty",
+                opacity=0.2 + 0.2 * band,
+            )
+        )
+    if len(quantiles) % 2:
+        median = quantiles[len(quantiles) // 2]
+        fig.add_trace(
+            go.Scatter(
+                x=duration_quantiles[x],
+                y=duration_quantiles[median],
+                name="Median" if median == 0.5 else f"{median:.0%}",
+                mode="lines",
+                line={"color": color},
+            )
+        )
+    fig.update_layout(title=title, height=height)
+    return fig
+
+
+# Function to build the line chart of the distinct number of people per value of
+# a dimension, one line per type and column (e.g. directors of movies)
+@timed("figure")
+def build_distinct_counts_chart(
+    distinct_counts: pd.DataFrame,
+    x: str,
+    title: Optional[str] = None,
+    height: int = 600,
+) -> go.Figure:
+    fig = px.line(
+        distinct_counts.sort_values(x),
+        x=x,
+        y=DISTINCT_COUNT_COLUMN,
+        color="type",
+        line_dash="column",
+        color_discrete_map=CONTENT_TYPE_COLORS,
+        labels=CONTENT_TYPE_LABELS,
+        title=title,
+        height=height,
+    )
+    return fig
+
+
+# Function to build the heatmap of the number of titles having every pair of terms
+#
+# counts has one row and one column per term (see CooccurrenceMatrix.get_top).
+# With hide_diagonal the cells of a term with itself are left blank, so the
+# number of titles of every term does not swamp the scale.
+@timed("figure")
+def build_cooccurrence_heatmap(
+    counts: pd.DataFrame,
+    title: Optional[str] = None,
+    hide_diagonal: bool = False,
+    height: int = 800,
+) -> go.Figure:
+    values = counts.to_numpy(dtype=np.float64, copy=True)
+    if hide_diagonal:
+        np.fill_diagonal(values, np.nan)
+    fig = px.imshow(
+        values,
+        x=list(counts.columns),
+        y=list(counts.index),
+        labels={
+            "x": counts.columns.name,
+            "y": counts.index.name,
+            "color": "Titles",
+        },
+        color_continuous_scale="Reds",
+        aspect="auto",
+        title=title,
+        height=height,
+    )
+    fig.update_xaxes(side="top", tickangle=-45)
+    return fig
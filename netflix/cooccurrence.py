@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.filters import FILTER_COLUMNS, CatalogFilter, get_filter_mask
+from netflix.indexes import get_inverted_index
+from netflix.loader import (
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.metrics import record_cache_access, timed
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Comma-joined columns whose terms co-occur, and the label of a term of each
+COOCCURRENCE_COLUMNS = {"listed_in": "Genre", "country": "Country"}
+
+# Pairs of columns of the co-occurrence page - label and (rows, columns)
+COOCCURRENCE_PAIRS = {
+    "Genre × genre": ("listed_in", "listed_in"),
+    "Genre × country": ("listed_in", "country"),
+}
+DEFAULT_PAIR = "Genre × genre"
+DEFAULT_TOP_N = 15
+
+# Number of co-occurrence matrices of filtered catalogs kept in memory
+MAX_CACHED_MATRICES = 32
+
+# Process-wide caches - the incidence matrix per dataset version and column, and
+# the co-occurrence matrices per dataset version, pair of columns and active filter
+_lock = threading.Lock()
+_incidence_matrices: Dict[Tuple[str, str], "sparse.csr_matrix"] = {}
+_cooccurrence_matrices: "OrderedDict[tuple, CooccurrenceMatrix]" = OrderedDict()
+
+
+# -------------------------------------------------------------------------------------------------
+# Number of titles having every pair of terms of two comma-joined columns
+#
+# counts[i, j] is the number of titles with row_terms[i] and column_terms[j].
+# For a column with itself the diagonal is the number of titles of every term,
+# as are row_totals and column_totals for any pair.
+@dataclass(frozen=True)
+class CooccurrenceMatrix:
+    row_column: str
+    column_column: str
+    row_terms: np.ndarray
+    column_terms: np.ndarray
+    counts: np.ndarray
+    row_totals: np.ndarray
+    column_totals: np.ndarray
+
+    # Function to get the counts of the top_n terms with the most titles, as a DataFrame
+    #
+    # The terms are sorted by their number of titles. For a column with itself
+    # the same terms are kept on both axes.
+    def get_top(self, top_n: int) -> pd.DataFrame:
+        row_order = np.argsort(-self.row_totals, kind="stable")[:top_n]
+        row_order = row_order[self.row_totals[row_order] > 0]
+        if self.row_column == self.column_column:
+            column_order = row_order
+        else:
+            column_order = np.argsort(-self.column_totals, kind="stable")[:top_n]
+            column_order = column_order[self.column_totals[column_order] > 0]
+        return pd.DataFrame(
+            self.counts[np.ix_(row_order, column_order)],
+            index=pd.Index(
+                self.row_terms[row_order], name=COOCCURRENCE_COLUMNS[self.row_column]
+            ),
+            columns=pd.Index(
+                self.column_terms[column_order],
+                name=COOCCURRENCE_COLUMNS[self.column_column],
+            ),
+        )
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the shared title × term incidence matrix of a column
+#
+# Row i is the title at position i of the shared DataFrame and column j the
+# term j of the inverted index of the column - the index already holds the row
+# ids of every term, i.e. the matrix in compressed sparse column format.
+def get_incidence_matrix(column: str) -> "sparse.csr_matrix":
+    from scipy import sparse
+
+    if column not in COOCCURRENCE_COLUMNS:
+        raise ValueError(f"No incidence matrix for the column: {column}")
+    key = (get_dataset_version(), column)
+    incidence_matrix = _incidence_matrices.get(key)
+    record_cache_access("incidence_matrix", incidence_matrix is not None)
+    if incidence_matrix is not None:
+        return incidence_matrix
+
+    with _lock:
+        if key not in _incidence_matrices:
+            live_versions = get_live_dataset_versions()
+            for old_key in [
+                k for k in _incidence_matrices if k[0] not in live_versions
+            ]:
+                del _incidence_matrices[old_key]
+            inverted_index = get_inverted_index(column)
+            no_of_titles = len(get_netflix_data(FILTER_COLUMNS))
+            # A CSR copy, so the rows kept by a filter are sliced cheaply
+            _incidence_matrices[key] = sparse.csc_matrix(
+                (
+                    np.ones(len(inverted_index.row_ids), dtype=np.int32),
+                    inverted_index.row_ids,
+                    inverted_index.offsets,
+                ),
+                shape=(no_of_titles, len(inverted_index.terms)),
+            ).tocsr()
+    return _incidence_matrices[key]
+
+
+# Function to count the titles having every pair of terms of two columns
+#
+# One sparse product of the incidence matrices, restricted to the rows of an
+# optional boolean mask of the titles.
+def build_cooccurrence_matrix(
+    row_column: str, column_column: str, mask: Optional[np.ndarray] = None
+) -> CooccurrenceMatrix:
+    row_incidence = get_incidence_matrix(row_column)
+    column_incidence = get_incidence_matrix(column_column)
+    if mask is not None:
+        row_positions = np.flatnonzero(mask)
+        row_incidence = row_incidence[row_positions]
+        column_incidence = column_incidence[row_positions]
+    counts = (row_incidence.T @ column_incidence).toarray().astype(np.int64)
+    return CooccurrenceMatrix(
+        row_column=row_column,
+        column_column=column_column,
+        row_terms=get_inverted_index(row_column).terms,
+        column_terms=get_inverted_index(column_column).terms,
+        counts=counts,
+        row_totals=np.asarray(row_incidence.sum(axis=0), dtype=np.int64).ravel(),
+        column_totals=np.asarray(column_incidence.sum(axis=0), dtype=np.int64).ravel(),
+    )
+
+
+# Function to get the shared co-occurrence matrix of two columns for the current
+# dataset version
+#
+# With an active filter only the titles kept by the filter are counted. The
+# matrices of the most recent filters are cached.
+@timed("aggregate")
+def get_cooccurrence_matrix(
+    row_column: str,
+    column_column: str,
+    catalog_filter: Optional[CatalogFilter] = None,
+) -> CooccurrenceMatrix:
+    if catalog_filter is not None and not catalog_filter.is_active():
+        catalog_filter = None
+    key = (get_dataset_version(), row_column, column_column, catalog_filter)
+    cooccurrence_matrix = _cooccurrence_matrices.get(key)
+    record_cache_access("cooccurrence_matrix", cooccurrence_matrix is not None)
+    if cooccurrence_matrix is not None:
+        return cooccurrence_matrix
+
+    # The incidence matrices and the filter mask take the lock themselves
+    mask = None if catalog_filter is None else get_filter_mask(catalog_filter)
+    cooccurrence_matrix = build_cooccurrence_matrix(row_column, column_column, mask)
+    with _lock:
+        live_versions = get_live_dataset_versions()
+        for old_key in [k for k in _cooccurrence_matrices if k[0] not in live_versions]:
+            del _cooccurrence_matrices[old_key]
+        _cooccurrence_matrices[key] = cooccurrence_matrix
+        if len(_cooccurrence_matrices) > MAX_CACHED_MATRICES:
+            # Evict the oldest matrix of a filtered catalog, never the full ones
+            oldest_key = next(k for k in _cooccurrence_matrices if k[3] is not None)
+            del _cooccurrence_matrices[oldest_key]
+    return _cooccurrence_matrices[key]
@@ -0,0 +1,127 @@
+from typing import TYPE_CHECKING
+
+import streamlit as st
+
+from netflix.metrics import (
+    METRICS_ENABLED,
+    get_cache_stats,
+    get_metrics_text,
+    get_stage_timings,
+)
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Query parameter of the home page that shows the diagnostics instead - the page
+# is not listed in the navigation: open http://<host>/?diagnostics
+DIAGNOSTICS_QUERY_PARAMETER = "diagnostics"
+
+# pandas and the data layer are imported when the diagnostics are rendered, so
+# the home page does not import them to check the query parameter
+if TYPE_CHECKING:
+    import pandas as pd
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to check if the diagnostics were requested in the URL
+def is_diagnostics_requested() -> bool:
+    # st.query_params replaced st.experimental_get_query_params in Streamlit 1.30
+    if hasattr(st, "query_params"):
+        return DIAGNOSTICS_QUERY_PARAMETER in st.query_params
+    return DIAGNOSTICS_QUERY_PARAMETER in st.experimental_get_query_params()
+
+
+# Function to get the timings of every page and stage as a table
+def get_stage_timings_df() -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame(
+        [
+            {
+                "page": labels["page"],
+                "stage": labels["stage"],
+                "calls": count,
+                "total (s)": round(total, 3),
+                "mean (ms)": round(total / count * 1000, 2),
+                "max (ms)": round(maximum * 1000, 2),
+            }
+            for labels, count, total, maximum in get_stage_timings()
+        ],
+        columns=["page", "stage", "calls", "total (s)", "mean (ms)", "max (ms)"],
+    )
+
+
+# Function to get the hits and misses of every cache as a table
+def get_cache_stats_df() -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame(
+        [
+            {
+                "cache": cache,
+                "hits": counts["hit"],
+                "misses": counts["miss"],
+                "hit rate": "%.1f%%"
+                % (100 * counts["hit"] / max(1, counts["hit"] + counts["miss"])),
+            }
+            for cache, counts in get_cache_stats().items()
+        ],
+        columns=["cache", "hits", "misses", "hit rate"],
+    )
+
+
+# Function to render the diagnostics of the server process
+def render_diagnostics() -> None:
+    import pandas as pd
+
+    from netflix.loader import (
+        get_all_load_stats,
+        get_dataset_version,
+        get_live_dataset_versions,
+        get_rss_bytes,
+    )
+
+    st.title("Diagnostics")
+    if not METRICS_ENABLED:
+        st.warning("The instrumentation is turned off (NETFLIX_METRICS=0)")
+
+    rss_bytes = get_rss_bytes()
+    rss_column, version_column = st.columns(2)
+    rss_column.metric(
+        "Process RSS", "n/a" if rss_bytes is None else "%.1f MB" % (rss_bytes / 1e6)
+    )
+    version_column.metric("Dataset version", get_dataset_version())
+    live_versions = sorted(get_live_dataset_versions())
+    if len(live_versions) > 1:
+        version_column.caption("Live versions: " + ", ".join(live_versions))
+
+    st.subheader("Time per page and stage")
+    st.dataframe(get_stage_timings_df())
+
+    st.subheader("Caches")
+    st.dataframe(get_cache_stats_df())
+
+    st.subheader("Loaded DataFrames")
+    st.dataframe(
+        pd.DataFrame(
+            [
+                {
+                    "version": load_stats.version,
+                    "columns": ", ".join(load_stats.column_bytes),
+                    "source": load_stats.source,
+                    "rows": load_stats.rows,
+                    "load (s)": round(load_stats.load_seconds, 3),
+                    "frame (MB)": round(load_stats.frame_bytes / 1e6, 1),
+                }
+                for load_stats in get_all_load_stats()
+            ],
+            columns=["version", "columns", "source", "rows", "load (s)", "frame (MB)"],
+        )
+    )
+
+    st.subheader("Prometheus metrics")
+    metrics_text = get_metrics_text()
+    st.download_button("Download", metrics_text, file_name="netflix_metrics.prom")
+    st.code(metrics_text, language="text")
@@ -0,0 +1,373 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.aggregates import (
+    COUNT_COLUMN,
+    CUBE_DIMENSIONS,
+    build_count_cube,
+    pivot_counts_by_type,
+    sum_count_cube,
+)
+from netflix.loader import get_rss_bytes
+from netflix.schema import CATALOG_COLUMNS, apply_schema
+from netflix.snapshot import iter_catalog_chunks
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Column identifying a title across catalog versions
+KEY_COLUMN = "show_id"
+
+# Columns whose change makes a title modified
+CONTENT_COLUMNS = [column for column in CATALOG_COLUMNS if column != KEY_COLUMN]
+
+CHANGED_COLUMNS_COLUMN = "changed_columns"
+CHANGED_COLUMNS_SEPARATOR = ", "
+
+# Keys of the hashes of the show_ids (16 characters each) - the next one is only
+# used when two different show_ids of a catalog share a hash
+KEY_HASH_KEYS = ["0123456789123456", "netflix.show_id."]
+
+# Dimensions of the delta aggregates - the ones of the pages 2 - 4
+DELTA_DIMENSIONS = ["type", "release_year", "rating", "year_added"]
+
+ADDED_FILE = "added.csv"
+REMOVED_FILE = "removed.csv"
+MODIFIED_FILE = "modified.csv"
+DELTA_FILE_PREFIX = "delta_"
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Difference between two versions of the catalog, matched by show_id
+#
+# added and removed have every catalog column of the titles, modified has the
+# show_id, the title (of the new version) and the columns that changed.
+# delta_cube is the count cube of the new version minus the one of the old
+# version - see build_count_cube - without the cells that did not change.
+@dataclass(frozen=True)
+class CatalogDiff:
+    old_path: str
+    new_path: str
+    old_rows: int
+    new_rows: int
+    added: pd.DataFrame
+    removed: pd.DataFrame
+    modified: pd.DataFrame
+    delta_cube: pd.DataFrame
+
+    @property
+    def unchanged_rows(self) -> int:
+        return self.new_rows - len(self.added) - len(self.modified)
+
+    # Function to get the change of the number of titles per value of a dimension
+    # and type, one column per type (see get_counts_by_type)
+    def get_delta_counts_by_type(self, dimension: str) -> pd.DataFrame:
+        if dimension == "type":
+            # One row of the change of the number of titles of every type
+            delta_counts = self.delta_cube.groupby("type", observed=False)[
+                COUNT_COLUMN
+            ].sum()
+            return delta_counts.to_frame().T.rename_axis(None, axis=1)
+        delta_counts = sum_count_cube(self.delta_cube, dimension)
+        delta_counts = delta_counts[delta_counts[COUNT_COLUMN] != 0]
+        return pivot_counts_by_type(delta_counts, dimension).fillna(0).astype("int64")
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to hash the values of a column, or the rows of some columns, to uint64
+#
+# Most strings of a catalog are unique (show_id, title, description...), so
+# they are hashed as they are rather than factorized first - categorical columns
+# are hashed through their categories either way.
+def _hash_values(values, hash_key: str = KEY_HASH_KEYS[0]) -> np.ndarray:
+    return pd.util.hash_pandas_object(
+        values, index=False, hash_key=hash_key, categorize=False
+    ).to_numpy()
+
+
+# Function to hash the show_id and the content of every title of a catalog
+#
+# Returns the (key hashes, content hashes) in row order, both uint64 - the
+# content hash covers every column but show_id, so two versions of a title have
+# the same content hash if and only if (barring collisions) nothing changed.
+# The show_ids are hashed with the given hash key.
+def hash_catalog(
+    catalog_path: Path, hash_key: str = KEY_HASH_KEYS[0]
+) -> Tuple[np.ndarray, np.ndarray]:
+    key_hashes = []
+    content_hashes = []
+    for chunk in iter_catalog_chunks(catalog_path, CATALOG_COLUMNS):
+        key_hashes.append(_hash_values(chunk[KEY_COLUMN], hash_key))
+        content_hashes.append(_hash_values(chunk[CONTENT_COLUMNS]))
+    if not key_hashes:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64)
+    return np.concatenate(key_hashes), np.concatenate(content_hashes)
+
+
+# Function to read the rows at some positions of a catalog, indexed by position
+def read_catalog_rows(catalog_path: Path, row_positions: np.ndarray) -> pd.DataFrame:
+    chunks = list(
+        iter_catalog_chunks(catalog_path, CATALOG_COLUMNS, np.unique(row_positions))
+    )
+    if not chunks:
+        return apply_schema(pd.DataFrame(columns=CATALOG_COLUMNS))
+    # The chunks of a CSV file have categories of their own, so the categorical
+    # columns are concatenated as values and typed again
+    return apply_schema(pd.concat(chunks))
+
+
+# Function to check which of two aligned arrays of show_ids are the same show_id
+def _is_same_key(keys: np.ndarray, other_keys: np.ndarray) -> np.ndarray:
+    is_missing = pd.isna(keys)
+    return np.where(is_missing, pd.isna(other_keys), keys == other_keys)
+
+
+# Function to check that the show_ids of a catalog are unique and sort them
+#
+# Returns the positions of the rows in the order of their key hashes, or None
+# when two different show_ids share a hash. The rows sharing a hash are read
+# to tell the two apart, and duplicated show_ids raise a ValueError.
+def _sort_keys(key_hashes: np.ndarray, catalog_path: Path) -> Optional[np.ndarray]:
+    order = np.argsort(key_hashes, kind="stable")
+    sorted_keys = key_hashes[order]
+    is_shared = sorted_keys[1:] == sorted_keys[:-1]
+    if not is_shared.any():
+        return order
+
+    positions, other_positions = order[:-1][is_shared], order[1:][is_shared]
+    keys = read_catalog_rows(
+        catalog_path, np.concatenate([positions, other_positions])
+    )[KEY_COLUMN]
+    is_duplicate = _is_same_key(
+        keys.loc[positions].to_numpy(dtype=object),
+        keys.loc[other_positions].to_numpy(dtype=object),
+    )
+    if is_duplicate.any():
+        first_duplicate = int(np.argmax(is_duplicate))
+        raise ValueError(
+            f"{catalog_path} has {int(is_duplicate.sum())} duplicated show_ids "
+            f"(e.g. {keys.loc[positions[first_duplicate]]!r} at rows "
+            f"{int(positions[first_duplicate])} and "
+            f"{int(other_positions[first_duplicate])})"
+        )
+    return None
+
+
+# Function to get the columns that changed between two versions of some titles
+#
+# old_rows and new_rows are aligned - row i of both is the same title. Every
+# column is compared through its hashes, so missing values compare equal.
+def get_changed_columns(old_rows: pd.DataFrame, new_rows: pd.DataFrame) -> pd.Series:
+    changed_columns = pd.Series("", index=new_rows.index, dtype=object)
+    for column in CONTENT_COLUMNS:
+        is_changed = _hash_values(old_rows[column]) != _hash_values(new_rows[column])
+        changed_columns[is_changed] += column + CHANGED_COLUMNS_SEPARATOR
+    return changed_columns.str[: -len(CHANGED_COLUMNS_SEPARATOR)]
+
+
+# Function to get the count cube of the new catalog minus the one of the old catalog
+#
+# Only the titles that changed are counted - the added and the new versions of
+# the modified ones count +1, the removed and the old versions of the modified
+# ones -1. The cells whose count does not change are dropped.
+def build_delta_cube(
+    added: pd.DataFrame,
+    removed: pd.DataFrame,
+    modified_old: pd.DataFrame,
+    modified_new: pd.DataFrame,
+) -> pd.DataFrame:
+    signed_cubes = []
+    for titles, sign in [
+        (added, 1),
+        (modified_new, 1),
+        (removed, -1),
+        (modified_old, -1),
+    ]:
+        count_cube = build_count_cube(titles[CUBE_DIMENSIONS])
+        count_cube[COUNT_COLUMN] *= sign
+        # Compare the categories by value, as both catalogs may have their own
+        for column in ["type", "rating"]:
+            count_cube[column] = count_cube[column].astype(object)
+        signed_cubes.append(count_cube)
+    delta_cube = (
+        pd.concat(signed_cubes, ignore_index=True)
+        .groupby(CUBE_DIMENSIONS, dropna=False)[COUNT_COLUMN]
+        .sum()
+        .reset_index()
+    )
+    delta_cube = delta_cube[delta_cube[COUNT_COLUMN] != 0].reset_index(drop=True)
+    for column in ["type", "rating"]:
+        delta_cube[column] = delta_cube[column].astype("category")
+    return delta_cube
+
+
+# Function to compare two versions of the catalog by show_id
+#
+# Every title is hashed in one vectorized pass per catalog, and the hashes are
+# matched by sorting, so only the titles that changed are ever read in full.
+# The show_ids of the titles read are compared as well, so two titles whose
+# show_ids only share a hash are an added and a removed title - the unchanged
+# titles are not read, they would need to share both hashes of another title.
+def diff_catalogs(old_path: Path, new_path: Path) -> CatalogDiff:
+    for hash_key in KEY_HASH_KEYS:
+        old_keys, old_hashes = hash_catalog(old_path, hash_key)
+        new_keys, new_hashes = hash_catalog(new_path, hash_key)
+        old_order = _sort_keys(old_keys, old_path)
+        if old_order is not None and _sort_keys(new_keys, new_path) is not None:
+            break
+        logger.warning("Two show_ids share a hash, hashing them with another key")
+    else:
+        raise ValueError("Two show_ids share a hash with every key of KEY_HASH_KEYS")
+
+    # Position of every new title in the old catalog, -1 if it was added
+    old_positions = np.full(len(new_keys), -1, dtype=np.int64)
+    if len(old_keys):
+        sorted_old_keys = old_keys[old_order]
+        insert_positions = np.searchsorted(sorted_old_keys, new_keys)
+        np.minimum(insert_positions, len(old_keys) - 1, out=insert_positions)
+        is_found = sorted_old_keys[insert_positions] == new_keys
+        old_positions[is_found] = old_order[insert_positions[is_found]]
+        del sorted_old_keys, insert_positions, is_found
+    is_matched = old_positions >= 0
+    del old_order, old_keys, new_keys
+
+    is_kept = np.zeros(len(old_hashes), dtype=bool)
+    is_kept[old_positions[is_matched]] = True
+    is_modified = is_matched.copy()
+    is_modified[is_matched] = (
+        old_hashes[old_positions[is_matched]] != new_hashes[is_matched]
+    )
+
+    added_positions = np.flatnonzero(~is_matched)
+    modified_positions = np.flatnonzero(is_modified)
+    modified_old_positions = old_positions[modified_positions]
+    removed_positions = np.flatnonzero(~is_kept)
+
+    # Read the titles that changed - in row order, then the modified ones are
+    # put back in the order of their new positions
+    old_rows = read_catalog_rows(
+        old_path, np.concatenate([removed_positions, modified_old_positions])
+    )
+    new_rows = read_catalog_rows(
+        new_path, np.concatenate([added_positions, modified_positions])
+    )
+
+    # Titles matched by a hash shared by different show_ids were added and removed
+    is_same_title = _is_same_key(
+        old_rows.loc[modified_old_positions, KEY_COLUMN].to_numpy(dtype=object),
+        new_rows.loc[modified_positions, KEY_COLUMN].to_numpy(dtype=object),
+    )
+    if not is_same_title.all():
+        added_positions = np.sort(
+            np.concatenate([added_positions, modified_positions[~is_same_title]])
+        )
+        removed_positions = np.sort(
+            np.concatenate([removed_positions, modified_old_positions[~is_same_title]])
+        )
+        modified_positions = modified_positions[is_same_title]
+        modified_old_positions = modified_old_positions[is_same_title]
+
+    added = new_rows.loc[added_positions]
+    removed = old_rows.loc[removed_positions]
+    modified_old = old_rows.loc[modified_old_positions]
+    modified_new = new_rows.loc[modified_positions]
+
+    modified = modified_new[[KEY_COLUMN, "title"]].copy()
+    modified[CHANGED_COLUMNS_COLUMN] = get_changed_columns(
+        modified_old.reset_index(drop=True), modified_new.reset_index(drop=True)
+    ).to_numpy()
+    return CatalogDiff(
+        old_path=str(old_path),
+        new_path=str(new_path),
+        old_rows=len(old_hashes),
+        new_rows=len(new_hashes),
+        added=added,
+        removed=removed,
+        modified=modified,
+        delta_cube=build_delta_cube(added, removed, modified_old, modified_new),
+    )
+
+
+# Function to write a file atomically, so readers never see a half-written diff
+def _write_csv(frame: pd.DataFrame, path: Path, index: bool) -> None:
+    temporary_path = path.with_name(path.name + ".tmp")
+    frame.to_csv(temporary_path, index=index)
+    os.replace(temporary_path, path)
+
+
+# Function to write a diff to a directory - the added, removed and modified
+# titles, and the delta of the counts of every dimension per type
+def write_catalog_diff(catalog_diff: CatalogDiff, output_dir: Path) -> None:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _write_csv(catalog_diff.added, output_dir / ADDED_FILE, index=False)
+    _write_csv(catalog_diff.removed, output_dir / REMOVED_FILE, index=False)
+    _write_csv(catalog_diff.modified, output_dir / MODIFIED_FILE, index=False)
+    for dimension in DELTA_DIMENSIONS:
+        _write_csv(
+            catalog_diff.get_delta_counts_by_type(dimension),
+            output_dir / f"{DELTA_FILE_PREFIX}{dimension}.csv",
+            index=True,
+        )
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.diff old_catalog new_catalog
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare two versions of the catalog (cleaned CSV files or "
+        "snapshots) by show_id: the added, removed and modified titles, and the "
+        "change of the counts per type, release year, rating and year added"
+    )
+    parser.add_argument("old_catalog", type=Path)
+    parser.add_argument("new_catalog", type=Path)
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help="write the titles and the delta counts as CSV files to this directory",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    catalog_diff = diff_catalogs(args.old_catalog, args.new_catalog)
+    rss_bytes = get_rss_bytes()
+    logger.info(
+        "Compared %s (%d titles) with %s (%d titles) in %.2fs%s",
+        args.old_catalog,
+        catalog_diff.old_rows,
+        args.new_catalog,
+        catalog_diff.new_rows,
+        time.perf_counter() - start,
+        "" if rss_bytes is None else ", process RSS %.1f MB" % (rss_bytes / 1e6),
+    )
+    logger.info(
+        "%d added, %d removed, %d modified, %d unchanged titles",
+        len(catalog_diff.added),
+        len(catalog_diff.removed),
+        len(catalog_diff.modified),
+        catalog_diff.unchanged_rows,
+    )
+    logger.info("Change of the number of titles per type:")
+    logger.info(catalog_diff.get_delta_counts_by_type("type").to_string())
+    if args.output_dir is not None:
+        write_catalog_diff(catalog_diff, args.output_dir)
+        logger.info("Wrote the diff to %s", args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
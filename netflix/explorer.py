@@ -0,0 +1,108 @@
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.loader import get_dataset_version, get_live_dataset_versions
+from netflix.metrics import record_cache_access, timed
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Process-wide cache - row order and rank of every sorted column, per dataset version
+_lock = threading.Lock()
+_sort_orders: Dict[Tuple[str, str, bool], np.ndarray] = {}
+_sort_ranks: Dict[Tuple[str, str, bool], np.ndarray] = {}
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the number of pages needed to show all rows
+def get_page_count(no_of_rows: int, page_size: int) -> int:
+    return max(1, -(-no_of_rows // page_size))
+
+
+# Function to get the row positions of a DataFrame sorted by one column
+#
+# The order is computed once per dataset version, column and direction, so
+# paging through a sorted table only takes the rows of the visible page.
+def get_sort_order(
+    netflix_data: pd.DataFrame, sort_by: str, ascending: bool = True
+) -> np.ndarray:
+    key = (get_dataset_version(), sort_by, ascending)
+    sort_order = _sort_orders.get(key)
+    record_cache_access("sort_order", sort_order is not None)
+    if sort_order is not None:
+        return sort_order
+
+    with _lock:
+        if key not in _sort_orders:
+            # Drop the orders of retired dataset versions
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _sort_orders if k[0] not in live_versions]:
+                del _sort_orders[old_key]
+            sort_order = (
+                netflix_data[sort_by]
+                .reset_index(drop=True)
+                .sort_values(ascending=ascending, kind="stable", na_position="last")
+                .index.to_numpy()
+            )
+            sort_order.flags.writeable = False
+            _sort_orders[key] = sort_order
+    return _sort_orders[key]
+
+
+# Function to get the rank of every row of a DataFrame sorted by one column
+def get_sort_rank(
+    netflix_data: pd.DataFrame, sort_by: str, ascending: bool = True
+) -> np.ndarray:
+    key = (get_dataset_version(), sort_by, ascending)
+    sort_rank = _sort_ranks.get(key)
+    if sort_rank is None:
+        sort_order = get_sort_order(netflix_data, sort_by, ascending)
+        sort_rank = np.empty_like(sort_order)
+        sort_rank[sort_order] = np.arange(len(sort_order))
+        sort_rank.flags.writeable = False
+        with _lock:
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _sort_ranks if k[0] not in live_versions]:
+                del _sort_ranks[old_key]
+            _sort_ranks[key] = sort_rank
+    return sort_rank
+
+
+# Function to get one page of rows of a DataFrame, optionally sorted and projected
+#
+# Only the rows of the page (and the selected columns) are taken from the
+# shared DataFrame, whatever its size. row_positions restricts the rows to a
+# subset, e.g. search results, kept in their given order unless sort_by is set.
+@timed("aggregate")
+def get_page(
+    netflix_data: pd.DataFrame,
+    page_number: int,
+    page_size: int,
+    columns: Optional[Sequence[str]] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+    row_positions: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    start = (page_number - 1) * page_size
+    stop = start + page_size
+    if columns is not None:
+        column_positions = [netflix_data.columns.get_loc(column) for column in columns]
+    else:
+        column_positions = slice(None)
+
+    if row_positions is not None:
+        if sort_by is not None:
+            sort_rank = get_sort_rank(netflix_data, sort_by, ascending)
+            row_positions = row_positions[
+                np.argsort(sort_rank[row_positions], kind="stable")
+            ]
+        return netflix_data.iloc[row_positions[start:stop], column_positions]
+    if sort_by is None:
+        return netflix_data.iloc[start:stop, column_positions]
+    row_positions = get_sort_order(netflix_data, sort_by, ascending)[start:stop]
+    return netflix_data.iloc[row_positions, column_positions]
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import plotly
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from netflix import charts
+from netflix.filters import CatalogFilter
+from netflix.loader import get_dataset_version
+from netflix.metrics import record_cache_access
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Total size of the JSON specs of the figures kept in memory - set the environment
+# variable NETFLIX_FIGURE_CACHE_BYTES to change it, or to 0 to turn the cache off
+MAX_CACHE_BYTES = int(os.environ.get("NETFLIX_FIGURE_CACHE_BYTES", 64 * 2**20))
+
+# Set NETFLIX_FIGURE_CACHE_DIR to also keep the specs on disk, so the cache
+# survives restarts - the oldest files are removed above NETFLIX_FIGURE_CACHE_DISK_BYTES
+CACHE_DIR = os.environ.get("NETFLIX_FIGURE_CACHE_DIR")
+MAX_DISK_CACHE_BYTES = int(
+    os.environ.get("NETFLIX_FIGURE_CACHE_DISK_BYTES", 256 * 2**20)
+)
+
+SPEC_SUFFIX = ".json"
+
+logger = logging.getLogger(__name__)
+
+# Process-wide LRU cache - (figure, size of its JSON spec) per key, most recent last
+_lock = threading.Lock()
+_figures: "OrderedDict[tuple, Tuple[go.Figure, int]]" = OrderedDict()
+_cache_bytes = 0
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the settings every figure depends on besides its parameters
+#
+# They are part of every key, so a figure kept on disk is not reused after the
+# binning settings or the Plotly version change.
+def _get_settings_key() -> tuple:
+    return (
+        plotly.__version__,
+        charts.SERVER_SIDE_BINNING,
+        charts.MAX_SCATTER_POINTS,
+    )
+
+
+# Function to get the path of the spec of a figure in the disk cache
+def _get_spec_path(key: tuple) -> Path:
+    return Path(CACHE_DIR) / (
+        hashlib.sha256(repr(key).encode()).hexdigest() + SPEC_SUFFIX
+    )
+
+
+# Function to read the spec of a figure from the disk cache (None if not cached)
+def _read_spec(key: tuple) -> Optional[str]:
+    spec_path = _get_spec_path(key)
+    try:
+        spec = spec_path.read_text()
+    except OSError:
+        return None
+    # Touch the file, so the least recently used specs are removed first
+    os.utime(spec_path)
+    return spec
+
+
+# Function to write the spec of a figure to the disk cache
+def _write_spec(key: tuple, spec: str) -> None:
+    spec_path = _get_spec_path(key)
+    spec_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so readers never see a half-written spec
+    temporary_path = spec_path.with_name(spec_path.name + ".tmp")
+    temporary_path.write_text(spec)
+    os.replace(temporary_path, spec_path)
+
+    spec_files = sorted(
+        (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+        for entry in os.scandir(spec_path.parent)
+        if entry.name.endswith(SPEC_SUFFIX)
+    )
+    disk_bytes = sum(size for _, size, _ in spec_files)
+    for _, size, path in spec_files:
+        if disk_bytes <= MAX_DISK_CACHE_BYTES:
+            break
+        os.remove(path)
+        disk_bytes -= size
+
+
+# Function to add a figure to the in-memory cache, evicting the least recently used
+def _store_figure(key: tuple, figure: go.Figure, spec_bytes: int) -> None:
+    global _cache_bytes
+    with _lock:
+        if key in _figures:
+            return
+        _figures[key] = (figure, spec_bytes)
+        _cache_bytes += spec_bytes
+        while _cache_bytes > MAX_CACHE_BYTES and _figures:
+            _, (_, evicted_bytes) = _figures.popitem(last=False)
+            _cache_bytes -= evicted_bytes
+
+
+# Function to get a figure of a page from the cache, or build and cache it
+#
+# A figure is identified by its page and chart id, the dataset version, the
+# active filter and the parameters it is built with (e.g. histnorm) - build must
+# not depend on anything else. An unchanged rerun of a page costs a dictionary
+# lookup. Every caller gets the same figure object, so pages must not modify
+# the figures they get.
+def get_cached_figure(
+    page: str,
+    chart_id: str,
+    build: Callable[[], go.Figure],
+    catalog_filter: Optional[CatalogFilter] = None,
+    **params,
+) -> go.Figure:
+    if catalog_filter is not None and not catalog_filter.is_active():
+        catalog_filter = None
+    key = (
+        page,
+        chart_id,
+        get_dataset_version(),
+        catalog_filter,
+        tuple(sorted(params.items())),
+        _get_settings_key(),
+    )
+
+    with _lock:
+        cached_figure = _figures.get(key)
+        if cached_figure is not None:
+            _figures.move_to_end(key)
+    record_cache_access("figure", cached_figure is not None)
+    if cached_figure is not None:
+        return cached_figure[0]
+
+    spec = _read_spec(key) if CACHE_DIR else None
+    if CACHE_DIR:
+        record_cache_access("figure_disk", spec is not None)
+    if spec is not None:
+        figure = pio.from_json(spec)
+    else:
+        figure = build()
+        spec = figure.to_json()
+        if CACHE_DIR:
+            _write_spec(key, spec)
+    _store_figure(key, figure, len(spec))
+    return figure
@@ -0,0 +1,315 @@
+import datetime
+from typing import Optional
+
+import pandas as pd
+from plotly import graph_objects as go
+
+from netflix.aggregates import get_counts
+from netflix.backends import get_query_backend
+from netflix.charts import (
+    CONTENT_TYPE_COLORS,
+    build_cooccurrence_heatmap,
+    build_count_histogram,
+    build_distinct_counts_chart,
+    build_duration_scatter,
+    build_growth_chart,
+    build_quantile_bands,
+)
+from netflix.cooccurrence import (
+    COOCCURRENCE_COLUMNS,
+    COOCCURRENCE_PAIRS,
+    get_cooccurrence_matrix,
+)
+from netflix.figure_cache import get_cached_figure
+from netflix.filters import CatalogFilter
+from netflix.growth import get_growth_series
+from netflix.sketches import DISTINCT_COLUMNS, get_grouped_sketches
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Values of the "Do you want to normalize data?" checkbox of the pages 2 - 4
+HISTNORMS = [None, "percent"]
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+#
+# Every figure of the analysis pages is built here, so the pages and the warm-up
+# (see netflix.warmup) get it from the figure cache under the same key.
+
+
+# Function to build the histogram of the number of Movies and TV shows per value of a dimension
+def _build_histogram(
+    dimension: str,
+    catalog_filter: Optional[CatalogFilter],
+    histnorm: Optional[str],
+    xaxis_title: str,
+    yaxis_title: str,
+    title: Optional[str] = None,
+) -> go.Figure:
+    fig = build_count_histogram(
+        get_counts(dimension, catalog_filter),
+        dimension,
+        histnorm=histnorm,
+        title=title,
+    )
+    fig.update_layout(yaxis_title=yaxis_title)
+    fig.update_layout(xaxis_title=xaxis_title)
+    return fig
+
+
+# Function to get the histogram of the number of Movies and TV shows released per year (page 2)
+def get_release_year_histogram(
+    catalog_filter: Optional[CatalogFilter], histnorm: Optional[str]
+) -> go.Figure:
+    return get_cached_figure(
+        "overall_trend",
+        "release_year_histogram",
+        lambda: _build_histogram(
+            "release_year",
+            catalog_filter,
+            histnorm,
+            xaxis_title="Year of Release",
+            yaxis_title="Number of Releases",
+        ),
+        catalog_filter,
+        histnorm=histnorm,
+    )
+
+
+# Function to get the histogram of the number of Movies and TV shows per rating (page 3)
+def get_rating_histogram(
+    catalog_filter: Optional[CatalogFilter], histnorm: Optional[str]
+) -> go.Figure:
+    return get_cached_figure(
+        "rating_popularity",
+        "rating_histogram",
+        lambda: _build_histogram(
+            "rating",
+            catalog_filter,
+            histnorm,
+            xaxis_title="TV Ratings",
+            yaxis_title="Number of movies / TV Shows",
+            title="Distribution of number of Movies and TV shows based on their ratings",
+        ),
+        catalog_filter,
+        histnorm=histnorm,
+    )
+
+
+# Function to get the histogram of the number of Movies and TV shows added per year (page 4)
+def get_year_added_histogram(
+    catalog_filter: Optional[CatalogFilter], histnorm: Optional[str]
+) -> go.Figure:
+    return get_cached_figure(
+        "library_growth",
+        "year_added_histogram",
+        lambda: _build_histogram(
+            "year_added",
+            catalog_filter,
+            histnorm,
+            xaxis_title="Year added to Netflix",
+            yaxis_title="Number of Movies / TV Show",
+            title="Frequency of content additions to Netflix over time",
+        ),
+        catalog_filter,
+        histnorm=histnorm,
+    )
+
+
+# Function to build the chart of the distinct number of directors and cast members
+# per release year, estimated from the sketches of the catalog
+def _build_distinct_people_chart(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    grouped_sketches = get_grouped_sketches("release_year", catalog_filter)
+    distinct_counts = pd.concat(
+        [
+            grouped_sketches.get_distinct_counts(column).assign(column=column)
+            for column in DISTINCT_COLUMNS
+        ],
+        ignore_index=True,
+    )
+    fig = build_distinct_counts_chart(
+        distinct_counts,
+        "release_year",
+        title="Distinct directors and cast members of the titles released per year",
+    )
+    fig.update_layout(yaxis_title="Number of people (estimated)")
+    fig.update_layout(xaxis_title="Year of Release")
+    return fig
+
+
+# Function to get the chart of the distinct number of directors and cast members
+# per release year (page 2)
+def get_distinct_people_chart(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    return get_cached_figure(
+        "overall_trend",
+        "distinct_people_chart",
+        lambda: _build_distinct_people_chart(catalog_filter),
+        catalog_filter,
+    )
+
+
+# Function to get the chart of the titles added per bucket and of the library size
+# between two dates (page 4)
+def get_growth_chart(
+    catalog_filter: Optional[CatalogFilter],
+    start: datetime.date,
+    end: datetime.date,
+    granularity: str,
+) -> go.Figure:
+    return get_cached_figure(
+        "library_growth",
+        "growth_chart",
+        lambda: build_growth_chart(
+            get_growth_series(catalog_filter).resample(start, end, granularity),
+            title=f"{granularity} additions and size of the library",
+        ),
+        catalog_filter,
+        start=start,
+        end=end,
+        granularity=granularity,
+    )
+
+
+# Function to build the scatter plot of the duration of one type of content against
+# the release year - a density heatmap once there are too many titles to draw one
+# marker each
+def _build_duration_scatter(
+    content_type: str,
+    duration_column: str,
+    catalog_filter: Optional[CatalogFilter],
+    title: str,
+    yaxis_title: str,
+) -> go.Figure:
+    fig = build_duration_scatter(
+        get_query_backend().get_durations(
+            content_type, duration_column, catalog_filter
+        ),
+        x="release_year",
+        y=duration_column,
+        title=title,
+        labels={duration_column: "duration"},
+        height=800,
+    )
+    fig.update_layout(yaxis_title=yaxis_title)
+    fig.update_layout(xaxis_title="Year of Release")
+    return fig
+
+
+# Function to get the scatter plot of the duration of movies against their release year (page 5)
+def get_movies_scatter(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    return get_cached_figure(
+        "duration",
+        "movies_scatter",
+        lambda: _build_duration_scatter(
+            "Movie",
+            "duration_minutes",
+            catalog_filter,
+            title="Distribution of duration of Movies against the year of release",
+            yaxis_title="Duration (in mins)",
+        ),
+        catalog_filter,
+    )
+
+
+# Function to get the scatter plot of the duration of TV shows against their release year (page 5)
+def get_tv_shows_scatter(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    return get_cached_figure(
+        "duration",
+        "tv_shows_scatter",
+        lambda: _build_duration_scatter(
+            "TV Show",
+            "season_count",
+            catalog_filter,
+            title="Distribution of duration of TV shows against the year of release",
+            yaxis_title="Duration (no of seasons)",
+        ),
+        catalog_filter,
+    )
+
+
+# Function to build the quantile bands of the duration of one type of content per
+# release year, from the sketches of the catalog
+def _build_duration_bands(
+    content_type: str,
+    catalog_filter: Optional[CatalogFilter],
+    title: str,
+    yaxis_title: str,
+) -> go.Figure:
+    duration_quantiles = get_grouped_sketches(
+        "release_year", catalog_filter
+    ).get_duration_quantiles()
+    duration_quantiles = duration_quantiles[duration_quantiles["type"] == content_type]
+    fig = build_quantile_bands(
+        duration_quantiles,
+        x="release_year",
+        color=CONTENT_TYPE_COLORS.get(content_type),
+        title=title,
+    )
+    # An empty figure when the filter keeps no title of the type
+    if duration_quantiles.empty:
+        fig.add_annotation(text="No titles match the selected filters", showarrow=False)
+    fig.update_layout(yaxis_title=yaxis_title)
+    fig.update_layout(xaxis_title="Year of Release")
+    return fig
+
+
+# Function to get the quantile bands of the duration of movies per release year (page 5)
+def get_movies_bands(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    return get_cached_figure(
+        "duration",
+        "movies_bands",
+        lambda: _build_duration_bands(
+            "Movie",
+            catalog_filter,
+            title="Quantiles of the duration of Movies per year of release",
+            yaxis_title="Duration (in mins)",
+        ),
+        catalog_filter,
+    )
+
+
+# Function to get the quantile bands of the duration of TV shows per release year (page 5)
+def get_tv_shows_bands(catalog_filter: Optional[CatalogFilter]) -> go.Figure:
+    return get_cached_figure(
+        "duration",
+        "tv_shows_bands",
+        lambda: _build_duration_bands(
+            "TV Show",
+            catalog_filter,
+            title="Quantiles of the duration of TV shows per year of release",
+            yaxis_title="Duration (no of seasons)",
+        ),
+        catalog_filter,
+    )
+
+
+# Function to build the heatmap of the top terms of a pair of comma-joined columns
+def _build_cooccurrence_heatmap(
+    catalog_filter: Optional[CatalogFilter], pair: str, top_n: int
+) -> go.Figure:
+    row_column, column_column = COOCCURRENCE_PAIRS[pair]
+    counts = get_cooccurrence_matrix(row_column, column_column, catalog_filter).get_top(
+        top_n
+    )
+    return build_cooccurrence_heatmap(
+        counts,
+        title=f"Number of titles per {COOCCURRENCE_COLUMNS[row_column].lower()} and "
+        f"{COOCCURRENCE_COLUMNS[column_column].lower()} - top {top_n}",
+        hide_diagonal=row_column == column_column,
+    )
+
+
+# Function to get the heatmap of the number of titles having every pair of the top
+# terms of two comma-joined columns (page 7)
+def get_cooccurrence_heatmap(
+    catalog_filter: Optional[CatalogFilter], pair: str, top_n: int
+) -> go.Figure:
+    return get_cached_figure(
+        "cooccurrence",
+        "cooccurrence_heatmap",
+        lambda: _build_cooccurrence_heatmap(catalog_filter, pair, top_n),
+        catalog_filter,
+        pair=pair,
+        top_n=top_n,
+    )
@@ -0,0 +1,169 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.indexes import get_inverted_index
+from netflix.loader import (
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.metrics import record_cache_access
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Columns the cross filter reads - the multi-valued ones go through their inverted index
+FILTER_COLUMNS = ["type", "rating", "release_year", "year_added"]
+
+# Number of combined filter masks, and of masks of single dimensions, kept in memory
+MAX_CACHED_MASKS = 64
+MAX_CACHED_DIMENSION_MASKS = 64
+
+
+# -------------------------------------------------------------------------------------------------
+# Cross filter applied to every analysis page
+#
+# An empty tuple or a None range means the dimension is not filtered. Within a
+# dimension the selected values are OR-ed, and the dimensions are AND-ed.
+@dataclass(frozen=True)
+class CatalogFilter:
+    types: Tuple[str, ...] = ()
+    countries: Tuple[str, ...] = ()
+    genres: Tuple[str, ...] = ()
+    ratings: Tuple[str, ...] = ()
+    release_years: Optional[Tuple[int, int]] = None
+    years_added: Optional[Tuple[int, int]] = None
+
+    # Function to check if any dimension is filtered
+    def is_active(self) -> bool:
+        return bool(
+            self.types
+            or self.countries
+            or self.genres
+            or self.ratings
+            or self.release_years
+            or self.years_added
+        )
+
+
+# Process-wide caches - masks of single dimensions and of whole filters, per dataset version
+_lock = threading.Lock()
+_dimension_masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_filter_masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the mask of the rows whose categorical column has one of some values
+def _get_category_mask(values: pd.Series, selected: Tuple[str, ...]) -> np.ndarray:
+    selected_codes = [
+        code
+        for code, category in enumerate(values.cat.categories)
+        if category in selected
+    ]
+    return np.isin(values.cat.codes.to_numpy(), selected_codes)
+
+
+# Function to get the mask of the rows listing one of some terms in a multi-valued column
+def _get_term_mask(
+    column: str, selected: Tuple[str, ...], no_of_rows: int
+) -> np.ndarray:
+    mask = np.zeros(no_of_rows, dtype=bool)
+    mask[get_inverted_index(column).any_of(selected)] = True
+    return mask
+
+
+# Function to get the mask of the rows whose year is within a range (both ends included)
+def _get_range_mask(values: pd.Series, year_range: Tuple[int, int]) -> np.ndarray:
+    years = values.to_numpy(dtype="float64", na_value=np.nan)
+    return (years >= year_range[0]) & (years <= year_range[1])
+
+
+# Function to get the mask of a single filtered dimension, cached per dataset version
+#
+# The masks of the most recently used selections are cached - called with the
+# lock held.
+def _get_dimension_mask(dataset_version: str, dimension: str, selected) -> np.ndarray:
+    key = (dataset_version, dimension, selected)
+    mask = _dimension_masks.get(key)
+    if mask is not None:
+        _dimension_masks.move_to_end(key)
+        return mask
+
+    netflix_data = get_netflix_data(FILTER_COLUMNS)
+    if dimension == "types":
+        mask = _get_category_mask(netflix_data["type"], selected)
+    elif dimension == "ratings":
+        mask = _get_category_mask(netflix_data["rating"], selected)
+    elif dimension == "countries":
+        mask = _get_term_mask("country", selected, len(netflix_data))
+    elif dimension == "genres":
+        mask = _get_term_mask("listed_in", selected, len(netflix_data))
+    elif dimension == "release_years":
+        mask = _get_range_mask(netflix_data["release_year"], selected)
+    elif dimension == "years_added":
+        mask = _get_range_mask(netflix_data["year_added"], selected)
+    else:
+        raise ValueError(f"Unknown filter dimension: {dimension}")
+    mask.flags.writeable = False
+    _dimension_masks[key] = mask
+    if len(_dimension_masks) > MAX_CACHED_DIMENSION_MASKS:
+        _dimension_masks.popitem(last=False)
+    return mask
+
+
+# Function to get the boolean mask of the rows of the shared DataFrame kept by a filter
+#
+# Returns None when the filter is not active. The mask of every dimension is
+# computed once and the masks are combined with a bitwise AND. The combined
+# masks of the most recent filters are cached.
+def get_filter_mask(catalog_filter: CatalogFilter) -> Optional[np.ndarray]:
+    if not catalog_filter.is_active():
+        return None
+    dataset_version = get_dataset_version()
+    key = (dataset_version, catalog_filter)
+    with _lock:
+        mask = _filter_masks.get(key)
+        record_cache_access("filter_mask", mask is not None)
+        if mask is not None:
+            _filter_masks.move_to_end(key)
+            return mask
+
+        # Drop the masks of retired dataset versions
+        live_versions = get_live_dataset_versions()
+        for old_key in [k for k in _dimension_masks if k[0] not in live_versions]:
+            del _dimension_masks[old_key]
+        for old_key in [k for k in _filter_masks if k[0] not in live_versions]:
+            del _filter_masks[old_key]
+
+        mask = None
+        for dimension, selected in vars(catalog_filter).items():
+            if not selected:
+                continue
+            dimension_mask = _get_dimension_mask(dataset_version, dimension, selected)
+            mask = dimension_mask.copy() if mask is None else mask
+            np.bitwise_and(mask, dimension_mask, out=mask)
+        mask.flags.writeable = False
+
+        _filter_masks[key] = mask
+        if len(_filter_masks) > MAX_CACHED_MASKS:
+            _filter_masks.popitem(last=False)
+    return mask
+
+
+# Function to get the rows of a DataFrame kept by a filter
+#
+# The DataFrame must have the rows of the shared DataFrame, in the same order.
+def apply_filter(
+    netflix_data: pd.DataFrame, catalog_filter: Optional[CatalogFilter]
+) -> pd.DataFrame:
+    mask = None if catalog_filter is None else get_filter_mask(catalog_filter)
+    if mask is None:
+        return netflix_data
+    return netflix_data[mask]
@@ -0,0 +1,179 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.aggregates import COUNT_COLUMN
+from netflix.filters import CatalogFilter
+from netflix.loader import get_dataset_version, get_live_dataset_versions
+from netflix.metrics import record_cache_access, timed
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Buckets the growth of the library can be resampled to - label and pandas
+# frequency of the first day of every bucket
+GRANULARITIES = {
+    "Weekly": "W-MON",
+    "Monthly": "MS",
+    "Quarterly": "QS",
+}
+DEFAULT_GRANULARITY = "Monthly"
+
+PERIOD_COLUMN = "period"
+ADDITIONS_COLUMN = "additions"
+LIBRARY_SIZE_COLUMN = "library_size"
+
+# Number of growth series of filtered catalogs kept in memory
+MAX_CACHED_SERIES = 32
+
+# Process-wide cache - the growth series per dataset version and active filter
+_lock = threading.Lock()
+_growth_series: "OrderedDict[Tuple[str, Optional[CatalogFilter]], GrowthSeries]" = (
+    OrderedDict()
+)
+
+
+# -------------------------------------------------------------------------------------------------
+# Number of titles added to the library on every day, per type
+#
+# Day i is first_date + i days. cumulative_counts has a leading column of
+# zeros, so cumulative_counts[:, i] is the number of titles added before day i
+# and any window is the difference of two columns - the library size at a date
+# and the additions over a window cost O(1), resampling O(buckets).
+@dataclass(frozen=True)
+class GrowthSeries:
+    types: Tuple[str, ...]
+    first_date: pd.Timestamp
+    daily_counts: np.ndarray
+    cumulative_counts: np.ndarray
+    # Titles without a date_added, per type - they are not part of the series
+    undated_counts: np.ndarray
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        return self.first_date + pd.Timedelta(days=self.daily_counts.shape[1] - 1)
+
+    # Function to get the columns of cumulative_counts of the titles added before some dates
+    def _get_edges(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        days = (dates.normalize() - self.first_date).days.to_numpy()
+        return np.clip(days, 0, self.daily_counts.shape[1])
+
+    # Function to get the number of titles in the library at the end of a date, per type
+    def get_library_size(self, date) -> np.ndarray:
+        edges = self._get_edges(pd.DatetimeIndex([date]) + pd.Timedelta(days=1))
+        return self.cumulative_counts[:, edges[0]]
+
+    # Function to get the number of titles added from start to end (both included), per type
+    def get_additions(self, start, end) -> np.ndarray:
+        edges = self._get_edges(
+            pd.DatetimeIndex([start, pd.Timestamp(end) + pd.Timedelta(days=1)])
+        )
+        return self.cumulative_counts[:, edges[1]] - self.cumulative_counts[:, edges[0]]
+
+    # Function to get the additions and library size per bucket between two dates
+    #
+    # The first and last buckets are cut at start and end. One row per bucket
+    # and type, in long format like get_counts - see build_growth_chart.
+    def resample(self, start, end, granularity: str) -> pd.DataFrame:
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        bucket_starts = pd.date_range(start, end, freq=GRANULARITIES[granularity])
+        if len(bucket_starts) == 0 or bucket_starts[0] != start:
+            bucket_starts = bucket_starts.insert(0, start)
+        edges = self._get_edges(
+            bucket_starts.append(pd.DatetimeIndex([end + pd.Timedelta(days=1)]))
+        )
+        cumulative_counts = self.cumulative_counts[:, edges]
+        additions = np.diff(cumulative_counts, axis=1)
+        no_of_buckets = len(bucket_starts)
+        return pd.DataFrame(
+            {
+                PERIOD_COLUMN: np.tile(bucket_starts.to_numpy(), len(self.types)),
+                "type": pd.Categorical(
+                    np.repeat(self.types, no_of_buckets), categories=self.types
+                ),
+                ADDITIONS_COLUMN: additions.ravel(),
+                LIBRARY_SIZE_COLUMN: cumulative_counts[:, 1:].ravel(),
+            }
+        )
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to build the growth series from the number of titles per (type, date_added)
+#
+# daily_counts has one row per (type, date_added) as returned by
+# QueryBackend.get_daily_counts, so building the arrays does not depend on the
+# number of titles.
+def build_growth_series(daily_counts: pd.DataFrame) -> GrowthSeries:
+    types = tuple(daily_counts["type"].cat.categories)
+    type_codes = daily_counts["type"].cat.codes.to_numpy()
+    days = daily_counts["date_added"].to_numpy(dtype="datetime64[D]")
+    counts = daily_counts[COUNT_COLUMN].to_numpy(dtype=np.int64)
+
+    is_dated = ~np.isnat(days)
+    undated_counts = np.bincount(
+        type_codes[~is_dated], weights=counts[~is_dated], minlength=len(types)
+    ).astype(np.int64)
+    if is_dated.any():
+        first_day = days[is_dated].min()
+        day_numbers = (days[is_dated] - first_day).astype(np.int64)
+        no_of_days = int(day_numbers.max()) + 1
+    else:
+        first_day = np.datetime64("today", "D")
+        day_numbers = np.zeros(0, dtype=np.int64)
+        no_of_days = 1
+
+    daily_count_array = np.zeros((len(types), no_of_days), dtype=np.int64)
+    np.add.at(daily_count_array, (type_codes[is_dated], day_numbers), counts[is_dated])
+    cumulative_counts = np.zeros((len(types), no_of_days + 1), dtype=np.int64)
+    np.cumsum(daily_count_array, axis=1, out=cumulative_counts[:, 1:])
+    for array in [daily_count_array, cumulative_counts, undated_counts]:
+        array.flags.writeable = False
+    return GrowthSeries(
+        types=types,
+        first_date=pd.Timestamp(first_day),
+        daily_counts=daily_count_array,
+        cumulative_counts=cumulative_counts,
+        undated_counts=undated_counts,
+    )
+
+
+# Function to get the shared growth series of the current dataset version
+#
+# With an active filter the series only counts the titles kept by the filter.
+# The series of the most recent filters are cached.
+@timed("aggregate")
+def get_growth_series(catalog_filter: Optional[CatalogFilter] = None) -> GrowthSeries:
+    if catalog_filter is not None and not catalog_filter.is_active():
+        catalog_filter = None
+    dataset_version = get_dataset_version()
+    key = (dataset_version, catalog_filter)
+    growth_series = _growth_series.get(key)
+    record_cache_access("growth_series", growth_series is not None)
+    if growth_series is not None:
+        return growth_series
+
+    with _lock:
+        if key not in _growth_series:
+            # Drop the series of retired dataset versions
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _growth_series if k[0] not in live_versions]:
+                del _growth_series[old_key]
+
+            # The titles are counted per day by the query backend - see netflix.backends
+            from netflix.backends import get_query_backend
+
+            _growth_series[key] = build_growth_series(
+                get_query_backend().get_daily_counts(catalog_filter)
+            )
+            if len(_growth_series) > MAX_CACHED_SERIES:
+                # Evict the oldest series of a filtered catalog, never the full one
+                oldest_key = next(k for k in _growth_series if k[1] is not None)
+                del _growth_series[oldest_key]
+    return _growth_series[key]
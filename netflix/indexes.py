@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import reduce
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.loader import (
+    CLEAN_DATA_FILE,
+    get_dataset_file,
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.metrics import record_cache_access
+from netflix.schema import UNKNOWN
+from netflix.snapshot import INDEX_SUFFIX, get_source_metadata, is_snapshot_fresh
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Comma-joined columns that get an inverted index - one entry per person, country or genre
+INDEXED_COLUMNS = ["cast", "director", "country", "listed_in"]
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Inverted index of one multi-valued column
+#
+# The row ids of terms[i] are row_ids[offsets[i]:offsets[i + 1]], sorted. Row ids
+# are positions in the shared DataFrame of the same dataset version.
+@dataclass(frozen=True)
+class InvertedIndex:
+    column: str
+    terms: np.ndarray
+    offsets: np.ndarray
+    row_ids: np.ndarray
+
+    # Function to get the sorted row ids of one term (empty if it is unknown)
+    def lookup(self, term: str) -> np.ndarray:
+        position = int(np.searchsorted(self.terms, term))
+        if position == len(self.terms) or self.terms[position] != term:
+            return self.row_ids[:0]
+        return self.row_ids[self.offsets[position] : self.offsets[position + 1]]
+
+    # Function to get the number of rows of every term
+    def get_term_counts(self) -> pd.Series:
+        return pd.Series(np.diff(self.offsets), index=self.terms, name=self.column)
+
+    # Function to get the sorted row ids of the rows having every one of the terms
+    def all_of(self, terms: Iterable[str]) -> np.ndarray:
+        return intersect_row_ids(self.lookup(term) for term in terms)
+
+    # Function to get the sorted row ids of the rows having at least one of the terms
+    def any_of(self, terms: Iterable[str]) -> np.ndarray:
+        return union_row_ids(self.lookup(term) for term in terms)
+
+
+# Process-wide cache - one index per dataset version and column
+_lock = threading.Lock()
+_indexes: Dict[Tuple[str, str], InvertedIndex] = {}
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to intersect sorted row id arrays (AND), starting with the smallest one
+def intersect_row_ids(row_id_arrays: Iterable[np.ndarray]) -> np.ndarray:
+    row_id_arrays = sorted(row_id_arrays, key=len)
+    if not row_id_arrays:
+        return np.empty(0, dtype=np.int32)
+    return reduce(
+        lambda left, right: np.intersect1d(left, right, assume_unique=True),
+        row_id_arrays,
+    )
+
+
+# Function to merge sorted row id arrays (OR)
+def union_row_ids(row_id_arrays: Iterable[np.ndarray]) -> np.ndarray:
+    row_id_arrays = list(row_id_arrays)
+    if not row_id_arrays:
+        return np.empty(0, dtype=np.int32)
+    return np.unique(np.concatenate(row_id_arrays))
+
+
+# Function to split a comma-joined column into (row id, term) pairs
+#
+# Blank terms and the UNKNOWN placeholder are left out, as are duplicated
+# terms within a row.
+def split_terms(values: pd.Series) -> pd.Series:
+    terms = (
+        values.reset_index(drop=True)
+        .astype(object)
+        .str.split(",")
+        .explode()
+        .str.strip()
+    )
+    terms = terms[terms.notna() & (terms != "") & (terms != UNKNOWN)]
+    pairs = pd.DataFrame({"row_id": terms.index, "term": terms.values})
+    pairs = pairs.drop_duplicates()
+    return pd.Series(pairs["term"].values, index=pairs["row_id"].values)
+
+
+# Function to build the inverted index of a comma-joined column
+def build_inverted_index(values: pd.Series, column: str) -> InvertedIndex:
+    terms = split_terms(values)
+    codes, unique_terms = pd.factorize(terms, sort=True)
+    # A stable sort keeps the row ids of every term in ascending order
+    order = np.argsort(codes, kind="stable")
+    row_ids = terms.index.to_numpy()[order].astype(np.int32)
+    offsets = np.zeros(len(unique_terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(unique_terms)), out=offsets[1:])
+    return InvertedIndex(
+        column=column,
+        terms=np.asarray(unique_terms, dtype=str),
+        offsets=offsets,
+        row_ids=row_ids,
+    )
+
+
+# Function to get the path of the indexes compiled from a CSV file
+def get_indexes_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(INDEX_SUFFIX)
+
+
+# Function to write the inverted indexes of a cleaned CSV file next to it
+def compile_indexes(
+    csv_path: Path = CLEAN_DATA_FILE, columns: Sequence[str] = INDEXED_COLUMNS
+) -> Path:
+    from netflix.loader import read_netflix_data
+
+    csv_path = Path(csv_path)
+    indexes_path = get_indexes_path(csv_path)
+    source_metadata = get_source_metadata(csv_path)
+    netflix_data = read_netflix_data(csv_path, list(columns))
+
+    arrays = {
+        "source." + key.decode(): np.array(value)
+        for key, value in source_metadata.items()
+    }
+    for column in columns:
+        inverted_index = build_inverted_index(netflix_data[column], column)
+        arrays[column + ".terms"] = inverted_index.terms
+        arrays[column + ".offsets"] = inverted_index.offsets
+        arrays[column + ".row_ids"] = inverted_index.row_ids
+
+    # Write to a temporary file first, so readers never see half-written indexes
+    temporary_path = indexes_path.with_name(indexes_path.name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, indexes_path)
+    logger.info("Compiled the indexes of %s into %s", csv_path, indexes_path)
+    return indexes_path
+
+
+# Function to read the persisted inverted index of a column (None if missing or stale)
+def read_inverted_index(csv_path: Path, column: str) -> Optional[InvertedIndex]:
+    indexes_path = get_indexes_path(csv_path)
+    if not indexes_path.exists():
+        return None
+    with np.load(indexes_path) as arrays:
+        source_metadata = {
+            name[len("source.") :].encode(): arrays[name].item()
+            for name in arrays.files
+            if name.startswith("source.")
+        }
+        if column + ".terms" not in arrays.files:
+            return None
+        if not is_snapshot_fresh(source_metadata, csv_path):
+            logger.warning("Indexes %s are stale, rebuilding them", indexes_path)
+            return None
+        return InvertedIndex(
+            column=column,
+            terms=arrays[column + ".terms"],
+            offsets=arrays[column + ".offsets"],
+            row_ids=arrays[column + ".row_ids"],
+        )
+
+
+# Function to get the shared inverted index of a column for the current dataset version
+def get_inverted_index(column: str) -> InvertedIndex:
+    if column not in INDEXED_COLUMNS:
+        raise ValueError(f"No inverted index for the column: {column}")
+    dataset_version = get_dataset_version()
+    key = (dataset_version, column)
+    inverted_index = _indexes.get(key)
+    record_cache_access("inverted_index", inverted_index is not None)
+    if inverted_index is not None:
+        return inverted_index
+
+    with _lock:
+        if key not in _indexes:
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _indexes if k[0] not in live_versions]:
+                del _indexes[old_key]
+            inverted_index = read_inverted_index(
+                get_dataset_file(dataset_version), column
+            )
+            if inverted_index is None:
+                inverted_index = build_inverted_index(
+                    get_netflix_data([column])[column], column
+                )
+            _indexes[key] = inverted_index
+    return _indexes[key]
@@ -0,0 +1,370 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.loader import CLEAN_DATA_FILE, RAW_DATA_FILE
+from netflix.schema import CATALOG_COLUMNS, ISO_DATE_FORMAT, UNKNOWN
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Columns of the raw Kaggle dump (netflix_data.csv)
+RAW_COLUMNS = [column for column in CATALOG_COLUMNS if column != "year_added"]
+
+# Columns where a blank value is replaced by UNKNOWN
+COLUMNS_TO_FILL = ["director", "cast", "country", "rating"]
+
+RAW_DATE_FORMAT = "%B %d, %Y"
+DURATION_PATTERN = r"^\d+ min$"
+
+# Sidecar file with the content hash of every raw row behind the cleaned file
+MANIFEST_SUFFIX = ".manifest.csv"
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Statistics reported after an ingest run
+@dataclass(frozen=True)
+class IngestStats:
+    rows_read: int
+    rows_cleaned: int
+    rows_reused: int
+    rows_removed: int
+    invalid_dates: int
+    seconds: float
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the path of the manifest written next to a cleaned CSV file
+def get_manifest_path(clean_path: Path) -> Path:
+    return Path(clean_path).with_suffix(MANIFEST_SUFFIX)
+
+
+# Function to read a CSV file in chunks, keeping every value as a string
+def _read_csv_chunks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+
+# Function to get the content hash of every raw row
+def hash_raw_rows(raw_data: pd.DataFrame) -> pd.Series:
+    row_hashes = pd.util.hash_pandas_object(raw_data[RAW_COLUMNS], index=False)
+    row_hashes.index = raw_data["show_id"].values
+    return row_hashes
+
+
+# Function to clean a chunk of raw rows into the layout of netflix_clean_data.csv
+#
+# Returns the cleaned rows and the number of non-blank dates that could not be parsed.
+def clean_raw_data(raw_data: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    clean_data = raw_data[RAW_COLUMNS].copy()
+
+    # A few raw rows have the duration of a movie in the rating column
+    misplaced_duration = clean_data["rating"].str.match(DURATION_PATTERN) & (
+        clean_data["duration"] == ""
+    )
+    clean_data.loc[misplaced_duration, "duration"] = clean_data.loc[
+        misplaced_duration, "rating"
+    ]
+    clean_data.loc[misplaced_duration, "rating"] = ""
+
+    for column in COLUMNS_TO_FILL:
+        clean_data.loc[clean_data[column] == "", column] = UNKNOWN
+
+    # "September 25, 2021" -> "2021-09-25"
+    raw_dates = clean_data["date_added"].str.strip()
+    dates_added = pd.to_datetime(raw_dates, format=RAW_DATE_FORMAT, errors="coerce")
+    invalid_dates = int((dates_added.isna() & (raw_dates != "")).sum())
+    clean_data["date_added"] = dates_added.dt.strftime(ISO_DATE_FORMAT).fillna("")
+    clean_data["year_added"] = (
+        dates_added.dt.year.astype("Int64").astype(str).where(dates_added.notna())
+    ).fillna(UNKNOWN)
+    return clean_data, invalid_dates
+
+
+# Function to write a chunk of rows to a CSV file, with the header on the first chunk
+def _append_csv(data: pd.DataFrame, path: Path, is_first_chunk: bool) -> None:
+    data.to_csv(
+        path, mode="w" if is_first_chunk else "a", header=is_first_chunk, index=False
+    )
+
+
+# Function to load the manifest of a previous run (None if there is none)
+def _read_manifest(clean_path: Path) -> Optional[pd.Series]:
+    manifest_path = get_manifest_path(clean_path)
+    if not manifest_path.exists() or not Path(clean_path).exists():
+        return None
+    manifest = pd.read_csv(manifest_path, dtype={"show_id": str, "row_hash": "uint64"})
+    if manifest.empty:
+        return None
+    return manifest.set_index("show_id")["row_hash"]
+
+
+# Function to get the temporary path a file is written to before being swapped in
+def _get_temporary_path(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+# Function to write the content hashes of a chunk of raw rows to the manifest
+def _append_manifest(row_hashes: pd.Series, path: Path, is_first_chunk: bool) -> None:
+    manifest = pd.DataFrame(
+        {"show_id": row_hashes.index, "row_hash": row_hashes.values}
+    )
+    _append_csv(manifest, path, is_first_chunk)
+
+
+# Function to clean every raw row, one chunk at a time
+#
+# Returns the number of rows read, cleaned, reused and removed and the number
+# of invalid dates.
+def _run_full(
+    raw_path: Path, clean_output: Path, manifest_output: Path, chunksize: int
+) -> Tuple[int, int, int, int, int]:
+    rows_read = invalid_dates = 0
+    for chunk_number, raw_data in enumerate(_read_csv_chunks(raw_path, chunksize)):
+        clean_data, chunk_invalid_dates = clean_raw_data(raw_data)
+        row_hashes = hash_raw_rows(raw_data)
+        _append_csv(clean_data, clean_output, chunk_number == 0)
+        _append_manifest(row_hashes, manifest_output, chunk_number == 0)
+        rows_read += len(raw_data)
+        invalid_dates += chunk_invalid_dates
+    return rows_read, rows_read, 0, 0, invalid_dates
+
+
+# Function to raise a ValueError naming a duplicated show_id of a file, if any
+#
+# An incremental run matches the rows of two versions by show_id, so they have
+# to be unique - a full rebuild keeps duplicated rows as they are.
+def _check_unique_show_ids(show_ids: pd.Index, path: Path) -> None:
+    if show_ids.is_unique:
+        return
+    is_duplicated = show_ids.duplicated()
+    duplicated_show_id = show_ids[is_duplicated][0]
+    positions = np.flatnonzero(show_ids == duplicated_show_id)
+    raise ValueError(
+        f"{path} has {int(is_duplicated.sum())} duplicated show_ids "
+        f"(e.g. {duplicated_show_id!r} at rows {int(positions[0])} and "
+        f"{int(positions[1])}), run a full rebuild instead"
+    )
+
+
+# Function to clean only the raw rows that are new or changed since the last run
+#
+# Unchanged rows are copied from the existing cleaned file, changed rows are
+# replaced in place, rows missing from the raw file are dropped and new rows
+# are merged in at their position in the raw file, so the output is the same
+# as a full rebuild. Only the changed rows and the list of raw show_ids are
+# held in memory.
+#
+# Returns None when the rows of the previous run were reordered in the raw
+# file, as they cannot be copied in order then - see run_ingest.
+def _run_incremental(
+    raw_path: Path,
+    clean_path: Path,
+    clean_output: Path,
+    manifest_output: Path,
+    chunksize: int,
+    manifest: pd.Series,
+) -> Optional[Tuple[int, int, int, int, int]]:
+    _check_unique_show_ids(manifest.index, get_manifest_path(clean_path))
+
+    # Pass 1 - hash the raw rows and clean the ones that changed, keeping the raw
+    # position of the new ones
+    rows_read = invalid_dates = 0
+    last_manifest_position = -1
+    is_reordered = False
+    raw_show_ids: List[pd.Index] = []
+    changed_rows: List[pd.DataFrame] = []
+    new_rows: List[pd.DataFrame] = []
+    new_row_positions: List[np.ndarray] = []
+    for chunk_number, raw_data in enumerate(_read_csv_chunks(raw_path, chunksize)):
+        row_hashes = hash_raw_rows(raw_data)
+        # Positions in the manifest (-1 for new show_ids) via its cached hash table
+        manifest_positions = manifest.index.get_indexer(row_hashes.index)
+        is_new = manifest_positions < 0
+        is_changed = is_new | (manifest.values[manifest_positions] != row_hashes.values)
+        if is_changed.any():
+            clean_data, chunk_invalid_dates = clean_raw_data(raw_data[is_changed])
+            changed_rows.append(clean_data[~is_new[is_changed]])
+            new_rows.append(clean_data[is_new[is_changed]])
+            new_row_positions.append(rows_read + np.flatnonzero(is_new))
+            invalid_dates += chunk_invalid_dates
+
+        # The rows of the previous run have to keep their order
+        kept_positions = manifest_positions[~is_new]
+        if len(kept_positions):
+            is_reordered |= bool(
+                kept_positions[0] <= last_manifest_position
+                or (np.diff(kept_positions) <= 0).any()
+            )
+            last_manifest_position = int(kept_positions[-1])
+        _append_manifest(row_hashes, manifest_output, chunk_number == 0)
+        raw_show_ids.append(row_hashes.index)
+        rows_read += len(raw_data)
+
+    all_raw_show_ids = (
+        raw_show_ids[0].append(raw_show_ids[1:]) if raw_show_ids else pd.Index([])
+    )
+    _check_unique_show_ids(all_raw_show_ids, raw_path)
+    if is_reordered:
+        return None
+    empty_data = pd.DataFrame(columns=CATALOG_COLUMNS)
+    changed_data = pd.concat([empty_data] + changed_rows).set_index(
+        "show_id", drop=False
+    )
+    new_data = pd.concat([empty_data] + new_rows)
+    new_positions = np.concatenate([np.zeros(0, dtype=np.int64)] + new_row_positions)
+    rows_cleaned = len(changed_data) + len(new_data)
+
+    # Pass 2 - merge the changed and new rows into the existing cleaned file
+    rows_reused = rows_removed = 0
+    no_of_new_rows_written = 0
+    is_first_chunk = True
+    for clean_data in _read_csv_chunks(clean_path, chunksize):
+        raw_positions = all_raw_show_ids.get_indexer(clean_data["show_id"])
+        is_kept = raw_positions >= 0
+        rows_removed += int((~is_kept).sum())
+        clean_data = clean_data[is_kept]
+        raw_positions = raw_positions[is_kept]
+
+        changed_positions = changed_data.index.get_indexer(clean_data["show_id"])
+        is_changed = changed_positions >= 0
+        rows_reused += int((~is_changed).sum())
+        if is_changed.any():
+            clean_data = clean_data.copy()
+            clean_data.loc[is_changed, CATALOG_COLUMNS] = changed_data.iloc[
+                changed_positions[is_changed]
+            ][CATALOG_COLUMNS].values
+
+        # The new rows before the last kept row of the chunk go in between
+        if len(clean_data):
+            stop = int(np.searchsorted(new_positions, raw_positions[-1]))
+            if stop > no_of_new_rows_written:
+                order = np.argsort(
+                    np.concatenate(
+                        [raw_positions, new_positions[no_of_new_rows_written:stop]]
+                    ),
+                    kind="stable",
+                )
+                clean_data = pd.concat(
+                    [clean_data, new_data.iloc[no_of_new_rows_written:stop]]
+                ).iloc[order]
+                no_of_new_rows_written = stop
+        _append_csv(clean_data[CATALOG_COLUMNS], clean_output, is_first_chunk)
+        is_first_chunk = False
+
+    new_data = new_data.iloc[no_of_new_rows_written:]
+    if len(new_data) or is_first_chunk:
+        _append_csv(new_data[CATALOG_COLUMNS], clean_output, is_first_chunk)
+
+    return rows_read, rows_cleaned, rows_reused, rows_removed, invalid_dates
+
+
+# Function to build the cleaned CSV file from the raw Kaggle dump
+#
+# In incremental mode only the rows whose show_id is new or whose content hash
+# changed since the previous run are cleaned. Without a manifest from a
+# previous run, or when the raw file reordered its rows, a full rebuild is
+# done instead.
+def run_ingest(
+    raw_path: Path = RAW_DATA_FILE,
+    clean_path: Path = CLEAN_DATA_FILE,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    incremental: bool = False,
+) -> IngestStats:
+    start = time.perf_counter()
+    raw_path, clean_path = Path(raw_path), Path(clean_path)
+
+    manifest = _read_manifest(clean_path) if incremental else None
+    if incremental and manifest is None:
+        logger.info("No manifest next to %s, running a full rebuild", clean_path)
+
+    manifest_path = get_manifest_path(clean_path)
+    clean_output = _get_temporary_path(clean_path)
+    manifest_output = _get_temporary_path(manifest_path)
+    counts = None
+    if manifest is not None:
+        counts = _run_incremental(
+            raw_path, clean_path, clean_output, manifest_output, chunksize, manifest
+        )
+        if counts is None:
+            logger.info("Rows of %s were reordered, running a full rebuild", raw_path)
+    if counts is None:
+        counts = _run_full(raw_path, clean_output, manifest_output, chunksize)
+    rows_read, rows_cleaned, rows_reused, rows_removed, invalid_dates = counts
+
+    # Swap the new files in only once both are complete
+    os.replace(clean_output, clean_path)
+    os.replace(manifest_output, manifest_path)
+
+    ingest_stats = IngestStats(
+        rows_read=rows_read,
+        rows_cleaned=rows_cleaned,
+        rows_reused=rows_reused,
+        rows_removed=rows_removed,
+        invalid_dates=invalid_dates,
+        seconds=time.perf_counter() - start,
+    )
+    if invalid_dates:
+        logger.warning("%d date_added values could not be parsed", invalid_dates)
+    logger.info(
+        "Wrote %s: %d raw rows read, %d cleaned, %d reused, %d removed in %.2fs",
+        clean_path,
+        ingest_stats.rows_read,
+        ingest_stats.rows_cleaned,
+        ingest_stats.rows_reused,
+        ingest_stats.rows_removed,
+        ingest_stats.seconds,
+    )
+    return ingest_stats
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.ingest [raw_path] [clean_path]
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Clean the raw Netflix dump into netflix_clean_data.csv"
+    )
+    parser.add_argument("raw_path", nargs="?", type=Path, default=RAW_DATA_FILE)
+    parser.add_argument("clean_path", nargs="?", type=Path, default=CLEAN_DATA_FILE)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only clean rows that are new or changed since the last run",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="compile the columnar snapshot, indexes, title vectors and sketches of the "
+        "cleaned file afterwards",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_ingest(args.raw_path, args.clean_path, args.chunksize, args.incremental)
+    if args.snapshot:
+        from netflix.indexes import compile_indexes
+        from netflix.similarity import compile_title_vectors
+        from netflix.sketches import compile_sketches
+        from netflix.snapshot import compile_snapshot
+
+        compile_snapshot(args.clean_path)
+        compile_indexes(args.clean_path)
+        compile_title_vectors(args.clean_path)
+        compile_sketches(args.clean_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from netflix.metrics import record_cache_access, timed
+from netflix.schema import (
+    ALL_COLUMNS,
+    CATALOG_COLUMNS,
+    apply_schema,
+    get_csv_dtypes,
+    get_malformed_durations,
+    get_memory_breakdown,
+    get_source_columns,
+    validate_columns,
+)
+from netflix.snapshot import COMPILED_SUFFIXES, get_snapshot_path, read_snapshot
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RAW_DATA_FILE = PROJECT_ROOT / "netflix_data.csv"
+
+# Set the environment variable NETFLIX_DATA_FILE to serve another cleaned catalog,
+# e.g. a synthetic one in benchmarks
+CLEAN_DATA_FILE = Path(
+    os.environ.get("NETFLIX_DATA_FILE", PROJECT_ROOT / "netflix_clean_data.csv")
+)
+
+# Directory the data file of every dataset version is linked into, so a version
+# is always read from its own file - set NETFLIX_VERSIONS_DIR to change it
+VERSIONS_DIR = Path(
+    os.environ.get("NETFLIX_VERSIONS_DIR", CLEAN_DATA_FILE.parent / ".dataset_versions")
+)
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Load statistics reported after the dataset has been parsed
+@dataclass(frozen=True)
+class LoadStats:
+    version: str
+    path: str
+    source: str
+    rows: int
+    columns: int
+    load_seconds: float
+    frame_bytes: int
+    column_bytes: Dict[str, int]
+    rss_bytes: Optional[int]
+
+
+# -------------------------------------------------------------------------------------------------
+# Version of the dataset served by the app - see netflix.reload
+@dataclass(frozen=True)
+class DatasetVersion:
+    version: str
+    fingerprint: Optional[str]
+    activated_at: float
+
+
+# Process-wide cache - one DataFrame per dataset version and set of columns,
+# shared by every session
+_lock = threading.Lock()
+_netflix_data: Dict[str, Dict[Tuple[str, ...], pd.DataFrame]] = {}
+_load_locks: Dict[str, threading.Lock] = {}
+_load_stats: Dict[Tuple[str, Tuple[str, ...]], LoadStats] = {}
+
+# The active version is the one new script runs start with. The live versions
+# are the ones whose data is kept - the active one, the previous one while the
+# runs started before a reload finish, and the one being built by a reload.
+_active_version: Optional[str] = None
+_live_versions: FrozenSet[str] = frozenset()
+_dataset_versions: Dict[str, DatasetVersion] = {}
+
+# Data file of every live dataset version, in its directory of VERSIONS_DIR
+_dataset_files: Dict[str, Path] = {}
+
+# Version the script run of the current thread is pinned to
+_pinned = threading.local()
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the resident set size of the current process in bytes
+def get_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is the peak RSS - kilobytes on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+# Function to parse the cleaned CSV file into a DataFrame typed as per CATALOG_SCHEMA
+def read_netflix_data(
+    path: Path = CLEAN_DATA_FILE, columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    usecols = None if columns is None else get_source_columns(columns)
+    return apply_schema(
+        pd.read_csv(path, usecols=usecols, dtype=get_csv_dtypes()), columns
+    )
+
+
+# Function to get the cache key of a list of columns (all columns if None)
+def _get_columns_key(columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    if columns is None:
+        return tuple(CATALOG_COLUMNS)
+    validate_columns(columns)
+    # Keep schema order, so the same set of columns always hits the same entry
+    return tuple(column for column in ALL_COLUMNS if column in columns)
+
+
+# Function to load the given columns of a dataset version from its snapshot, or its
+# CSV file as a fallback
+@timed("load")
+def _load_netflix_data(
+    dataset_version: str, columns_key: Tuple[str, ...]
+) -> pd.DataFrame:
+    start = time.perf_counter()
+    data_file = get_dataset_file(dataset_version)
+    source = "snapshot"
+    netflix_data = read_snapshot(data_file, columns_key)
+    if netflix_data is None:
+        source = "csv"
+        netflix_data = read_netflix_data(data_file, columns_key)
+    load_seconds = time.perf_counter() - start
+    column_bytes = get_memory_breakdown(netflix_data)
+
+    load_stats = LoadStats(
+        version=dataset_version,
+        path=str(data_file),
+        source=source,
+        rows=len(netflix_data),
+        columns=len(netflix_data.columns),
+        load_seconds=load_seconds,
+        frame_bytes=int(column_bytes.sum()),
+        column_bytes={column: int(nbytes) for column, nbytes in column_bytes.items()},
+        rss_bytes=get_rss_bytes(),
+    )
+    logger.info(
+        "Loaded %d columns of %s from %s: %d rows in %.3fs, frame %.1f MB, "
+        "process RSS %s",
+        load_stats.columns,
+        load_stats.path,
+        load_stats.source,
+        load_stats.rows,
+        load_stats.load_seconds,
+        load_stats.frame_bytes / 1e6,
+        (
+            "n/a"
+            if load_stats.rss_bytes is None
+            else "%.1f MB" % (load_stats.rss_bytes / 1e6)
+        ),
+    )
+    logger.info(
+        "Memory per column: %s",
+        ", ".join(
+            "%s=%.1f kB" % (column, nbytes / 1e3)
+            for column, nbytes in load_stats.column_bytes.items()
+        ),
+    )
+    if "duration" in columns_key and "duration_minutes" in columns_key:
+        malformed_durations = get_malformed_durations(netflix_data)
+        if len(malformed_durations):
+            logger.warning(
+                "%d titles have a malformed duration: %s",
+                len(malformed_durations),
+                ", ".join(map(str, malformed_durations.unique()[:10])),
+            )
+    _load_stats[(dataset_version, columns_key)] = load_stats
+    return netflix_data
+
+
+# Function to get the shared, read-only Netflix DataFrame
+#
+# Only the given columns (all of CATALOG_COLUMNS by default) are loaded - the
+# numeric duration columns of DERIVED_SCHEMA can be requested as well. Each set of
+# columns is read once per dataset version from the memory-mapped snapshot, or
+# parsed from the CSV file when the snapshot is missing or stale - those of the
+# version, linked when it was created, not the current data file. Every caller
+# gets the same DataFrame object, so pages must never modify it in place.
+def get_netflix_data(columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    columns_key = _get_columns_key(columns)
+    dataset_version = get_dataset_version()
+    netflix_data = _netflix_data.get(dataset_version, {}).get(columns_key)
+    record_cache_access("dataframe", netflix_data is not None)
+    if netflix_data is not None:
+        return netflix_data
+
+    # A load of one version (e.g. by a reload) never blocks the loads of another one
+    with _lock:
+        version_data = _netflix_data.setdefault(dataset_version, {})
+        load_lock = _load_locks.setdefault(dataset_version, threading.Lock())
+    with load_lock:
+        if columns_key not in version_data:
+            version_data[columns_key] = _load_netflix_data(dataset_version, columns_key)
+    return version_data[columns_key]
+
+
+# Function to get the path of the file the dataset is loaded from
+#
+# A catalog served from a snapshot alone (e.g. a synthetic one) has no CSV file.
+def get_data_file_path(csv_path: Path = CLEAN_DATA_FILE) -> Path:
+    if csv_path.exists():
+        return csv_path
+    return get_snapshot_path(csv_path)
+
+
+# Function to get the version of the data file from its size and modification time
+def get_data_file_version(csv_path: Path = CLEAN_DATA_FILE) -> str:
+    source_stat = get_data_file_path(csv_path).stat()
+    return "%d-%d" % (source_stat.st_size, source_stat.st_mtime_ns)
+
+
+# Function to get the directory of VERSIONS_DIR holding the dataset versions of
+# this process
+def _get_process_versions_dir() -> Path:
+    return VERSIONS_DIR / str(os.getpid())
+
+
+# Function to remove the dataset versions left behind by processes that exited
+def _remove_orphaned_versions() -> None:
+    if not VERSIONS_DIR.is_dir():
+        return
+    for process_dir in VERSIONS_DIR.iterdir():
+        try:
+            os.kill(int(process_dir.name), 0)
+        except ProcessLookupError:
+            shutil.rmtree(process_dir, ignore_errors=True)
+        except (ValueError, OSError):
+            pass
+
+
+# Function to link the data file, and the files compiled from it, into the
+# directory of its version in VERSIONS_DIR - returns the version and linked data file
+#
+# Hard links keep the content of a version when the data file is replaced (files
+# are copied where links are not supported), so lazy loads and artifacts of the
+# version never read a newer file. The version expected is checked, as the
+# data file may be replaced between its version is taken and it is linked.
+def _link_dataset_files(dataset_version: Optional[str] = None) -> Tuple[str, Path]:
+    process_dir = _get_process_versions_dir()
+    linking_dir = process_dir / ("linking-" + uuid.uuid4().hex)
+    linking_dir.mkdir(parents=True)
+    try:
+        source_paths = [CLEAN_DATA_FILE] + [
+            CLEAN_DATA_FILE.with_suffix(suffix) for suffix in COMPILED_SUFFIXES
+        ]
+        for source_path in source_paths:
+            target_path = linking_dir / source_path.name
+            try:
+                os.link(source_path, target_path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                shutil.copy2(source_path, target_path)
+
+        linked_version = get_data_file_version(linking_dir / CLEAN_DATA_FILE.name)
+        if dataset_version is not None and linked_version != dataset_version:
+            raise ValueError(
+                f"The data file changed while linking the dataset version "
+                f"{dataset_version}: {linked_version}"
+            )
+        version_dir = process_dir / linked_version
+        if version_dir.exists():
+            # Already linked for a live version - the files are the same
+            shutil.rmtree(linking_dir, ignore_errors=True)
+        else:
+            linking_dir.rename(version_dir)
+    except BaseException:
+        shutil.rmtree(linking_dir, ignore_errors=True)
+        raise
+    return linked_version, version_dir / CLEAN_DATA_FILE.name
+
+
+# Function to get the path of the data file of a live dataset version (the
+# current one by default), to read it or the files compiled from it
+#
+# It is named as the data file, and may not exist when the version is served
+# from a snapshot alone. Raises a ValueError for a version that is not live, so
+# nothing is ever loaded for a retired version.
+def get_dataset_file(dataset_version: Optional[str] = None) -> Path:
+    if dataset_version is None:
+        dataset_version = get_dataset_version()
+    data_file = _dataset_files.get(dataset_version)
+    if data_file is None:
+        raise ValueError(f"Unknown dataset version: {dataset_version}")
+    return data_file
+
+
+# Function to get the active dataset version, the one new script runs start with
+def get_active_dataset_version() -> str:
+    global _active_version, _live_versions
+    if _active_version is None:
+        with _lock:
+            if _active_version is None:
+                _remove_orphaned_versions()
+                dataset_version, data_file = _link_dataset_files()
+                _dataset_files[dataset_version] = data_file
+                _dataset_versions[dataset_version] = DatasetVersion(
+                    dataset_version, None, time.time()
+                )
+                _live_versions = _live_versions | {dataset_version}
+                _active_version = dataset_version
+    return _active_version
+
+
+# Function to get the version of the dataset the shared DataFrames are loaded from
+#
+# Derived artifacts (aggregates, indexes, ...) are cached per dataset version.
+# It is the version the current thread is pinned to while that one is live, and
+# the active version otherwise. Only netflix.reload looks at the data file
+# itself, so a script run never sees a new file half way through.
+def get_dataset_version() -> str:
+    pinned_version = getattr(_pinned, "version", None)
+    if pinned_version is not None and pinned_version in _live_versions:
+        return pinned_version
+    return get_active_dataset_version()
+
+
+# Function to get the versions whose data is kept - caches drop every other version
+def get_live_dataset_versions() -> FrozenSet[str]:
+    get_active_dataset_version()
+    return _live_versions
+
+
+# Function to get the description of a dataset version (None if unknown)
+def get_dataset_version_info(dataset_version: str) -> Optional[DatasetVersion]:
+    return _dataset_versions.get(dataset_version)
+
+
+# Function to pin the current thread to a dataset version (the active one by default)
+def pin_dataset_version(dataset_version: Optional[str] = None) -> str:
+    if dataset_version is None:
+        dataset_version = get_active_dataset_version()
+    _pinned.version = dataset_version
+    return dataset_version
+
+
+# Function to unpin the current thread, so it follows the active dataset version
+def unpin_dataset_version() -> None:
+    _pinned.version = None
+
+
+# Function to add a new dataset version - its data is kept until it is retired
+#
+# The version is the one of the current data file, which is linked for it.
+def add_dataset_version(dataset_version: str, fingerprint: Optional[str]) -> None:
+    global _live_versions
+    get_active_dataset_version()
+    _, data_file = _link_dataset_files(dataset_version)
+    with _lock:
+        _dataset_files[dataset_version] = data_file
+        _dataset_versions[dataset_version] = DatasetVersion(
+            dataset_version, fingerprint, time.time()
+        )
+        _live_versions = _live_versions | {dataset_version}
+
+
+# Function to set the content fingerprint of a dataset version
+def set_dataset_fingerprint(dataset_version: str, fingerprint: str) -> None:
+    with _lock:
+        version_info = _dataset_versions.get(dataset_version)
+        if version_info is not None:
+            _dataset_versions[dataset_version] = DatasetVersion(
+                dataset_version, fingerprint, version_info.activated_at
+            )
+
+
+# Function to make a live dataset version the active one - returns the previous one
+#
+# The swap is a single assignment, so every script run starts either on the
+# old version or on the new one.
+def activate_dataset_version(dataset_version: str) -> str:
+    global _active_version
+    previous_version = get_active_dataset_version()
+    with _lock:
+        if dataset_version not in _live_versions:
+            raise ValueError(f"Unknown dataset version: {dataset_version}")
+        _dataset_versions[dataset_version] = DatasetVersion(
+            dataset_version,
+            _dataset_versions[dataset_version].fingerprint,
+            time.time(),
+        )
+        _active_version = dataset_version
+    return previous_version
+
+
+# Function to drop the data of a dataset version that is not active anymore
+#
+# The derived caches drop their artifacts of the version on their next miss.
+def retire_dataset_version(dataset_version: str) -> None:
+    global _live_versions
+    with _lock:
+        if dataset_version == _active_version:
+            return
+        _live_versions = _live_versions - {dataset_version}
+        _netflix_data.pop(dataset_version, None)
+        _load_locks.pop(dataset_version, None)
+        _dataset_versions.pop(dataset_version, None)
+        for key in [k for k in _load_stats if k[0] == dataset_version]:
+            del _load_stats[key]
+        data_file = _dataset_files.pop(dataset_version, None)
+    # Memory-mapped files stay readable by the runs still using them
+    if data_file is not None:
+        shutil.rmtree(data_file.parent, ignore_errors=True)
+
+
+# Function to get the sets of columns loaded for a dataset version
+def get_loaded_columns(dataset_version: str) -> List[Tuple[str, ...]]:
+    return list(_netflix_data.get(dataset_version, {}))
+
+
+# Function to get the statistics of a shared DataFrame load of the current dataset
+# version (None if not loaded yet)
+def get_load_stats(columns: Optional[Sequence[str]] = None) -> Optional[LoadStats]:
+    return _load_stats.get((get_dataset_version(), _get_columns_key(columns)))
+
+
+# Function to get the statistics of every shared DataFrame of the live dataset versions
+def get_all_load_stats() -> List[LoadStats]:
+    return list(_load_stats.values())
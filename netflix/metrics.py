@@ -0,0 +1,293 @@
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# The instrumentation is cheap enough to stay on in production - set the
+# environment variable NETFLIX_METRICS=0 to turn it off
+METRICS_ENABLED = os.environ.get("NETFLIX_METRICS", "1") != "0"
+
+# Set NETFLIX_METRICS_FILE to write the metrics in the Prometheus text format to
+# a file (at most every METRICS_FILE_INTERVAL seconds), and NETFLIX_METRICS_PORT
+# to serve them on http://127.0.0.1:<port>/metrics
+METRICS_FILE = os.environ.get("NETFLIX_METRICS_FILE")
+METRICS_PORT = os.environ.get("NETFLIX_METRICS_PORT")
+METRICS_FILE_INTERVAL = 10.0
+
+METRIC_PREFIX = "netflix_"
+STAGE_SECONDS = "stage_seconds"
+CACHE_REQUESTS = "cache_requests_total"
+PAGE_RUNS = "page_runs_total"
+
+# Label of the work done outside of any page, e.g. in the command-line tools
+NO_PAGE = "none"
+
+METRIC_HELP = {
+    STAGE_SECONDS: "Time spent per page and stage (load, aggregate, figure, render)",
+    CACHE_REQUESTS: "Lookups of the process-wide caches, by cache and result",
+    PAGE_RUNS: "Runs of every page script",
+}
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry - counters, and (count, sum, max) of timers, per name and labels
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_timers: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+_start_time = time.time()
+_last_file_write = 0.0
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+
+# Page of the script run of the current thread - Streamlit runs every session's
+# script in a thread of its own
+_current = threading.local()
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the registry key of a metric and its labels
+def _get_key(name: str, labels: Dict[str, str]) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# Function to add to a counter
+def increment(name: str, value: float = 1.0, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = _get_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+# Function to record one duration of a timer in seconds
+def observe(name: str, seconds: float, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = _get_key(name, labels)
+    with _lock:
+        timer_stats = _timers.get(key)
+        if timer_stats is None:
+            _timers[key] = [1, seconds, seconds]
+        else:
+            timer_stats[0] += 1
+            timer_stats[1] += seconds
+            timer_stats[2] = max(timer_stats[2], seconds)
+
+
+# Function to get the page the current thread runs (NO_PAGE outside of pages)
+def get_current_page() -> str:
+    return getattr(_current, "page", NO_PAGE)
+
+
+# Function to label the timings of the stages run by the current thread with a page
+def set_thread_page(page: str) -> None:
+    _current.page = page
+
+
+# Function to mark the start of a page script run - called at the top of every page
+#
+# The timings of the stages run by this thread are labelled with the page from
+# then on. The metrics file and server are kept up to date from here too, the
+# warm-up of the pages is started on the first run (see netflix.warmup) and the
+# run is pinned to the active dataset version (see netflix.reload). Pages that
+# do not read the dataset pass pin_dataset=False, so they do not import it.
+def set_current_page(page: str, pin_dataset: bool = True) -> None:
+    from netflix.warmup import start_warmup
+
+    set_thread_page(page)
+    start_warmup()
+    if pin_dataset:
+        from netflix.reload import begin_dataset_run
+
+        begin_dataset_run()
+    increment(PAGE_RUNS, page=page)
+    if METRICS_ENABLED and METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    if METRICS_ENABLED and METRICS_FILE:
+        global _last_file_write
+        now = time.time()
+        if now - _last_file_write >= METRICS_FILE_INTERVAL:
+            _last_file_write = now
+            write_metrics_file(Path(METRICS_FILE))
+
+
+# Function to time a block of code as one stage of the current page
+#
+# Only the outermost block of a stage is timed, so a timed function calling
+# another one of the same stage is not counted twice.
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    active_stages = getattr(_current, "stages", None)
+    if active_stages is None:
+        active_stages = _current.stages = set()
+    if stage in active_stages:
+        yield
+        return
+    active_stages.add(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active_stages.discard(stage)
+        observe(
+            STAGE_SECONDS,
+            time.perf_counter() - start,
+            page=get_current_page(),
+            stage=stage,
+        )
+
+
+# Decorator to time every call of a function as one stage of the current page
+def timed(stage: str):
+    def decorator(function):
+        if not METRICS_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Function to count a hit or a miss of a process-wide cache
+def record_cache_access(cache: str, hit: bool) -> None:
+    increment(CACHE_REQUESTS, cache=cache, result="hit" if hit else "miss")
+
+
+# Function to get the (labels, count, total seconds, max seconds) of every stage timer
+def get_stage_timings() -> List[Tuple[Dict[str, str], int, float, float]]:
+    with _lock:
+        return [
+            (dict(labels), int(count), total, maximum)
+            for (name, labels), (count, total, maximum) in sorted(_timers.items())
+            if name == STAGE_SECONDS
+        ]
+
+
+# Function to get the number of hits and misses of every cache
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    cache_stats: Dict[str, Dict[str, int]] = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            if name == CACHE_REQUESTS:
+                labels = dict(labels)
+                cache_stats.setdefault(labels["cache"], {"hit": 0, "miss": 0})[
+                    labels["result"]
+                ] = int(value)
+    return dict(sorted(cache_stats.items()))
+
+
+# Function to format the labels of a sample in the Prometheus text format
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for key, value in labels
+        )
+        + "}"
+    )
+
+
+# Function to get every metric in the Prometheus text exposition format
+def get_metrics_text() -> str:
+    from netflix.loader import get_rss_bytes
+
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted(_timers.items())
+
+    lines = []
+    written_names = set()
+    for (name, labels), value in counters:
+        if name not in written_names:
+            written_names.add(name)
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (count, total, _) in timers:
+        if name not in written_names:
+            written_names.add(name)
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} summary")
+        formatted_labels = _format_labels(labels)
+        lines.append(f"{METRIC_PREFIX}{name}_count{formatted_labels} {count:g}")
+        lines.append(f"{METRIC_PREFIX}{name}_sum{formatted_labels} {total:.6f}")
+    # The slowest call of every timer is a gauge of its own
+    for (name, labels), (_, _, maximum) in timers:
+        if name + "_max" not in written_names:
+            written_names.add(name + "_max")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name}_max gauge")
+        lines.append(f"{METRIC_PREFIX}{name}_max{_format_labels(labels)} {maximum:.6f}")
+
+    rss_bytes = get_rss_bytes()
+    if rss_bytes is not None:
+        lines.append(f"# TYPE {METRIC_PREFIX}process_resident_memory_bytes gauge")
+        lines.append(f"{METRIC_PREFIX}process_resident_memory_bytes {rss_bytes}")
+    lines.append(f"# TYPE {METRIC_PREFIX}process_uptime_seconds gauge")
+    lines.append(
+        f"{METRIC_PREFIX}process_uptime_seconds {time.time() - _start_time:.3f}"
+    )
+    return "\n".join(lines) + "\n"
+
+
+# Function to write every metric to a file in the Prometheus text format
+def write_metrics_file(path: Path) -> None:
+    # Write to a temporary file first, so scrapers never read a half-written file
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(get_metrics_text())
+    os.replace(temporary_path, path)
+
+
+# Handler of the metrics server - serves get_metrics_text() on /metrics
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+# Function to serve the metrics on a local port, once per process
+#
+# The port is only tried once - with several workers, the ones after the first
+# cannot bind it and do not retry on every page run.
+def start_metrics_server(port: int) -> None:
+    global _server, _server_failed
+    if _server is not None or _server_failed:
+        return
+    with _lock:
+        if _server is not None or _server_failed:
+            return
+        try:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        except OSError as error:
+            _server_failed = True
+            logger.warning("Could not serve the metrics on port %d: %s", port, error)
+            return
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info("Serving the metrics on http://127.0.0.1:%d/metrics", port)
@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from netflix.loader import (
+    activate_dataset_version,
+    add_dataset_version,
+    get_active_dataset_version,
+    get_data_file_path,
+    get_data_file_version,
+    get_dataset_file,
+    get_dataset_version_info,
+    get_loaded_columns,
+    get_netflix_data,
+    pin_dataset_version,
+    retire_dataset_version,
+    set_dataset_fingerprint,
+    unpin_dataset_version,
+)
+from netflix.metrics import increment, timer
+from netflix.snapshot import get_file_fingerprint
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Seconds between two checks of the data file - set the environment variable
+# NETFLIX_RELOAD_INTERVAL to change it, or to 0 to turn hot reloading off
+RELOAD_INTERVAL = float(os.environ.get("NETFLIX_RELOAD_INTERVAL", 5))
+
+# Seconds the previous dataset version is kept after a reload, so the script runs
+# started on it can finish - set NETFLIX_RELOAD_GRACE_SECONDS to change it
+RELOAD_GRACE_SECONDS = float(os.environ.get("NETFLIX_RELOAD_GRACE_SECONDS", 60))
+
+# A data file whose reload failed is tried again after RELOAD_INTERVAL seconds,
+# then twice as long after every failure, up to this many seconds
+MAX_RELOAD_BACKOFF_SECONDS = 300.0
+
+# Niceness of the watcher thread, so a rebuild yields the CPU to the sessions
+RELOAD_NICENESS = 10
+
+DATASET_RELOADS = "dataset_reloads_total"
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to build the artifacts of a dataset version in the current thread
+#
+# Loads the sets of columns loaded for the active version, then warms the
+# aggregates and figures of the pages 2 - 5 (see netflix.warmup), the inverted
+# indexes, the search index and the title vectors, so the first script runs on
+# the new version only hit the caches.
+def build_dataset_version(dataset_version: str) -> None:
+    from netflix.indexes import INDEXED_COLUMNS, get_inverted_index
+    from netflix.search import get_search_index
+    from netflix.similarity import get_title_vectors
+    from netflix.warmup import warm_up_page_data, warm_up_page_figures
+
+    loaded_columns = get_loaded_columns(get_active_dataset_version())
+    pin_dataset_version(dataset_version)
+    try:
+        for columns_key in loaded_columns:
+            get_netflix_data(list(columns_key))
+        warm_up_page_data()
+        warm_up_page_figures()
+        for column in INDEXED_COLUMNS:
+            get_inverted_index(column)
+        get_search_index()
+        get_title_vectors()
+    finally:
+        unpin_dataset_version()
+
+
+# Function to reload the dataset from a new version of the data file
+#
+# The new version is built in the background while the active one keeps being
+# served, then swapped in. Returns the previous version, or None if the build
+# failed and the active version is kept.
+def reload_dataset(dataset_version: str, fingerprint: str) -> Optional[str]:
+    start = time.perf_counter()
+    try:
+        add_dataset_version(dataset_version, fingerprint)
+        with timer("reload"):
+            build_dataset_version(dataset_version)
+    except Exception:
+        logger.exception("Could not reload the dataset version %s", dataset_version)
+        retire_dataset_version(dataset_version)
+        increment(DATASET_RELOADS, result="failed")
+        return None
+    previous_version = activate_dataset_version(dataset_version)
+    increment(DATASET_RELOADS, result="ok")
+    logger.info(
+        "Reloaded the dataset in %.3fs: version %s (fingerprint %s) replaces %s",
+        time.perf_counter() - start,
+        dataset_version,
+        fingerprint[:12],
+        previous_version,
+    )
+    return previous_version
+
+
+# Function to watch the data file and reload the dataset when its content changes
+#
+# The size and modification time are checked every RELOAD_INTERVAL seconds and
+# a change is confirmed with the content fingerprint, so touching the file or
+# rewriting it unchanged does not trigger a rebuild. A file is only checked off
+# once its version is swapped in - a failed reload is retried with backoff.
+def _watch_data_file() -> None:
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), RELOAD_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+    # The fingerprint of the file the active version was loaded from, which the
+    # data file may have replaced already
+    checked_version = get_active_dataset_version()
+    fingerprint = get_file_fingerprint(
+        get_data_file_path(get_dataset_file(checked_version))
+    )
+    set_dataset_fingerprint(checked_version, fingerprint)
+    retiring_version: Optional[str] = None
+    retire_at = 0.0
+    failed_version: Optional[str] = None
+    no_of_failures = 0
+    retry_at = 0.0
+
+    while True:
+        time.sleep(RELOAD_INTERVAL)
+        if retiring_version is not None and time.time() >= retire_at:
+            retire_dataset_version(retiring_version)
+            retiring_version = None
+
+        try:
+            file_version = get_data_file_version()
+            if file_version == checked_version:
+                continue
+            if file_version == failed_version and time.time() < retry_at:
+                continue
+            new_fingerprint = get_file_fingerprint(get_data_file_path())
+        except OSError:
+            # The file is being replaced - check again on the next round
+            continue
+        if new_fingerprint == fingerprint:
+            checked_version = file_version
+            continue
+
+        previous_version = reload_dataset(file_version, new_fingerprint)
+        if previous_version is None:
+            if file_version != failed_version:
+                failed_version, no_of_failures = file_version, 0
+            no_of_failures += 1
+            retry_at = time.time() + min(
+                RELOAD_INTERVAL * 2 ** (no_of_failures - 1), MAX_RELOAD_BACKOFF_SECONDS
+            )
+            continue
+        checked_version, fingerprint = file_version, new_fingerprint
+        failed_version = None
+        if retiring_version is not None:
+            retire_dataset_version(retiring_version)
+        retiring_version = previous_version
+        retire_at = time.time() + RELOAD_GRACE_SECONDS
+
+
+# Function to start watching the data file in a daemon thread, once per process
+def start_dataset_watcher() -> None:
+    global _watcher
+    if _watcher is not None or RELOAD_INTERVAL <= 0:
+        return
+    with _lock:
+        if _watcher is not None:
+            return
+        _watcher = threading.Thread(
+            target=_watch_data_file, name="dataset-watcher", daemon=True
+        )
+    _watcher.start()
+    logger.info(
+        "Watching %s for changes every %gs", get_data_file_path(), RELOAD_INTERVAL
+    )
+
+
+# Function to mark the start of a page script run
+#
+# The run is pinned to the active dataset version, so it finishes on the data
+# it started with even if a reload swaps in a new version meanwhile.
+def begin_dataset_run() -> str:
+    start_dataset_watcher()
+    return pin_dataset_version()
+
+
+# Function to get the label of a dataset version shown in the app
+def get_dataset_version_label(dataset_version: str) -> str:
+    version_info = get_dataset_version_info(dataset_version)
+    if version_info is None or version_info.fingerprint is None:
+        return dataset_version
+    return "%s (since %s)" % (
+        version_info.fingerprint[:12],
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version_info.activated_at)),
+    )
@@ -0,0 +1,378 @@
+import argparse
+import html
+import logging
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+from plotly import graph_objects as go
+from plotly.offline import get_plotlyjs
+
+from netflix.aggregates import (
+    CUBE_DIMENSIONS,
+    build_count_cube,
+    pivot_counts_by_type,
+    sum_count_cube,
+)
+from netflix.charts import build_count_histogram, build_duration_scatter
+from netflix.loader import CLEAN_DATA_FILE, PROJECT_ROOT, read_netflix_data
+from netflix.snapshot import SNAPSHOT_SUFFIX, read_snapshot
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+REPORT_DIR = PROJECT_ROOT / "reports"
+REPORT_FILE = "report.html"
+INDEX_FILE = "index.html"
+COUNTS_FILE_SUFFIX = "_counts.csv"
+
+REPORT_COLUMNS = CUBE_DIMENSIONS + ["duration_minutes", "season_count"]
+HISTNORMS = [None, "percent"]
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Histogram of the number of Movies and TV shows per value of a dimension (pages 2 - 4)
+@dataclass(frozen=True)
+class HistogramChart:
+    dimension: str
+    heading: str
+    title: str
+    xaxis_title: str
+    yaxis_title: str
+
+
+# Scatter plot of the duration of one type of content against the release year (page 5)
+@dataclass(frozen=True)
+class DurationChart:
+    content_type: str
+    duration_column: str
+    title: str
+    yaxis_title: str
+
+
+# Report written for one catalog
+@dataclass(frozen=True)
+class CatalogReport:
+    name: str
+    catalog_path: str
+    report_path: str
+    rows: int
+    seconds: float
+
+
+HISTOGRAM_CHARTS = [
+    HistogramChart(
+        "release_year",
+        "Overall Trend of Content",
+        "Distribution of number of Movies and TV shows released per year",
+        "Year of Release",
+        "Number of Releases",
+    ),
+    HistogramChart(
+        "rating",
+        "Popularity of Rating Categories",
+        "Distribution of number of Movies and TV shows based on their ratings",
+        "TV Ratings",
+        "Number of movies / TV Shows",
+    ),
+    HistogramChart(
+        "year_added",
+        "Growth and Expansion of the Library",
+        "Frequency of content additions to Netflix over time",
+        "Year added to Netflix",
+        "Number of Movies / TV Show",
+    ),
+]
+DURATION_CHARTS = [
+    DurationChart(
+        "Movie",
+        "duration_minutes",
+        "Distribution of duration of Movies against the year of release",
+        "Duration (in mins)",
+    ),
+    DurationChart(
+        "TV Show",
+        "season_count",
+        "Distribution of duration of TV shows against the year of release",
+        "Duration (no of seasons)",
+    ),
+]
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script type="text/javascript">{plotlyjs}</script>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ddd; padding: 0.2em 0.6em; text-align: right; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>{description}</p>
+{body}
+</body>
+</html>
+"""
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Netflix catalog reports</title></head>
+<body>
+<h1>Netflix catalog reports</h1>
+<table>
+<tr><th>Catalog</th><th>Titles</th></tr>
+{rows}
+</table>
+</body>
+</html>
+"""
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to read the columns of a catalog used by the report
+#
+# The catalog is a cleaned CSV file, or a snapshot (.arrow) with or without the
+# CSV file it was compiled from.
+def read_report_data(catalog_path: Path) -> pd.DataFrame:
+    csv_path = Path(catalog_path)
+    if csv_path.suffix == SNAPSHOT_SUFFIX:
+        csv_path = csv_path.with_suffix(".csv")
+    netflix_data = read_snapshot(csv_path, REPORT_COLUMNS)
+    if netflix_data is None:
+        netflix_data = read_netflix_data(csv_path, REPORT_COLUMNS)
+    return netflix_data
+
+
+# Function to build the histogram of a chart from the counts of its dimension
+def build_histogram_figure(
+    counts: pd.DataFrame, chart: HistogramChart, histnorm: Optional[str]
+) -> go.Figure:
+    fig = build_count_histogram(
+        counts, chart.dimension, histnorm=histnorm, title=chart.title
+    )
+    fig.update_layout(xaxis_title=chart.xaxis_title, yaxis_title=chart.yaxis_title)
+    return fig
+
+
+# Function to build the duration scatter plot of a chart
+def build_duration_figure(
+    netflix_data: pd.DataFrame, chart: DurationChart
+) -> go.Figure:
+    is_type = netflix_data["type"] == chart.content_type
+    is_type &= netflix_data[chart.duration_column].notna()
+    fig = build_duration_scatter(
+        netflix_data.loc[is_type, ["release_year", chart.duration_column]],
+        x="release_year",
+        y=chart.duration_column,
+        title=chart.title,
+        labels={chart.duration_column: "duration"},
+        height=800,
+    )
+    fig.update_layout(xaxis_title="Year of Release", yaxis_title=chart.yaxis_title)
+    return fig
+
+
+# Function to get the HTML of a figure, without plotly.js - the report includes it once
+def _get_figure_html(fig: go.Figure) -> str:
+    return fig.to_html(full_html=False, include_plotlyjs=False)
+
+
+# Function to write a file atomically, so readers never see a half-written report
+def _write_text(path: Path, text: str) -> None:
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(text, encoding="utf-8")
+    os.replace(temporary_path, path)
+
+
+# Function to write the report of one catalog - the HTML report and one CSV per pivot
+#
+# The count cube is computed once and every histogram and pivot table is
+# aggregated from it.
+def write_catalog_report(
+    catalog_path: Path, output_dir: Path, name: Optional[str] = None
+) -> CatalogReport:
+    start = time.perf_counter()
+    catalog_path = Path(catalog_path)
+    name = name or catalog_path.stem
+    output_dir = Path(output_dir) / name
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    netflix_data = read_report_data(catalog_path)
+    count_cube = build_count_cube(netflix_data[CUBE_DIMENSIONS])
+
+    sections = []
+    for chart in HISTOGRAM_CHARTS:
+        counts = sum_count_cube(count_cube, chart.dimension)
+        counts_by_type = pivot_counts_by_type(counts, chart.dimension).astype("Int64")
+        counts_by_type.to_csv(output_dir / (chart.dimension + COUNTS_FILE_SUFFIX))
+        sections.append(f"<h2>{html.escape(chart.heading)}</h2>")
+        for histnorm in HISTNORMS:
+            sections.append(
+                _get_figure_html(build_histogram_figure(counts, chart, histnorm))
+            )
+        sections.append(
+            counts_by_type.reset_index().to_html(index=False, na_rep="", border=0)
+        )
+
+    sections.append("<h2>Duration and Release Year Analysis</h2>")
+    for chart in DURATION_CHARTS:
+        sections.append(_get_figure_html(build_duration_figure(netflix_data, chart)))
+
+    report_path = output_dir / REPORT_FILE
+    _write_text(
+        report_path,
+        REPORT_TEMPLATE.format(
+            title=html.escape(f"Netflix catalog report: {name}"),
+            description=html.escape(
+                f"{len(netflix_data)} titles from {catalog_path}, "
+                f"generated on {time.strftime('%Y-%m-%d %H:%M:%S')}"
+            ),
+            plotlyjs=get_plotlyjs(),
+            body="\n".join(sections),
+        ),
+    )
+    return CatalogReport(
+        name=name,
+        catalog_path=str(catalog_path),
+        report_path=str(report_path),
+        rows=len(netflix_data),
+        seconds=time.perf_counter() - start,
+    )
+
+
+# Function to get a distinct report name per catalog - the file name, with its
+# directory when several catalogs share a file name (e.g. one directory per region)
+#
+# Names still shared (e.g. foo.csv and foo.arrow, or /a/x/data.csv and
+# /b/x/data.csv) get a numeric suffix in the order of the catalogs, compared
+# regardless of case as the reports are directories.
+def get_report_names(catalog_paths: Sequence[Path]) -> List[str]:
+    stems = [Path(path).stem for path in catalog_paths]
+    names = [
+        (
+            f"{Path(path).parent.name}_{stem}"
+            if stems.count(stem) > 1 and Path(path).parent.name
+            else stem
+        )
+        for path, stem in zip(catalog_paths, stems)
+    ]
+    unique_names: List[str] = []
+    used_names = set()
+    for name in names:
+        unique_name = name
+        suffix = 2
+        while unique_name.casefold() in used_names:
+            unique_name = f"{name}_{suffix}"
+            suffix += 1
+        used_names.add(unique_name.casefold())
+        unique_names.append(unique_name)
+    return unique_names
+
+
+# Function to run write_catalog_report in a worker process
+def _write_catalog_report(task: tuple) -> CatalogReport:
+    return write_catalog_report(*task)
+
+
+# Function to write the reports of several catalogs, in parallel, with an index page
+#
+# Every catalog is one task of a pool of processes, so a batch of snapshots is
+# spread over every CPU core.
+def export_reports(
+    catalog_paths: Sequence[Path],
+    output_dir: Path = REPORT_DIR,
+    processes: Optional[int] = None,
+) -> List[CatalogReport]:
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(catalog_paths)))
+    output_dir = Path(output_dir)
+    tasks = [
+        (Path(path), output_dir, name)
+        for path, name in zip(catalog_paths, get_report_names(catalog_paths))
+    ]
+
+    start = time.perf_counter()
+    reports: Dict[str, CatalogReport] = {}
+    if processes == 1:
+        results = map(_write_catalog_report, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(processes)
+        results = pool.imap_unordered(_write_catalog_report, tasks)
+    try:
+        for report in results:
+            reports[report.name] = report
+            logger.info(
+                "Wrote the report of %s (%d titles) to %s in %.2fs",
+                report.catalog_path,
+                report.rows,
+                report.report_path,
+                report.seconds,
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # Keep the order of the catalogs given
+    ordered_reports = [reports[name] for _, _, name in tasks]
+    if len(ordered_reports) > 1:
+        _write_text(
+            output_dir / INDEX_FILE,
+            INDEX_TEMPLATE.format(
+                rows="\n".join(
+                    '<tr><td><a href="%s/%s">%s</a></td><td>%d</td></tr>'
+                    % (
+                        html.escape(report.name),
+                        REPORT_FILE,
+                        html.escape(report.name),
+                        report.rows,
+                    )
+                    for report in ordered_reports
+                )
+            ),
+        )
+    logger.info(
+        "Wrote %d reports to %s in %.2fs with %d processes",
+        len(ordered_reports),
+        output_dir,
+        time.perf_counter() - start,
+        processes,
+    )
+    return ordered_reports
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.report [catalog_path ...]
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the analyses of the pages 2 - 5 of catalogs (cleaned CSV "
+        "files or snapshots) as static HTML reports and CSV pivot tables"
+    )
+    parser.add_argument(
+        "catalog_paths", type=Path, nargs="*", default=[CLEAN_DATA_FILE]
+    )
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="default: one per CPU core"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    export_reports(args.catalog_paths, args.output_dir, args.processes)
+
+
+if __name__ == "__main__":
+    main()
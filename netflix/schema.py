@@ -0,0 +1,172 @@
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Declared in-memory schema of the cleaned Netflix catalog (netflix_clean_data.csv)
+#   - "category" for low-cardinality columns, so groupbys run on integer codes
+#   - "Int16" (nullable) for years, as a few titles have no date_added / year_added
+#   - "datetime64[ns]" for date_added, which is stored as ISO yyyy-mm-dd
+#   - "string" for free text
+CATALOG_SCHEMA: Dict[str, str] = {
+    "show_id": "string",
+    "type": "category",
+    "title": "string",
+    "director": "string",
+    "cast": "string",
+    "country": "category",
+    "date_added": "datetime64[ns]",
+    "release_year": "Int16",
+    "rating": "category",
+    "duration": "category",
+    "listed_in": "category",
+    "description": "string",
+    "year_added": "Int16",
+}
+
+# Numeric columns derived from duration when the catalog is loaded
+#   - duration_minutes for "90 min", season_count for "2 Seasons"
+#   - <NA> in both for a malformed duration
+DERIVED_SCHEMA: Dict[str, str] = {
+    "duration_minutes": "Int16",
+    "season_count": "Int16",
+}
+
+CATALOG_COLUMNS = list(CATALOG_SCHEMA)
+DERIVED_COLUMNS = list(DERIVED_SCHEMA)
+ALL_COLUMNS = CATALOG_COLUMNS + DERIVED_COLUMNS
+DATE_COLUMNS = [
+    column for column, dtype in CATALOG_SCHEMA.items() if dtype.startswith("datetime")
+]
+YEAR_COLUMNS = [column for column, dtype in CATALOG_SCHEMA.items() if dtype == "Int16"]
+ISO_DATE_FORMAT = "%Y-%m-%d"
+
+# Placeholder the cleaning step writes for a missing year_added
+UNKNOWN = "Unknown"
+
+DURATION_REGEX = r"^(?P<value>\d+) (?P<unit>min|Seasons?)$"
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the dtypes read_csv can apply while parsing the cleaned CSV file
+def get_csv_dtypes() -> Dict[str, str]:
+    return {
+        column: dtype
+        for column, dtype in CATALOG_SCHEMA.items()
+        if column not in DATE_COLUMNS and column not in YEAR_COLUMNS
+    }
+
+
+# Function to check a list of column names against CATALOG_SCHEMA and DERIVED_SCHEMA
+def validate_columns(columns: Sequence[str]) -> None:
+    unknown_columns = [column for column in columns if column not in ALL_COLUMNS]
+    if unknown_columns:
+        raise ValueError("Unknown Netflix data columns: " + ", ".join(unknown_columns))
+
+
+# Function to cast a column of the cleaned catalog to its declared dtype
+def _cast_column(values: pd.Series, column: str, dtype: str) -> pd.Series:
+    if str(values.dtype) == dtype:
+        return values
+    if column in DATE_COLUMNS:
+        return pd.to_datetime(values, format=ISO_DATE_FORMAT, errors="coerce")
+    if column in YEAR_COLUMNS:
+        return pd.to_numeric(values, errors="coerce").astype(dtype)
+    return values.astype(dtype)
+
+
+# Function to get the columns that have to be read to build the given columns
+def get_source_columns(columns: Sequence[str]) -> list:
+    source_columns = [column for column in columns if column in CATALOG_SCHEMA]
+    if "duration" not in source_columns and any(
+        column in DERIVED_SCHEMA for column in columns
+    ):
+        source_columns.append("duration")
+    return source_columns
+
+
+# Function to parse duration into the numeric columns of DERIVED_SCHEMA
+#
+# Only the distinct durations are parsed and the result is mapped back through
+# the category codes, so the cost does not depend on the number of rows.
+def parse_duration(duration: pd.Series) -> pd.DataFrame:
+    if not isinstance(duration.dtype, pd.CategoricalDtype):
+        duration = duration.astype("category")
+    parts = pd.Series(duration.cat.categories).str.extract(DURATION_REGEX)
+    values = pd.to_numeric(parts["value"]).astype("Int16")
+    is_minutes = (parts["unit"] == "min").fillna(False).values
+
+    codes = duration.cat.codes.values
+    category_minutes = values.where(is_minutes)
+    category_seasons = values.where(~is_minutes)
+    # Append <NA> for code -1 (missing duration)
+    category_minutes = pd.concat([category_minutes, pd.Series([pd.NA], dtype="Int16")])
+    category_seasons = pd.concat([category_seasons, pd.Series([pd.NA], dtype="Int16")])
+    return pd.DataFrame(
+        {
+            "duration_minutes": category_minutes.iloc[codes].values,
+            "season_count": category_seasons.iloc[codes].values,
+        },
+        index=duration.index,
+    )
+
+
+# Function to get the durations that are not in the "90 min" / "2 Seasons" format
+def get_malformed_durations(netflix_data: pd.DataFrame) -> pd.Series:
+    is_malformed = (
+        netflix_data["duration_minutes"].isna() & netflix_data["season_count"].isna()
+    )
+    return netflix_data.loc[is_malformed, "duration"]
+
+
+# Function to cast a DataFrame in the cleaned catalog layout to CATALOG_SCHEMA
+#
+# Only the given columns (all of CATALOG_COLUMNS by default) are kept, in
+# schema order. Columns of DERIVED_SCHEMA that are requested but missing are
+# built from duration.
+# Columns that already have the declared dtype are left untouched, so calling
+# this on a frame read with get_csv_dtypes() only converts dates and years.
+def apply_schema(
+    netflix_data: pd.DataFrame, columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    if columns is None:
+        columns = CATALOG_COLUMNS
+    validate_columns(columns)
+    missing_columns = [
+        column
+        for column in columns
+        if column not in netflix_data.columns
+        and not (column in DERIVED_SCHEMA and "duration" in netflix_data.columns)
+    ]
+    if missing_columns:
+        raise ValueError(
+            "Netflix data is missing the columns: " + ", ".join(missing_columns)
+        )
+
+    typed_columns = {}
+    for column, dtype in CATALOG_SCHEMA.items():
+        if column in columns:
+            typed_columns[column] = _cast_column(netflix_data[column], column, dtype)
+
+    derived_columns = [column for column in DERIVED_COLUMNS if column in columns]
+    if all(column in netflix_data.columns for column in derived_columns):
+        for column in derived_columns:
+            typed_columns[column] = netflix_data[column].astype(DERIVED_SCHEMA[column])
+    else:
+        duration = _cast_column(
+            netflix_data["duration"], "duration", CATALOG_SCHEMA["duration"]
+        )
+        parsed_duration = parse_duration(duration)
+        for column in derived_columns:
+            typed_columns[column] = parsed_duration[column]
+    return pd.DataFrame(typed_columns, index=netflix_data.index)
+
+
+# Function to get the memory used by every column of a DataFrame in bytes
+def get_memory_breakdown(netflix_data: pd.DataFrame) -> pd.Series:
+    memory_usage = netflix_data.memory_usage(deep=True, index=False)
+    return memory_usage.sort_values(ascending=False)
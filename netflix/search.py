@@ -0,0 +1,168 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.loader import (
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.metrics import record_cache_access, timed
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+SEARCH_COLUMNS = ["title", "description"]
+TOKEN_PATTERN = r"[a-z0-9]+"
+
+# Every title token counts as many times as this in the score of a title
+TITLE_WEIGHT = 3
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+DEFAULT_NO_OF_RESULTS = 100
+
+
+# -------------------------------------------------------------------------------------------------
+# Inverted index of the tokens of every title and description
+#
+# The postings of terms[i] are doc_ids[offsets[i]:offsets[i + 1]] with their term
+# frequencies in term_counts. Doc ids are positions in the shared DataFrame.
+@dataclass(frozen=True)
+class SearchIndex:
+    terms: np.ndarray
+    offsets: np.ndarray
+    doc_ids: np.ndarray
+    term_counts: np.ndarray
+    doc_lengths: np.ndarray
+
+    # Function to get the doc ids of the best matches of a query and their BM25 scores
+    def search(
+        self, query: str, no_of_results: int = DEFAULT_NO_OF_RESULTS
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        query_terms = np.unique(
+            np.array(re.findall(TOKEN_PATTERN, query.lower()), dtype=str)
+        )
+        positions = np.searchsorted(self.terms, query_terms)
+        positions = positions[positions < len(self.terms)]
+        positions = positions[np.isin(self.terms[positions], query_terms)]
+        if not len(positions):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        no_of_docs = len(self.doc_lengths)
+        average_doc_length = self.doc_lengths.mean()
+        doc_ids, weights = [], []
+        for position in positions:
+            start, stop = self.offsets[position], self.offsets[position + 1]
+            doc_frequency = stop - start
+            idf = np.log1p((no_of_docs - doc_frequency + 0.5) / (doc_frequency + 0.5))
+            term_counts = self.term_counts[start:stop].astype(np.float32)
+            length_norm = BM25_K1 * (
+                1
+                - BM25_B
+                + BM25_B
+                * self.doc_lengths[self.doc_ids[start:stop]]
+                / average_doc_length
+            )
+            doc_ids.append(self.doc_ids[start:stop])
+            weights.append(
+                idf * term_counts * (BM25_K1 + 1) / (term_counts + length_norm)
+            )
+
+        # Sum the scores of every matching doc - the cost depends on the number of
+        # postings of the query terms, not on the size of the catalog
+        matching_doc_ids, inverse = np.unique(
+            np.concatenate(doc_ids), return_inverse=True
+        )
+        scores = np.bincount(inverse, weights=np.concatenate(weights)).astype(
+            np.float32
+        )
+
+        if len(scores) > no_of_results:
+            best = np.argpartition(-scores, no_of_results - 1)[:no_of_results]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((matching_doc_ids[best], -scores[best]))]
+        return matching_doc_ids[best], scores[best]
+
+
+# Process-wide cache - one search index per dataset version
+_lock = threading.Lock()
+_search_indexes: Dict[str, SearchIndex] = {}
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to split texts into lowercase tokens - one row per (text position, token)
+def tokenize(texts: pd.Series) -> pd.Series:
+    tokens = (
+        texts.reset_index(drop=True)
+        .astype(object)
+        .fillna("")
+        .str.lower()
+        .str.findall(TOKEN_PATTERN)
+        .explode()
+    )
+    return tokens[tokens.notna()]
+
+
+# Function to build the search index of the titles and descriptions of the catalog
+def build_search_index(netflix_data: pd.DataFrame) -> SearchIndex:
+    title_tokens = tokenize(netflix_data["title"])
+    description_tokens = tokenize(netflix_data["description"])
+    tokens = pd.concat([title_tokens] * TITLE_WEIGHT + [description_tokens])
+
+    term_codes, terms = pd.factorize(tokens, sort=True)
+    doc_ids = tokens.index.to_numpy().astype(np.int64)
+    # One posting per (term, doc), sorted by term and then doc
+    no_of_docs = len(netflix_data)
+    postings, term_counts = np.unique(
+        term_codes.astype(np.int64) * no_of_docs + doc_ids, return_counts=True
+    )
+    posting_terms = postings // no_of_docs
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(posting_terms, minlength=len(terms)), out=offsets[1:])
+    return SearchIndex(
+        terms=np.asarray(terms, dtype=str),
+        offsets=offsets,
+        doc_ids=(postings % no_of_docs).astype(np.int32),
+        term_counts=np.minimum(term_counts, np.iinfo(np.uint16).max).astype(np.uint16),
+        doc_lengths=np.bincount(doc_ids, minlength=no_of_docs).astype(np.float32),
+    )
+
+
+# Function to get the shared search index of the current dataset version
+def get_search_index() -> SearchIndex:
+    dataset_version = get_dataset_version()
+    search_index = _search_indexes.get(dataset_version)
+    record_cache_access("search_index", search_index is not None)
+    if search_index is not None:
+        return search_index
+
+    with _lock:
+        if dataset_version not in _search_indexes:
+            live_versions = get_live_dataset_versions()
+            for old_version in [v for v in _search_indexes if v not in live_versions]:
+                del _search_indexes[old_version]
+            _search_indexes[dataset_version] = build_search_index(
+                get_netflix_data(SEARCH_COLUMNS)
+            )
+    return _search_indexes[dataset_version]
+
+
+# Function to search the titles and descriptions of the catalog
+#
+# Returns the positions of the best matching titles in the shared DataFrame,
+# best match first, and their BM25 scores.
+@timed("aggregate")
+def search_titles(
+    query: str, no_of_results: int = DEFAULT_NO_OF_RESULTS
+) -> Tuple[np.ndarray, np.ndarray]:
+    return get_search_index().search(query, no_of_results)
@@ -0,0 +1,116 @@
+import streamlit as st
+
+from netflix.filters import FILTER_COLUMNS, CatalogFilter, get_filter_mask
+from netflix.indexes import get_inverted_index
+from netflix.loader import get_dataset_version, get_netflix_data
+from netflix.reload import get_dataset_version_label
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Prefix of the session state keys the filter values are kept under. Streamlit
+# drops the state of a widget on pages that do not render it, so every value is
+# also copied to a key of its own to survive page navigation.
+STATE_KEY_PREFIX = "catalog_filter."
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to render a sidebar widget whose value persists across page navigation
+def _persisted_widget(widget, label: str, key: str, default, **kwargs):
+    state_key = STATE_KEY_PREFIX + key
+    widget_key = "_" + state_key
+    if state_key not in st.session_state:
+        st.session_state[state_key] = default
+    if widget_key not in st.session_state:
+        st.session_state[widget_key] = st.session_state[state_key]
+    value = widget(label, key=widget_key, **kwargs)
+    st.session_state[state_key] = value
+    return value
+
+
+# Function to get a (min, max) year range, or None if it covers every year
+def _get_year_range(selected: tuple, full_range: tuple):
+    return None if tuple(selected) == tuple(full_range) else tuple(selected)
+
+
+# Function to render the version of the dataset the current run is served from
+def render_dataset_version() -> None:
+    st.sidebar.caption(
+        f"Dataset version: `{get_dataset_version_label(get_dataset_version())}`"
+    )
+
+
+# Function to render the cross filter in the sidebar and get the active filter
+def render_filter_sidebar() -> CatalogFilter:
+    netflix_data = get_netflix_data(FILTER_COLUMNS)
+    release_year_range = (
+        int(netflix_data["release_year"].min()),
+        int(netflix_data["release_year"].max()),
+    )
+    year_added_range = (
+        int(netflix_data["year_added"].min()),
+        int(netflix_data["year_added"].max()),
+    )
+
+    with st.sidebar:
+        st.header("Filter the catalog")
+        types = _persisted_widget(
+            st.multiselect,
+            "Types of content",
+            "types",
+            [],
+            options=list(netflix_data["type"].cat.categories),
+        )
+        countries = _persisted_widget(
+            st.multiselect,
+            "Countries",
+            "countries",
+            [],
+            options=list(get_inverted_index("country").terms),
+        )
+        genres = _persisted_widget(
+            st.multiselect,
+            "Genres",
+            "genres",
+            [],
+            options=list(get_inverted_index("listed_in").terms),
+        )
+        ratings = _persisted_widget(
+            st.multiselect,
+            "TV Ratings",
+            "ratings",
+            [],
+            options=list(netflix_data["rating"].cat.categories),
+        )
+        release_years = _persisted_widget(
+            st.slider,
+            "Year of release",
+            "release_years",
+            release_year_range,
+            min_value=release_year_range[0],
+            max_value=release_year_range[1],
+        )
+        years_added = _persisted_widget(
+            st.slider,
+            "Year added to Netflix",
+            "years_added",
+            year_added_range,
+            min_value=year_added_range[0],
+            max_value=year_added_range[1],
+        )
+
+        catalog_filter = CatalogFilter(
+            types=tuple(types),
+            countries=tuple(countries),
+            genres=tuple(genres),
+            ratings=tuple(ratings),
+            release_years=_get_year_range(release_years, release_year_range),
+            years_added=_get_year_range(years_added, year_added_range),
+        )
+        mask = get_filter_mask(catalog_filter)
+        if mask is not None:
+            st.caption(f"Showing **{int(mask.sum())}** of {len(netflix_data)} titles")
+    render_dataset_version()
+    return catalog_filter
@@ -0,0 +1,347 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.indexes import split_terms
+from netflix.loader import (
+    CLEAN_DATA_FILE,
+    get_dataset_file,
+    get_dataset_version,
+    get_live_dataset_versions,
+    get_netflix_data,
+)
+from netflix.metrics import record_cache_access, timed
+from netflix.search import tokenize
+from netflix.snapshot import (
+    VECTORS_SUFFIX,
+    get_source_metadata,
+    is_snapshot_fresh,
+    memory_map_npz,
+)
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+SIMILARITY_COLUMNS = ["description", "listed_in", "cast", "director"]
+
+# Weight of every group of features in the vector of a title - each group is
+# normalized on its own first, so a long cast does not outweigh the description
+FEATURE_WEIGHTS = {
+    "description": 1.0,
+    "listed_in": 0.8,
+    "cast": 0.5,
+    "director": 0.4,
+}
+
+# Rows of the title matrix multiplied at once in exact search
+BLOCK_SIZE = 65_536
+
+# Approximate search only compares the titles sharing a feature of the query
+# held by at most this share of the catalog - a director, an actor or a rare
+# word rather than a broad genre
+MAX_CANDIDATE_FEATURE_SHARE = 0.05
+
+DEFAULT_NO_OF_SIMILAR_TITLES = 10
+
+logger = logging.getLogger(__name__)
+
+# Process-wide cache - title vectors, and their columns per feature, per dataset version
+_lock = threading.Lock()
+_title_vectors: Dict[str, "sparse.csr_matrix"] = {}
+_feature_postings: Dict[str, "sparse.csc_matrix"] = {}
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the (row, feature, weight) triplets of one group of features
+#
+# Descriptions are weighted by sublinear TF-IDF, the terms of multi-valued
+# columns by one. Every row is then normalized to unit length within the group.
+# Returns the features numbered from 0, and the number of features.
+def _get_feature_weights(
+    values: pd.Series, column: str, no_of_rows: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    if column == "description":
+        terms = tokenize(values)
+    else:
+        terms = split_terms(values)
+    if not len(terms):
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, 0
+
+    term_codes, vocabulary = pd.factorize(terms)
+    row_ids = terms.index.to_numpy().astype(np.int64)
+    pairs, term_counts = np.unique(
+        row_ids * len(vocabulary) + term_codes, return_counts=True
+    )
+    row_ids, term_codes = pairs // len(vocabulary), pairs % len(vocabulary)
+
+    if column == "description":
+        doc_frequency = np.bincount(term_codes, minlength=len(vocabulary))
+        idf = np.log((1 + no_of_rows) / (1 + doc_frequency)) + 1
+        weights = (1 + np.log(term_counts)) * idf[term_codes]
+    else:
+        weights = np.ones(len(term_codes))
+
+    row_norms = np.sqrt(np.bincount(row_ids, weights=weights**2, minlength=no_of_rows))
+    weights = weights / row_norms[row_ids] * FEATURE_WEIGHTS[column]
+    return row_ids, term_codes, weights, len(vocabulary)
+
+
+# Function to build the sparse unit-length float32 vector of every title
+#
+# One column per description word, genre, cast member and director - the exact
+# TF-IDF and one-hot features, so the cosine of two rows is their exact similarity.
+def build_title_vectors(netflix_data: pd.DataFrame) -> "sparse.csr_matrix":
+    from scipy import sparse
+
+    no_of_rows = len(netflix_data)
+    all_row_ids, all_features, all_weights = [], [], []
+    no_of_features = 0
+    for column in SIMILARITY_COLUMNS:
+        row_ids, features, weights, no_of_column_features = _get_feature_weights(
+            netflix_data[column], column, no_of_rows
+        )
+        all_row_ids.append(row_ids)
+        all_features.append(features + no_of_features)
+        all_weights.append(weights)
+        no_of_features += no_of_column_features
+
+    row_ids = np.concatenate(all_row_ids)
+    weights = np.concatenate(all_weights)
+    norms = np.sqrt(np.bincount(row_ids, weights=weights**2, minlength=no_of_rows))
+    weights = weights / norms[row_ids]
+    return sparse.csr_matrix(
+        (weights.astype(np.float32), (row_ids, np.concatenate(all_features))),
+        shape=(no_of_rows, no_of_features),
+    )
+
+
+# Function to get the path of the title vectors compiled from a CSV file
+def get_vectors_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(VECTORS_SUFFIX)
+
+
+# Function to write the title vectors of a cleaned CSV file next to it
+def compile_title_vectors(csv_path: Path = CLEAN_DATA_FILE) -> Path:
+    from netflix.loader import read_netflix_data
+
+    csv_path = Path(csv_path)
+    vectors_path = get_vectors_path(csv_path)
+    source_metadata = get_source_metadata(csv_path)
+    title_vectors = build_title_vectors(read_netflix_data(csv_path, SIMILARITY_COLUMNS))
+
+    arrays = {
+        "source." + key.decode(): np.array(value)
+        for key, value in source_metadata.items()
+    }
+    arrays["data"] = title_vectors.data
+    arrays["indices"] = title_vectors.indices
+    arrays["indptr"] = title_vectors.indptr
+    arrays["shape"] = np.array(title_vectors.shape)
+
+    # Write to a temporary file first, so readers never see half-written vectors.
+    # np.savez does not compress, so read_title_vectors can memory-map the arrays
+    temporary_path = vectors_path.with_name(vectors_path.name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, vectors_path)
+    logger.info("Compiled the title vectors of %s into %s", csv_path, vectors_path)
+    return vectors_path
+
+
+# Function to read the persisted title vectors (None if missing or stale)
+#
+# The arrays of the matrix are memory-mapped, so every worker process shares them.
+def read_title_vectors(csv_path: Path) -> Optional["sparse.csr_matrix"]:
+    from scipy import sparse
+
+    vectors_path = get_vectors_path(csv_path)
+    if not vectors_path.exists():
+        return None
+    arrays = memory_map_npz(vectors_path)
+    source_metadata = {
+        name[len("source.") :].encode(): array.item()
+        for name, array in arrays.items()
+        if name.startswith("source.")
+    }
+    if not is_snapshot_fresh(source_metadata, csv_path):
+        logger.warning("Title vectors %s are stale, rebuilding them", vectors_path)
+        return None
+    return sparse.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=tuple(arrays["shape"]),
+        copy=False,
+    )
+
+
+# Function to get the shared title vectors of the current dataset version
+def get_title_vectors() -> "sparse.csr_matrix":
+    dataset_version = get_dataset_version()
+    title_vectors = _title_vectors.get(dataset_version)
+    record_cache_access("title_vectors", title_vectors is not None)
+    if title_vectors is not None:
+        return title_vectors
+
+    with _lock:
+        if dataset_version not in _title_vectors:
+            live_versions = get_live_dataset_versions()
+            for old_version in [v for v in _title_vectors if v not in live_versions]:
+                del _title_vectors[old_version]
+            for old_version in [v for v in _feature_postings if v not in live_versions]:
+                del _feature_postings[old_version]
+            title_vectors = read_title_vectors(get_dataset_file(dataset_version))
+            if title_vectors is None:
+                title_vectors = build_title_vectors(
+                    get_netflix_data(SIMILARITY_COLUMNS)
+                )
+            _title_vectors[dataset_version] = title_vectors
+    return _title_vectors[dataset_version]
+
+
+# Function to get the shared title vectors of the current dataset version by column
+#
+# Column j holds the titles having the feature j - the postings approximate
+# search gathers its candidates from.
+def get_feature_postings() -> "sparse.csc_matrix":
+    title_vectors = get_title_vectors()
+    dataset_version = get_dataset_version()
+    feature_postings = _feature_postings.get(dataset_version)
+    if feature_postings is None:
+        feature_postings = title_vectors.tocsc()
+        with _lock:
+            _feature_postings[dataset_version] = feature_postings
+    return feature_postings
+
+
+# Function to keep the k best (highest score) ids of every row of a score matrix
+def _top_k(
+    scores: np.ndarray, ids: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    if scores.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, best, axis=1)
+        ids = np.take_along_axis(ids, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(
+        scores, order, axis=1
+    )
+
+
+# Function to find the k most similar titles of many titles at once (exact search)
+#
+# The sparse query vectors are multiplied with blocks of the title matrix, and
+# only the k best matches of every block are kept, so memory does not depend on
+# the catalog size. Returns the ids and cosine similarities, shape (queries, k),
+# best first. A title is never returned as similar to itself.
+def find_similar_titles_batch(
+    row_ids: Sequence[int],
+    k: int = DEFAULT_NO_OF_SIMILAR_TITLES,
+    title_vectors: Optional["sparse.csr_matrix"] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    if title_vectors is None:
+        title_vectors = get_title_vectors()
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    query_vectors = title_vectors[row_ids]
+    no_of_titles = title_vectors.shape[0]
+    k = min(k, no_of_titles - 1)
+
+    best_ids = np.empty((len(row_ids), 0), dtype=np.int64)
+    best_scores = np.empty((len(row_ids), 0), dtype=np.float32)
+    for start in range(0, no_of_titles, BLOCK_SIZE):
+        block = title_vectors[start : start + BLOCK_SIZE]
+        scores = (query_vectors @ block.T).toarray()
+        block_ids = np.arange(start, start + block.shape[0])
+        # Leave the query titles themselves out
+        is_self = row_ids[:, np.newaxis] == block_ids[np.newaxis, :]
+        scores[is_self] = -np.inf
+        block_ids, scores = _top_k(scores, np.broadcast_to(block_ids, scores.shape), k)
+        best_ids, best_scores = _top_k(
+            np.concatenate([best_scores, scores], axis=1),
+            np.concatenate([best_ids, block_ids], axis=1),
+            k,
+        )
+    return best_ids, best_scores
+
+
+# Function to get the candidate titles of approximate search for a title
+#
+# The titles sharing one of its selective features - those held by at most
+# MAX_CANDIDATE_FEATURE_SHARE of the titles - or its rarest feature when it has
+# none. The title itself is left out.
+def get_candidates(
+    row_id: int,
+    title_vectors: "sparse.csr_matrix",
+    feature_postings: "sparse.csc_matrix",
+) -> np.ndarray:
+    features = title_vectors.indices[
+        title_vectors.indptr[row_id] : title_vectors.indptr[row_id + 1]
+    ]
+    doc_frequency = np.diff(feature_postings.indptr)[features]
+    max_doc_frequency = max(MAX_CANDIDATE_FEATURE_SHARE * title_vectors.shape[0], 1)
+    is_selective = doc_frequency <= max_doc_frequency
+    if not is_selective.any() and len(features):
+        is_selective[np.argmin(doc_frequency)] = True
+    candidates = np.unique(feature_postings[:, features[is_selective]].indices)
+    return candidates[candidates != row_id].astype(np.int64)
+
+
+# Function to rank the candidates of approximate search by their exact similarity
+# to a title and keep the k best
+def _rank_candidates(
+    row_id: int, candidates: np.ndarray, k: int, title_vectors: "sparse.csr_matrix"
+) -> Tuple[np.ndarray, np.ndarray]:
+    scores = (title_vectors[candidates] @ title_vectors[row_id].T).toarray().ravel()
+    best_ids, best_scores = _top_k(scores[np.newaxis, :], candidates[np.newaxis, :], k)
+    return best_ids[0], best_scores[0]
+
+
+# Function to find the k most similar titles of one title
+#
+# With approximate=True only the titles sharing a selective feature with it are
+# compared, which keeps queries fast on catalogs too large for exact search.
+@timed("aggregate")
+def find_similar_titles(
+    row_id: int, k: int = DEFAULT_NO_OF_SIMILAR_TITLES, approximate: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    if not approximate:
+        best_ids, best_scores = find_similar_titles_batch([row_id], k)
+        return best_ids[0], best_scores[0]
+    title_vectors = get_title_vectors()
+    candidates = get_candidates(row_id, title_vectors, get_feature_postings())
+    return _rank_candidates(row_id, candidates, k, title_vectors)
+
+
+# Function to measure approximate search against exact search
+#
+# Returns the recall at k - the share of the exact k most similar titles of
+# some titles that approximate search finds - and the mean share of the catalog
+# approximate search compares.
+def measure_approximate_search(
+    row_ids: Sequence[int],
+    k: int = DEFAULT_NO_OF_SIMILAR_TITLES,
+    title_vectors: Optional["sparse.csr_matrix"] = None,
+) -> Tuple[float, float]:
+    if title_vectors is None:
+        title_vectors = get_title_vectors()
+        feature_postings = get_feature_postings()
+    else:
+        feature_postings = title_vectors.tocsc()
+    exact_ids, _ = find_similar_titles_batch(row_ids, k, title_vectors)
+    no_of_found, no_of_candidates = 0, 0
+    for row_id, row_exact_ids in zip(row_ids, exact_ids):
+        candidates = get_candidates(row_id, title_vectors, feature_postings)
+        approximate_ids, _ = _rank_candidates(row_id, candidates, k, title_vectors)
+        no_of_found += len(np.intersect1d(approximate_ids, row_exact_ids))
+        no_of_candidates += len(candidates)
+    recall = no_of_found / max(exact_ids.size, 1)
+    candidate_share = no_of_candidates / max(len(row_ids), 1) / title_vectors.shape[0]
+    return recall, candidate_share
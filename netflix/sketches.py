@@ -0,0 +1,414 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from netflix.filters import CatalogFilter
+from netflix.indexes import split_terms
+from netflix.loader import (
+    CLEAN_DATA_FILE,
+    get_dataset_file,
+    get_dataset_version,
+    get_live_dataset_versions,
+)
+from netflix.metrics import record_cache_access, timed
+from netflix.snapshot import (
+    SKETCH_SUFFIX,
+    get_source_metadata,
+    is_snapshot_fresh,
+    iter_catalog_chunks,
+)
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# Dimensions the titles are grouped by, next to their type
+SKETCH_DIMENSIONS = ["release_year", "year_added"]
+
+# Comma-joined columns whose distinct terms are counted
+DISTINCT_COLUMNS = ["director", "cast"]
+
+# Column holding the duration of every type of content
+DURATION_COLUMNS = {"Movie": "duration_minutes", "TV Show": "season_count"}
+
+SKETCH_COLUMNS = (
+    ["type"] + SKETCH_DIMENSIONS + DISTINCT_COLUMNS + list(DURATION_COLUMNS.values())
+)
+
+# Quantiles of the duration bands of page 5
+BAND_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+DISTINCT_COUNT_COLUMN = "distinct_count"
+
+# HyperLogLog registers per group are 2^HLL_PRECISION bytes - a relative
+# standard error of 1.04 / sqrt(2^HLL_PRECISION), i.e. 1.6%
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+# Number of sketches of filtered catalogs kept in memory
+MAX_CACHED_SKETCHES = 32
+
+logger = logging.getLogger(__name__)
+
+# Process-wide cache - the sketches per dataset version, dimension and active filter
+_lock = threading.Lock()
+_sketches: "OrderedDict[Tuple[str, str, Optional[CatalogFilter]], GroupedSketches]" = (
+    OrderedDict()
+)
+
+
+# -------------------------------------------------------------------------------------------------
+# Sketches of the titles grouped by type and the value of a dimension
+#
+# Group i is (types[i], values[i]), sorted. registers[column][i] are the
+# HyperLogLog registers of the distinct terms of column in the group, and
+# duration_counts[i, d] the number of titles of the group lasting d minutes
+# (Movies) or seasons (TV shows). Durations are small integers, so counting
+# every value is exact and smaller than a t-digest or KLL sketch of the same
+# titles. Both merge element-wise - the maximum of the registers, the sum of
+# the counts - so sketches of chunks or workers add up to the sketches of the
+# whole catalog, whatever the order.
+@dataclass(frozen=True)
+class GroupedSketches:
+    dimension: str
+    types: np.ndarray
+    values: np.ndarray
+    registers: Dict[str, np.ndarray]
+    duration_counts: np.ndarray
+
+    # Function to merge the sketches of another part of the catalog into new sketches
+    def merge(self, other: "GroupedSketches") -> "GroupedSketches":
+        codes, types, values = _get_groups(
+            np.concatenate([self.types, other.types]),
+            np.concatenate([self.values, other.values]),
+        )
+        own_codes, other_codes = codes[: len(self.types)], codes[len(self.types) :]
+        registers = {}
+        for column in DISTINCT_COLUMNS:
+            merged_registers = np.zeros((len(types), HLL_REGISTERS), dtype=np.uint8)
+            merged_registers[own_codes] = self.registers[column]
+            merged_registers[other_codes] = np.maximum(
+                merged_registers[other_codes], other.registers[column]
+            )
+            registers[column] = merged_registers
+        duration_counts = np.zeros(
+            (
+                len(types),
+                max(self.duration_counts.shape[1], other.duration_counts.shape[1]),
+            ),
+            dtype=np.int64,
+        )
+        duration_counts[own_codes, : self.duration_counts.shape[1]] = (
+            self.duration_counts
+        )
+        duration_counts[
+            other_codes, : other.duration_counts.shape[1]
+        ] += other.duration_counts
+        return GroupedSketches(
+            dimension=self.dimension,
+            types=types,
+            values=values,
+            registers=registers,
+            duration_counts=duration_counts,
+        )
+
+    # Function to get the estimated number of distinct terms of a column per group
+    def get_distinct_counts(self, column: str) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                self.dimension: self.values,
+                "type": self.types,
+                DISTINCT_COUNT_COLUMN: estimate_distinct_counts(self.registers[column]),
+            }
+        )
+
+    # Function to get some quantiles of the duration per group
+    #
+    # One column per quantile, the nearest-rank duration of the group. Groups
+    # without any duration are left out.
+    def get_duration_quantiles(
+        self, quantiles: Sequence[float] = BAND_QUANTILES
+    ) -> pd.DataFrame:
+        cumulative_counts = np.cumsum(self.duration_counts, axis=1)
+        totals = self.duration_counts.sum(axis=1)
+        has_durations = totals > 0
+        duration_quantiles = pd.DataFrame(
+            {
+                self.dimension: self.values[has_durations],
+                "type": self.types[has_durations],
+            }
+        )
+        cumulative_counts = cumulative_counts[has_durations]
+        totals = totals[has_durations]
+        # No quantile when no title has a duration, e.g. a filter keeping no title
+        if not len(totals):
+            for quantile in quantiles:
+                duration_quantiles[quantile] = np.empty(0, dtype=np.int64)
+            return duration_quantiles
+        for quantile in quantiles:
+            ranks = np.maximum(np.ceil(quantile * totals), 1)
+            duration_quantiles[quantile] = np.argmax(
+                cumulative_counts >= ranks[:, None], axis=1
+            )
+        return duration_quantiles
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to number the (type, value) groups of some titles, in sorted order
+#
+# Returns the group of every title and the type and value of every group.
+def _get_groups(
+    types: np.ndarray, values: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    groups = pd.DataFrame({"type": types, "value": values})
+    codes = groups.groupby(["type", "value"], sort=True).ngroup().to_numpy()
+    unique_groups = groups.drop_duplicates().sort_values(["type", "value"])
+    return (
+        codes,
+        unique_groups["type"].to_numpy(dtype=object),
+        unique_groups["value"].to_numpy(dtype=np.int64),
+    )
+
+
+# Function to add hashed terms to the HyperLogLog registers of their groups
+#
+# The first HLL_PRECISION bits of a hash pick the register, which keeps the
+# highest position of the first 1 bit in the rest of the hash.
+def _update_registers(
+    registers: np.ndarray, group_codes: np.ndarray, hashes: np.ndarray
+) -> None:
+    remaining_bits = 64 - HLL_PRECISION
+    register_ids = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+    remainders = hashes & np.uint64((1 << remaining_bits) - 1)
+    # frexp gives the number of bits of every remainder (0 for 0)
+    _, bit_lengths = np.frexp(remainders.astype(np.float64))
+    ranks = (remaining_bits - bit_lengths + 1).astype(np.uint8)
+    np.maximum.at(registers, (group_codes, register_ids), ranks)
+
+
+# Function to estimate the number of distinct terms of every row of HyperLogLog registers
+#
+# With many empty registers (small counts) the estimate falls back to linear
+# counting, as in the original HyperLogLog paper.
+def estimate_distinct_counts(registers: np.ndarray) -> np.ndarray:
+    alpha = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+    raw_estimates = (
+        alpha
+        * HLL_REGISTERS**2
+        / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=1)
+    )
+    empty_registers = np.count_nonzero(registers == 0, axis=1)
+    is_small = (raw_estimates <= 2.5 * HLL_REGISTERS) & (empty_registers > 0)
+    linear_counts = HLL_REGISTERS * np.log(
+        HLL_REGISTERS / np.maximum(empty_registers, 1)
+    )
+    return np.rint(np.where(is_small, linear_counts, raw_estimates)).astype(np.int64)
+
+
+# Function to hash the terms of a comma-joined column
+#
+# Returns the row position and the hash of every (row, term) pair - see split_terms.
+def hash_terms(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    terms = split_terms(values)
+    return (
+        terms.index.to_numpy(),
+        pd.util.hash_array(terms.to_numpy(dtype=object), categorize=False),
+    )
+
+
+# Function to build the sketches of some titles grouped by type and a dimension
+#
+# The hashed terms of every distinct column can be given (see hash_terms), so
+# they are split and hashed once for all the dimensions.
+def build_grouped_sketches(
+    netflix_data: pd.DataFrame,
+    dimension: str,
+    hashed_terms: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+) -> GroupedSketches:
+    if hashed_terms is None:
+        hashed_terms = {
+            column: hash_terms(netflix_data[column]) for column in DISTINCT_COLUMNS
+        }
+    types = netflix_data["type"].astype(object).to_numpy()
+    has_value = netflix_data[dimension].notna().to_numpy()
+    # Group of every title, -1 without a value of the dimension
+    codes = np.full(len(netflix_data), -1, dtype=np.int64)
+    value_codes, group_types, group_values = _get_groups(
+        types[has_value], netflix_data[dimension][has_value].to_numpy(dtype=np.int64)
+    )
+    codes[has_value] = value_codes
+
+    registers = {}
+    for column in DISTINCT_COLUMNS:
+        row_positions, hashes = hashed_terms[column]
+        term_codes = codes[row_positions]
+        is_grouped = term_codes >= 0
+        column_registers = np.zeros((len(group_types), HLL_REGISTERS), dtype=np.uint8)
+        _update_registers(column_registers, term_codes[is_grouped], hashes[is_grouped])
+        registers[column] = column_registers
+
+    durations = np.full(len(netflix_data), np.nan)
+    for content_type, duration_column in DURATION_COLUMNS.items():
+        is_type = types == content_type
+        durations[is_type] = netflix_data[duration_column].to_numpy(
+            dtype=np.float64, na_value=np.nan
+        )[is_type]
+    has_duration = has_value & ~np.isnan(durations) & (durations >= 0)
+    durations = durations[has_duration].astype(np.int64)
+    duration_counts = np.zeros(
+        (len(group_types), durations.max() + 1 if len(durations) else 0),
+        dtype=np.int64,
+    )
+    np.add.at(duration_counts, (codes[has_duration], durations), 1)
+
+    return GroupedSketches(
+        dimension=dimension,
+        types=group_types,
+        values=group_values,
+        registers=registers,
+        duration_counts=duration_counts,
+    )
+
+
+# Function to build the sketches of every dimension in one pass over chunks of titles
+def build_catalog_sketches(
+    chunks: Iterable[pd.DataFrame],
+) -> Dict[str, GroupedSketches]:
+    catalog_sketches: Dict[str, GroupedSketches] = {}
+    for chunk in chunks:
+        hashed_terms = {
+            column: hash_terms(chunk[column]) for column in DISTINCT_COLUMNS
+        }
+        for dimension in SKETCH_DIMENSIONS:
+            chunk_sketches = build_grouped_sketches(chunk, dimension, hashed_terms)
+            if dimension in catalog_sketches:
+                chunk_sketches = catalog_sketches[dimension].merge(chunk_sketches)
+            catalog_sketches[dimension] = chunk_sketches
+    if not catalog_sketches:
+        empty_data = pd.DataFrame({column: [] for column in SKETCH_COLUMNS})
+        for dimension in SKETCH_DIMENSIONS:
+            catalog_sketches[dimension] = build_grouped_sketches(empty_data, dimension)
+    return catalog_sketches
+
+
+# Function to get the path of the sketches compiled from a CSV file
+def get_sketches_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(SKETCH_SUFFIX)
+
+
+# Function to write the sketches of a cleaned CSV file next to it
+#
+# The catalog is streamed in chunks from its snapshot, or from the CSV file
+# without one, so compiling the sketches does not depend on its size.
+def compile_sketches(csv_path: Path = CLEAN_DATA_FILE) -> Path:
+    csv_path = Path(csv_path)
+    sketches_path = get_sketches_path(csv_path)
+    source_metadata = get_source_metadata(csv_path)
+    catalog_sketches = build_catalog_sketches(
+        iter_catalog_chunks(csv_path, SKETCH_COLUMNS)
+    )
+
+    arrays = {
+        "source." + key.decode(): np.array(value)
+        for key, value in source_metadata.items()
+    }
+    for dimension, grouped_sketches in catalog_sketches.items():
+        arrays[dimension + ".types"] = grouped_sketches.types.astype(str)
+        arrays[dimension + ".values"] = grouped_sketches.values
+        arrays[dimension + ".duration_counts"] = grouped_sketches.duration_counts
+        for column, registers in grouped_sketches.registers.items():
+            arrays[f"{dimension}.{column}.registers"] = registers
+
+    # Write to a temporary file first, so readers never see half-written sketches
+    temporary_path = sketches_path.with_name(sketches_path.name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, sketches_path)
+    logger.info("Compiled the sketches of %s into %s", csv_path, sketches_path)
+    return sketches_path
+
+
+# Function to read the persisted sketches of a dimension (None if missing or stale)
+def read_grouped_sketches(csv_path: Path, dimension: str) -> Optional[GroupedSketches]:
+    sketches_path = get_sketches_path(csv_path)
+    if not sketches_path.exists():
+        return None
+    with np.load(sketches_path) as arrays:
+        source_metadata = {
+            name[len("source.") :].encode(): arrays[name].item()
+            for name in arrays.files
+            if name.startswith("source.")
+        }
+        if dimension + ".types" not in arrays.files:
+            return None
+        if not is_snapshot_fresh(source_metadata, csv_path):
+            logger.warning("Sketches %s are stale, rebuilding them", sketches_path)
+            return None
+        return GroupedSketches(
+            dimension=dimension,
+            types=arrays[dimension + ".types"].astype(object),
+            values=arrays[dimension + ".values"],
+            registers={
+                column: arrays[f"{dimension}.{column}.registers"]
+                for column in DISTINCT_COLUMNS
+            },
+            duration_counts=arrays[dimension + ".duration_counts"],
+        )
+
+
+# Function to get the shared sketches of a dimension for the current dataset version
+#
+# The sketches of the whole catalog are read from the file compiled with the
+# snapshot when it is fresh. With an active filter they are built from the
+# titles kept by the filter, and the sketches of the most recent filters are
+# cached.
+@timed("aggregate")
+def get_grouped_sketches(
+    dimension: str, catalog_filter: Optional[CatalogFilter] = None
+) -> GroupedSketches:
+    if dimension not in SKETCH_DIMENSIONS:
+        raise ValueError(f"No sketches for the dimension: {dimension}")
+    if catalog_filter is not None and not catalog_filter.is_active():
+        catalog_filter = None
+    dataset_version = get_dataset_version()
+    key = (dataset_version, dimension, catalog_filter)
+    grouped_sketches = _sketches.get(key)
+    record_cache_access("sketches", grouped_sketches is not None)
+    if grouped_sketches is not None:
+        return grouped_sketches
+
+    with _lock:
+        if key not in _sketches:
+            # Drop the sketches of retired dataset versions
+            live_versions = get_live_dataset_versions()
+            for old_key in [k for k in _sketches if k[0] not in live_versions]:
+                del _sketches[old_key]
+
+            grouped_sketches = None
+            if catalog_filter is None:
+                grouped_sketches = read_grouped_sketches(
+                    get_dataset_file(dataset_version), dimension
+                )
+            if grouped_sketches is None:
+                from netflix.filters import apply_filter
+                from netflix.loader import get_netflix_data
+
+                grouped_sketches = build_grouped_sketches(
+                    apply_filter(get_netflix_data(SKETCH_COLUMNS), catalog_filter),
+                    dimension,
+                )
+            _sketches[key] = grouped_sketches
+            if len(_sketches) > MAX_CACHED_SKETCHES:
+                # Evict the oldest sketches of a filtered catalog, never the full ones
+                oldest_key = next(k for k in _sketches if k[2] is not None)
+                del _sketches[oldest_key]
+    return _sketches[key]
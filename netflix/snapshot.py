@@ -0,0 +1,368 @@
+import argparse
+import hashlib
+import logging
+import os
+import struct
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from netflix.schema import (
+    ALL_COLUMNS,
+    CATALOG_COLUMNS,
+    apply_schema,
+    get_csv_dtypes,
+    get_source_columns,
+    validate_columns,
+)
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# The snapshot is an uncompressed Arrow IPC file, so it can be memory-mapped and
+# every worker process shares its pages through the OS page cache
+SNAPSHOT_SUFFIX = ".arrow"
+
+# Suffixes of the other files compiled from a CSV file - the inverted indexes,
+# title vectors and sketches - and of every compiled file
+INDEX_SUFFIX = ".indexes.npz"
+VECTORS_SUFFIX = ".vectors.npz"
+SKETCH_SUFFIX = ".sketches.npz"
+COMPILED_SUFFIXES = [SNAPSHOT_SUFFIX, INDEX_SUFFIX, VECTORS_SUFFIX, SKETCH_SUFFIX]
+
+# Keys of the Arrow schema metadata describing the source CSV file
+FINGERPRINT_KEY = b"netflix.source_fingerprint"
+SOURCE_SIZE_KEY = b"netflix.source_size"
+SOURCE_MTIME_KEY = b"netflix.source_mtime_ns"
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# Size of the local file header of a ZIP member, the last 4 bytes being the
+# lengths of its name and extra field
+ZIP_LOCAL_HEADER_SIZE = 30
+
+# Rows of a catalog read at once by iter_catalog_chunks, so that streaming a
+# catalog does not depend on its size
+CHUNK_ROWS = 1 << 18
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the path of the snapshot compiled from a CSV file
+def get_snapshot_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(SNAPSHOT_SUFFIX)
+
+
+# Function to get the content fingerprint (SHA-256 hex digest) of a file
+def get_file_fingerprint(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to get the metadata describing the current content of a CSV file
+#
+# Files compiled from the CSV file (snapshot, indexes, ...) store it, so that
+# is_snapshot_fresh can tell if they are out of date.
+def get_source_metadata(csv_path: Path) -> Dict[bytes, bytes]:
+    source_stat = Path(csv_path).stat()
+    return {
+        FINGERPRINT_KEY: get_file_fingerprint(csv_path).encode(),
+        SOURCE_SIZE_KEY: str(source_stat.st_size).encode(),
+        SOURCE_MTIME_KEY: str(source_stat.st_mtime_ns).encode(),
+    }
+
+
+# Function to set the key of every null entry of a dictionary array to 0
+def _fill_null_keys(array):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not array.null_count:
+        return array
+    return pa.DictionaryArray.from_arrays(
+        pc.fill_null(array.indices, 0).to_numpy(),
+        array.dictionary,
+        mask=array.is_null().to_numpy(zero_copy_only=False),
+        ordered=array.type.ordered,
+    )
+
+
+# Function to set the keys of the null entries of the dictionary columns of an
+# Arrow table or record batch to 0
+#
+# pyarrow keeps the category code -1 of a missing value under its null entry,
+# which Polars refuses to read - see netflix.backends.PolarsBackend.
+def fill_null_dictionary_keys(data):
+    import pyarrow as pa
+
+    columns = []
+    for column in data.columns:
+        if pa.types.is_dictionary(column.type) and column.null_count:
+            if isinstance(column, pa.ChunkedArray):
+                column = pa.chunked_array(
+                    [_fill_null_keys(chunk) for chunk in column.chunks],
+                    type=column.type,
+                )
+            else:
+                column = _fill_null_keys(column)
+        columns.append(column)
+    return type(data).from_arrays(columns, schema=data.schema)
+
+
+# Function to compile a cleaned CSV file into a columnar snapshot next to it
+#
+# Readers look for the snapshot at get_snapshot_path(csv_path) only.
+def compile_snapshot(csv_path: Path) -> Path:
+    import pyarrow as pa
+
+    from netflix.loader import read_netflix_data
+
+    csv_path = Path(csv_path)
+    snapshot_path = get_snapshot_path(csv_path)
+
+    source_metadata = get_source_metadata(csv_path)
+    # The numeric duration columns are stored too, so they are never parsed at load time
+    netflix_data = read_netflix_data(csv_path, ALL_COLUMNS)
+
+    table = fill_null_dictionary_keys(
+        pa.Table.from_pandas(netflix_data, preserve_index=False)
+    )
+    metadata = dict(table.schema.metadata or {})
+    metadata.update(source_metadata)
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temporary file first, so readers never see a half-written snapshot
+    temporary_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+    with pa.OSFile(str(temporary_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary_path, snapshot_path)
+
+    logger.info(
+        "Compiled %s into %s (%d rows, fingerprint %s)",
+        csv_path,
+        snapshot_path,
+        table.num_rows,
+        source_metadata[FINGERPRINT_KEY][:12].decode(),
+    )
+    return snapshot_path
+
+
+# Function to check if a file was compiled from the current content of a CSV file
+#
+# The size and modification time recorded by get_source_metadata are checked first, so
+# the CSV file is only hashed when it may have been touched since compilation.
+def is_snapshot_fresh(source_metadata: dict, csv_path: Path) -> bool:
+    fingerprint = source_metadata.get(FINGERPRINT_KEY)
+    if fingerprint is None:
+        return False
+    try:
+        source_stat = Path(csv_path).stat()
+    except OSError:
+        # Without the CSV file the compiled file is the only copy of the data
+        return True
+    if (
+        source_metadata.get(SOURCE_SIZE_KEY) == str(source_stat.st_size).encode()
+        and source_metadata.get(SOURCE_MTIME_KEY)
+        == str(source_stat.st_mtime_ns).encode()
+    ):
+        return True
+    return fingerprint.decode() == get_file_fingerprint(csv_path)
+
+
+# Function to memory-map the arrays of an uncompressed .npz file, as written by np.savez
+#
+# np.load ignores mmap_mode for .npz files and reads every array into memory.
+# np.savez stores its arrays without compression though, so each one is mapped
+# read-only at its offset in the file, and every worker process shares the
+# pages through the OS page cache.
+def memory_map_npz(path: Path) -> Dict[str, np.ndarray]:
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed, it cannot be memory-mapped")
+            # The data follows the local file header, its name and extra field
+            file.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE - 4)
+            name_length, extra_length = struct.unpack("<HH", file.read(4))
+            file.seek(name_length + extra_length, os.SEEK_CUR)
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(file)
+            else:
+                header = np.lib.format.read_array_header_2_0(file)
+            shape, fortran_order, dtype = header
+            name = info.filename[: -len(".npy")]
+            if dtype.hasobject or not np.prod(shape, dtype=np.int64):
+                arrays[name] = np.load(archive.open(info), allow_pickle=False)
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=file.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+# Function to read the given columns of a memory-mapped snapshot into a DataFrame
+#
+# Returns None if pyarrow is not installed or the snapshot is missing or stale,
+# so the caller can fall back to parsing the CSV file.
+def read_snapshot(
+    csv_path: Path, columns: Optional[Sequence[str]] = None
+) -> Optional[pd.DataFrame]:
+    snapshot_path = get_snapshot_path(csv_path)
+    if not snapshot_path.exists():
+        logger.info("No snapshot at %s, reading %s", snapshot_path, csv_path)
+        return None
+    try:
+        import pyarrow as pa
+    except ImportError:
+        logger.info("pyarrow is not installed, reading %s", csv_path)
+        return None
+
+    if columns is None:
+        columns = CATALOG_COLUMNS
+    validate_columns(columns)
+
+    # The arrays read from the map keep it open for as long as they are alive
+    reader = pa.ipc.open_file(pa.memory_map(str(snapshot_path), "r"))
+    if not is_snapshot_fresh(reader.schema.metadata or {}, csv_path):
+        logger.warning("Snapshot %s is stale, reading %s", snapshot_path, csv_path)
+        return None
+    # Snapshots compiled before a derived column existed are completed from duration
+    stored_columns = reader.schema.names
+    if all(column in stored_columns for column in columns):
+        columns_to_read = list(columns)
+    else:
+        columns_to_read = get_source_columns(columns)
+    table = reader.read_all().select(columns_to_read)
+    # Numeric columns stay zero-copy views of the mapped file
+    netflix_data = table.to_pandas(split_blocks=True, self_destruct=True)
+    return apply_schema(netflix_data, columns)
+
+
+# Function to read some columns of a catalog in chunks of rows, indexed by row position
+#
+# The catalog is a snapshot (.arrow) or a cleaned CSV file - read from its
+# snapshot when a fresh one is next to it. A snapshot is memory-mapped and only
+# a chunk of it is converted to pandas at a time. With row_positions (sorted)
+# only the rows at these positions are kept, and the chunks of a snapshot
+# without any of them are not converted at all.
+def iter_catalog_chunks(
+    catalog_path: Path,
+    columns: Sequence[str],
+    row_positions: Optional[np.ndarray] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    catalog_path = Path(catalog_path)
+    columns = list(columns)
+    if catalog_path.suffix == SNAPSHOT_SUFFIX:
+        snapshot_path: Optional[Path] = catalog_path
+    else:
+        snapshot_path = get_snapshot_path(catalog_path)
+        if not snapshot_path.exists():
+            snapshot_path = None
+
+    reader = None
+    if snapshot_path is not None:
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file(pa.memory_map(str(snapshot_path), "r"))
+        if snapshot_path != catalog_path and not is_snapshot_fresh(
+            reader.schema.metadata or {}, catalog_path
+        ):
+            reader = None
+
+    if reader is None:
+        for chunk in pd.read_csv(
+            catalog_path,
+            usecols=get_source_columns(columns),
+            dtype=get_csv_dtypes(),
+            chunksize=chunk_rows,
+        ):
+            if row_positions is not None:
+                chunk = chunk.iloc[
+                    _get_chunk_positions(row_positions, chunk.index[0], len(chunk))
+                ]
+            yield apply_schema(chunk, columns)
+        return
+
+    import pyarrow as pa
+
+    if all(column in reader.schema.names for column in columns):
+        columns_to_read = columns
+    else:
+        columns_to_read = get_source_columns(columns)
+    first_row = 0
+    for batch_index in range(reader.num_record_batches):
+        table = pa.Table.from_batches([reader.get_batch(batch_index)])
+        table = table.select(columns_to_read)
+        for offset in range(0, table.num_rows, chunk_rows):
+            chunk_table = table.slice(offset, chunk_rows)
+            index = pd.RangeIndex(first_row, first_row + chunk_table.num_rows)
+            first_row += chunk_table.num_rows
+            if row_positions is not None:
+                chunk_positions = _get_chunk_positions(
+                    row_positions, index[0], len(index)
+                )
+                if not len(chunk_positions):
+                    continue
+                chunk_table = chunk_table.take(pa.array(chunk_positions))
+                index = index[chunk_positions]
+            chunk = chunk_table.to_pandas()
+            chunk.index = index
+            yield apply_schema(chunk, columns)
+
+
+# Function to get the positions within a chunk of the rows at some (sorted) positions
+def _get_chunk_positions(
+    row_positions: np.ndarray, first_row: int, no_of_rows: int
+) -> np.ndarray:
+    start, stop = np.searchsorted(row_positions, [first_row, first_row + no_of_rows])
+    return row_positions[start:stop] - first_row
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.snapshot [csv_path]
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from netflix.loader import CLEAN_DATA_FILE
+
+    parser = argparse.ArgumentParser(
+        description="Compile the cleaned Netflix CSV file into a columnar snapshot "
+        "and its inverted indexes, title vectors and sketches"
+    )
+    parser.add_argument("csv_path", nargs="?", type=Path, default=CLEAN_DATA_FILE)
+    parser.add_argument(
+        "--no-indexes",
+        action="store_true",
+        help="do not compile the inverted indexes, title vectors and sketches",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    compile_snapshot(args.csv_path)
+    if not args.no_indexes:
+        from netflix.indexes import compile_indexes
+        from netflix.similarity import compile_title_vectors
+        from netflix.sketches import compile_sketches
+
+        compile_indexes(args.csv_path)
+        compile_title_vectors(args.csv_path)
+        compile_sketches(args.csv_path)
+
+
+if __name__ == "__main__":
+    main()
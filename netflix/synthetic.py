@@ -0,0 +1,412 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from netflix.indexes import split_terms
+from netflix.loader import CLEAN_DATA_FILE
+from netflix.schema import ALL_COLUMNS, CATALOG_COLUMNS, UNKNOWN, apply_schema
+from netflix.snapshot import (
+    FINGERPRINT_KEY,
+    SNAPSHOT_SUFFIX,
+    fill_null_dictionary_keys,
+)
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+DEFAULT_SEED = 2021
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Multi-valued columns, joined with ", " - an empty list is written as Unknown
+LIST_COLUMNS = ["director", "cast", "country", "listed_in"]
+LIST_SEPARATOR = ", "
+
+# Categorical columns whose categories are known up front, so every chunk of a
+# snapshot shares the same dictionary
+FIXED_CATEGORY_COLUMNS = ["type", "rating", "duration"]
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------------
+# Empirical distribution of the values of a column, sampled by inverse CDF
+@dataclass(frozen=True)
+class Distribution:
+    values: np.ndarray
+    cumulative_weights: np.ndarray
+
+    # Function to draw some values
+    def sample(self, random_state: np.random.Generator, size: int) -> np.ndarray:
+        draws = random_state.random(size) * self.cumulative_weights[-1]
+        return self.values[
+            np.searchsorted(self.cumulative_weights, draws, side="right")
+        ]
+
+
+# Distribution of a list of terms - its length, then every term independently
+@dataclass(frozen=True)
+class ListDistribution:
+    lengths: Distribution
+    terms: Distribution
+
+
+# Distributions of the columns of the titles of one type
+@dataclass(frozen=True)
+class ContentTypeModel:
+    ratings: Distribution
+    # Joint distribution of (release_year, year_added) - one row per pair
+    years: Distribution
+    durations: Distribution
+    lists: Dict[str, ListDistribution]
+    title_words: ListDistribution
+    description_words: ListDistribution
+
+
+# Distributions learned from a cleaned catalog
+@dataclass(frozen=True)
+class CatalogModel:
+    types: Distribution
+    content_types: Dict[str, ContentTypeModel]
+    max_date_added: np.datetime64
+    categories: Dict[str, list]
+
+
+# Process-wide model of the generator workers, set once per worker process
+_worker_model: Optional[CatalogModel] = None
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to learn the distribution of the values of a column (or rows of columns)
+def _learn_distribution(values) -> Distribution:
+    counts = values.value_counts(sort=False)
+    if isinstance(counts.index, pd.MultiIndex):
+        distinct_values = np.array(counts.index.tolist(), dtype=object)
+    else:
+        distinct_values = counts.index.to_numpy(dtype=object)
+    return Distribution(
+        values=distinct_values,
+        cumulative_weights=np.cumsum(counts.to_numpy(dtype="float64")),
+    )
+
+
+# Function to learn the list lengths and term frequencies of a list of terms per row
+def _learn_list_distribution(terms: pd.Series, no_of_rows: int) -> ListDistribution:
+    lengths = np.bincount(terms.index.to_numpy(dtype="int64"), minlength=no_of_rows)
+    return ListDistribution(
+        lengths=_learn_distribution(pd.Series(lengths)),
+        terms=_learn_distribution(terms),
+    )
+
+
+# Function to split texts into the words between whitespace - one row per (text, word)
+def _split_words(texts: pd.Series) -> pd.Series:
+    words = texts.reset_index(drop=True).str.split().explode()
+    return words[words.notna()]
+
+
+# Function to learn the distributions of the titles of one type
+def _learn_content_type_model(titles: pd.DataFrame) -> ContentTypeModel:
+    titles = titles.reset_index(drop=True)
+    return ContentTypeModel(
+        ratings=_learn_distribution(titles["rating"]),
+        years=_learn_distribution(titles[["release_year", "year_added"]]),
+        durations=_learn_distribution(titles["duration"]),
+        lists={
+            column: _learn_list_distribution(split_terms(titles[column]), len(titles))
+            for column in LIST_COLUMNS
+        },
+        title_words=_learn_list_distribution(
+            _split_words(titles["title"]), len(titles)
+        ),
+        description_words=_learn_list_distribution(
+            _split_words(titles["description"]), len(titles)
+        ),
+    )
+
+
+# Function to learn the distributions of every column of a cleaned catalog
+#
+# The catalog is read as text, as in the CSV file. Every column but the type is
+# learned per type, and the release and added years jointly.
+def learn_catalog_model(netflix_data: pd.DataFrame) -> CatalogModel:
+    netflix_data = netflix_data.astype(str)
+    date_added = pd.to_datetime(netflix_data["date_added"], errors="coerce")
+    return CatalogModel(
+        types=_learn_distribution(netflix_data["type"]),
+        content_types={
+            content_type: _learn_content_type_model(titles)
+            for content_type, titles in netflix_data.groupby("type")
+        },
+        max_date_added=np.datetime64(date_added.max().date(), "D"),
+        categories={
+            column: sorted(netflix_data[column].unique())
+            for column in FIXED_CATEGORY_COLUMNS
+        },
+    )
+
+
+# Function to read a cleaned CSV file and learn its model
+def read_catalog_model(csv_path: Path = CLEAN_DATA_FILE) -> CatalogModel:
+    return learn_catalog_model(pd.read_csv(csv_path, dtype=str, keep_default_na=False))
+
+
+# Function to join a flat array of terms into one string per row
+#
+# Row i owns the next lengths[i] terms - a term drawn twice is only kept once.
+# Joining slices of a list is much faster than concatenating object arrays
+# term position by term position.
+def _join_terms(
+    terms: np.ndarray, lengths: np.ndarray, separator: str, empty: str
+) -> np.ndarray:
+    stops = np.cumsum(lengths)
+    starts = stops - lengths
+    term_list = terms.tolist()
+    joined = np.empty(len(lengths), dtype=object)
+    joined[:] = [
+        separator.join(dict.fromkeys(term_list[start:stop])) if stop > start else empty
+        for start, stop in zip(starts.tolist(), stops.tolist())
+    ]
+    return joined
+
+
+# Function to draw one list of terms per row and join them
+def _sample_lists(
+    list_distribution: ListDistribution,
+    random_state: np.random.Generator,
+    size: int,
+    separator: str = LIST_SEPARATOR,
+    empty: str = UNKNOWN,
+) -> np.ndarray:
+    lengths = list_distribution.lengths.sample(random_state, size).astype("int64")
+    terms = list_distribution.terms.sample(random_state, int(lengths.sum()))
+    return _join_terms(terms, lengths, separator, empty)
+
+
+# Function to draw the dates titles were added in their year (empty if unknown)
+def _sample_dates_added(
+    years_added: np.ndarray, max_date_added: np.datetime64, random_state
+) -> np.ndarray:
+    dates_added = np.full(len(years_added), "", dtype=object)
+    is_known = years_added != UNKNOWN
+    years = years_added[is_known].astype("int64")
+    first_days = (years - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    days = random_state.integers(0, 365, size=len(years))
+    dates = np.minimum(first_days + days, max_date_added)
+    dates_added[is_known] = np.datetime_as_string(dates).astype(object)
+    return dates_added
+
+
+# Function to generate the rows of the titles of one type
+def _generate_content_type(
+    content_type_model: ContentTypeModel,
+    max_date_added: np.datetime64,
+    random_state: np.random.Generator,
+    size: int,
+) -> Dict[str, np.ndarray]:
+    years = content_type_model.years.sample(random_state, size).reshape(size, 2)
+    columns = {
+        "title": _sample_lists(
+            content_type_model.title_words, random_state, size, " ", ""
+        ),
+        "rating": content_type_model.ratings.sample(random_state, size),
+        "release_year": years[:, 0],
+        "year_added": years[:, 1],
+        "date_added": _sample_dates_added(years[:, 1], max_date_added, random_state),
+        "duration": content_type_model.durations.sample(random_state, size),
+        "description": _sample_lists(
+            content_type_model.description_words, random_state, size, " ", ""
+        ),
+    }
+    for column, list_distribution in content_type_model.lists.items():
+        columns[column] = _sample_lists(list_distribution, random_state, size)
+    return columns
+
+
+# Function to generate one chunk of a synthetic catalog, as text like the CSV file
+#
+# Every chunk draws from its own random state seeded by (seed, chunk_index), so
+# a catalog is the same whatever the number of processes generating it.
+def generate_chunk(
+    model: CatalogModel,
+    chunk_index: int,
+    chunk_size: int,
+    no_of_rows: int,
+    seed: int = DEFAULT_SEED,
+) -> pd.DataFrame:
+    random_state = np.random.default_rng([seed, chunk_index])
+    first_row = chunk_index * chunk_size
+    size = min(chunk_size, no_of_rows - first_row)
+
+    types = model.types.sample(random_state, size)
+    columns = {
+        "show_id": "s"
+        + np.arange(first_row + 1, first_row + size + 1).astype(str).astype(object),
+        "type": types,
+    }
+    for content_type, content_type_model in model.content_types.items():
+        rows = np.flatnonzero(types == content_type)
+        for column, values in _generate_content_type(
+            content_type_model, model.max_date_added, random_state, len(rows)
+        ).items():
+            columns.setdefault(column, np.empty(size, dtype=object))[rows] = values
+    return pd.DataFrame(columns, columns=CATALOG_COLUMNS)
+
+
+# Function to get the Arrow schema of a synthetic snapshot
+def get_snapshot_schema(model: CatalogModel):
+    import pyarrow as pa
+
+    types = {column: pa.string() for column in ALL_COLUMNS}
+    types.update(
+        {
+            column: pa.dictionary(pa.int32(), pa.string())
+            for column in FIXED_CATEGORY_COLUMNS
+        }
+    )
+    types["date_added"] = pa.timestamp("ns")
+    for column in ["release_year", "year_added", "duration_minutes", "season_count"]:
+        types[column] = pa.int16()
+    return pa.schema([(column, types[column]) for column in ALL_COLUMNS])
+
+
+# Function to convert a chunk to an Arrow record batch of the snapshot schema
+def _to_record_batch(model: CatalogModel, chunk: pd.DataFrame):
+    import pyarrow as pa
+
+    typed_chunk = apply_schema(chunk, ALL_COLUMNS)
+    for column in FIXED_CATEGORY_COLUMNS:
+        typed_chunk[column] = typed_chunk[column].cat.set_categories(
+            model.categories[column]
+        )
+    # Open-ended categorical columns are stored as strings - their categories are
+    # rebuilt when the snapshot is loaded
+    for column in ["country", "listed_in"]:
+        typed_chunk[column] = typed_chunk[column].astype("string")
+    return fill_null_dictionary_keys(
+        pa.RecordBatch.from_pandas(
+            typed_chunk, schema=get_snapshot_schema(model), preserve_index=False
+        )
+    )
+
+
+# Function to set the model of a generator worker process
+def _init_worker(model: CatalogModel) -> None:
+    global _worker_model
+    _worker_model = model
+
+
+# Function to generate one chunk in a worker process, formatted for the output file
+def _generate_output_chunk(
+    chunk_index: int, chunk_size: int, no_of_rows: int, seed: int, is_snapshot: bool
+):
+    chunk = generate_chunk(_worker_model, chunk_index, chunk_size, no_of_rows, seed)
+    if is_snapshot:
+        return _to_record_batch(_worker_model, chunk)
+    return chunk.to_csv(header=chunk_index == 0, index=False)
+
+
+# Function to write a synthetic catalog of any size as a CSV file or a snapshot
+#
+# Chunks are generated in parallel by a pool of processes and written in order
+# as they complete. At most two chunks per process are in flight, so memory
+# does not depend on the number of rows. An output path ending in .arrow is
+# written as a columnar snapshot, served by the web app without any CSV file.
+def generate_catalog(
+    output_path: Path,
+    no_of_rows: int,
+    model: Optional[CatalogModel] = None,
+    seed: int = DEFAULT_SEED,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: Optional[int] = None,
+) -> Path:
+    output_path = Path(output_path)
+    if model is None:
+        model = read_catalog_model()
+    if processes is None:
+        processes = os.cpu_count() or 1
+    is_snapshot = output_path.suffix == SNAPSHOT_SUFFIX
+    no_of_chunks = -(-no_of_rows // chunk_size)
+    start = time.perf_counter()
+
+    temporary_path = output_path.with_name(output_path.name + ".tmp")
+    writer = None
+    with open(temporary_path, "wb") as file, multiprocessing.get_context("spawn").Pool(
+        processes, initializer=_init_worker, initargs=(model,)
+    ) as pool:
+        if is_snapshot:
+            import pyarrow as pa
+
+            schema = get_snapshot_schema(model).with_metadata(
+                {FINGERPRINT_KEY: f"synthetic-{seed}-{no_of_rows}".encode()}
+            )
+            writer = pa.ipc.new_file(file, schema)
+
+        pending = deque()
+        next_chunk_index = 0
+        while pending or next_chunk_index < no_of_chunks:
+            while next_chunk_index < no_of_chunks and len(pending) < 2 * processes:
+                pending.append(
+                    pool.apply_async(
+                        _generate_output_chunk,
+                        (next_chunk_index, chunk_size, no_of_rows, seed, is_snapshot),
+                    )
+                )
+                next_chunk_index += 1
+            output_chunk = pending.popleft().get()
+            if writer is not None:
+                writer.write_batch(output_chunk)
+            else:
+                file.write(output_chunk.encode())
+        if writer is not None:
+            writer.close()
+    os.replace(temporary_path, output_path)
+
+    logger.info(
+        "Generated %d synthetic titles into %s in %.1fs",
+        no_of_rows,
+        output_path,
+        time.perf_counter() - start,
+    )
+    return output_path
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.synthetic output_path --rows N
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic Netflix catalog that follows the "
+        "distributions of the cleaned catalog, as a CSV file or a snapshot (.arrow)"
+    )
+    parser.add_argument("output_path", type=Path)
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--source", type=Path, default=CLEAN_DATA_FILE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="default: one per CPU core"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    generate_catalog(
+        args.output_path,
+        args.rows,
+        read_catalog_model(args.source),
+        args.seed,
+        args.chunk_size,
+        args.processes,
+    )
+
+
+if __name__ == "__main__":
+    main()
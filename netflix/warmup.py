@@ -0,0 +1,224 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+from netflix.metrics import STAGE_SECONDS, observe, set_thread_page, timer
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+
+# The first script run of the server process starts warming the caches of the
+# pages 2 - 5 in the background - set the environment variable NETFLIX_WARMUP=0
+# to turn it off
+WARMUP_ENABLED = os.environ.get("NETFLIX_WARMUP", "1") != "0"
+
+# Page the timings of the warm-up are labelled with - see the diagnostics
+WARMUP_PAGE = "warmup"
+
+# Modules imported by the pages 2 - 5, in import order. The home page imports
+# none of them, so it is served without waiting for pandas or plotly.
+PAGE_MODULES = [
+    "streamlit",
+    "pandas",
+    "plotly.express",
+    "netflix.loader",
+    "netflix.sidebar",
+    "netflix.aggregates",
+    "netflix.backends",
+    "netflix.figures",
+]
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_warmup: Optional[threading.Thread] = None
+_warmed_up = threading.Event()
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to import the modules of the pages and get the seconds each import took
+#
+# The seconds of a module exclude the modules imported before it, so they add up
+# to the total import time.
+def import_page_modules() -> Dict[str, float]:
+    import_seconds = {}
+    with timer("import"):
+        for module in PAGE_MODULES:
+            start = time.perf_counter()
+            importlib.import_module(module)
+            import_seconds[module] = time.perf_counter() - start
+    return import_seconds
+
+
+# Function to load the data and build the default aggregates of the pages 2 - 5
+#
+# Loads the columns of the filter sidebar and its options, the count cube of the
+# unfiltered catalog, the counts of the histograms, the daily growth series, the
+# sketches and the co-occurrence counts of page 7, for the dataset version the
+# current thread is pinned to.
+def warm_up_page_data() -> None:
+    from netflix.aggregates import get_counts_by_type
+    from netflix.backends import get_query_backend
+    from netflix.cooccurrence import COOCCURRENCE_PAIRS, get_cooccurrence_matrix
+    from netflix.filters import FILTER_COLUMNS
+    from netflix.growth import get_growth_series
+    from netflix.indexes import get_inverted_index
+    from netflix.loader import get_netflix_data
+    from netflix.sketches import SKETCH_DIMENSIONS, get_grouped_sketches
+
+    get_netflix_data(FILTER_COLUMNS)
+    for column in ["country", "listed_in"]:
+        get_inverted_index(column)
+    for dimension in ["release_year", "rating", "year_added"]:
+        get_counts_by_type(dimension)
+    get_growth_series()
+    for dimension in SKETCH_DIMENSIONS:
+        get_grouped_sketches(dimension)
+    for row_column, column_column in COOCCURRENCE_PAIRS.values():
+        get_cooccurrence_matrix(row_column, column_column)
+    get_query_backend().get_malformed_durations()
+
+
+# Function to build the default figures of the pages 2 - 5 and 7 into the figure cache
+#
+# These are the figures of the unfiltered catalog, with and without normalized
+# histograms, the growth chart of every date added in the default buckets and
+# the default co-occurrence heatmap - the ones a page shows on its first visit.
+def warm_up_page_figures() -> None:
+    from netflix.cooccurrence import DEFAULT_PAIR, DEFAULT_TOP_N
+    from netflix.figures import (
+        HISTNORMS,
+        get_cooccurrence_heatmap,
+        get_distinct_people_chart,
+        get_growth_chart,
+        get_movies_bands,
+        get_movies_scatter,
+        get_rating_histogram,
+        get_release_year_histogram,
+        get_tv_shows_bands,
+        get_tv_shows_scatter,
+        get_year_added_histogram,
+    )
+    from netflix.growth import DEFAULT_GRANULARITY, get_growth_series
+
+    for histnorm in HISTNORMS:
+        get_release_year_histogram(None, histnorm)
+        get_rating_histogram(None, histnorm)
+        get_year_added_histogram(None, histnorm)
+    get_distinct_people_chart(None)
+    growth_series = get_growth_series()
+    get_growth_chart(
+        None,
+        growth_series.first_date.date(),
+        growth_series.last_date.date(),
+        DEFAULT_GRANULARITY,
+    )
+    get_movies_scatter(None)
+    get_tv_shows_scatter(None)
+    get_movies_bands(None)
+    get_tv_shows_bands(None)
+    get_cooccurrence_heatmap(None, DEFAULT_PAIR, DEFAULT_TOP_N)
+
+
+# Function to warm up the pages 2 - 5 in the current thread and get the seconds per step
+#
+# Every step is also timed under the page WARMUP_PAGE, next to the load,
+# aggregate and figure timings of the functions it calls.
+def warm_up() -> Dict[str, float]:
+    start = time.perf_counter()
+    set_thread_page(WARMUP_PAGE)
+    import_seconds = import_page_modules()
+    imported = time.perf_counter()
+
+    from netflix.loader import pin_dataset_version, unpin_dataset_version
+
+    pin_dataset_version()
+    try:
+        warm_up_page_data()
+        data_ready = time.perf_counter()
+        warm_up_page_figures()
+    finally:
+        unpin_dataset_version()
+    end = time.perf_counter()
+    observe(STAGE_SECONDS, end - start, page=WARMUP_PAGE, stage="total")
+
+    for module, seconds in import_seconds.items():
+        logger.info("Imported %s in %.3fs", module, seconds)
+    timings = {
+        "import": imported - start,
+        "data": data_ready - imported,
+        "figures": end - data_ready,
+        "total": end - start,
+    }
+    logger.info(
+        "Warmed up the pages in %.3fs: imports %.3fs, data and aggregates %.3fs, "
+        "figures %.3fs",
+        timings["total"],
+        timings["import"],
+        timings["data"],
+        timings["figures"],
+    )
+    return timings
+
+
+# Function to run the warm-up in the background thread
+def _run_warmup() -> None:
+    try:
+        warm_up()
+    except Exception:
+        logger.exception("Could not warm up the pages")
+    finally:
+        _warmed_up.set()
+
+
+# Function to start the warm-up in a daemon thread, once per process
+def start_warmup() -> None:
+    global _warmup
+    if not WARMUP_ENABLED:
+        _warmed_up.set()
+        return
+    if _warmup is not None:
+        return
+    with _lock:
+        if _warmup is not None:
+            return
+        _warmup = threading.Thread(target=_run_warmup, name="warmup", daemon=True)
+    _warmup.start()
+
+
+# Function to check if the warm-up is over (or turned off)
+def is_warmed_up() -> bool:
+    return _warmed_up.is_set()
+
+
+# -------------------------------------------------------------------------------------------------
+# Command-line entry point: python -m netflix.warmup
+#
+# Runs the warm-up in the foreground of a fresh process, i.e. a cold start, and
+# reports the seconds of every step.
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Time a cold start: the imports, data load, aggregates and "
+        "default figures of the pages 2 - 5 in a fresh process"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="write the timings as JSON to stdout"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    timings = warm_up()
+    if args.json:
+        json.dump(timings, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,47 @@
+from typing import Optional
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 
+from netflix.backends import get_query_backend
+from netflix.explorer import get_page, get_page_count
+from netflix.loader import get_netflix_data
+from netflix.metrics import set_current_page, timer
+from netflix.search import search_titles
+from netflix.sidebar import render_dataset_version
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("dataset")
+
+# Show the version of the dataset served - it changes when the data file is reloaded
+render_dataset_version()
+
 # -------------------------------------------------------------------------------------------------
 # Constants
-DEFAULT_NUMBER_OF_ROWS = 10
+PAGE_SIZES = [10, 25, 50, 100]
+DEFAULT_PAGE_SIZE = 10
+MAX_NUMBER_OF_SEARCH_RESULTS = 500
 DEFAULT_NUMBER_OF_COLUMNS = 5
+COLUMNS = [
+    "show_id",
+    "type",
+    "title",
+    "director",
+    "cast",
+    "country",
+    "date_added",
+    "year_added",
+    "release_year",
+    "rating",
+    "duration",
+    "listed_in",
+    "description",
+]
 
-# Load the data file into DataFrame
-netflix_data = pd.read_csv("netflix_clean_data.csv")
+# Get the query backend - pages of rows are taken from the shared DataFrame or
+# queried from the snapshot, depending on the backend
+query_backend = get_query_backend()
 
 # -------------------------------------------------------------------------------------------------
 # Functions
@@ -20,55 +54,81 @@ def set_df_styles(results: pd.DataFrame, bg_color: str, font_color: str):
     )
 
 
-# Function to select number of rows and list of columns to filter Dataframe
-def get_attributes_to_filter_df(results: pd.DataFrame, key: str) -> tuple:
-    no_of_rows_to_show = st.slider(
-        "Select number of table rows to display",
-        0,
-        len(results) - 1,
-        DEFAULT_NUMBER_OF_ROWS,
-        key=key + "_select_rows",
+# Function to select the page, list of columns and sort order to filter Dataframe
+def get_attributes_to_filter_df(no_of_rows: int, key: str) -> tuple:
+    page_size = st.selectbox(
+        "Select number of table rows per page",
+        PAGE_SIZES,
+        index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+        key=key + "_select_page_size",
+    )
+    page_number = st.number_input(
+        f"Select the page to display (1 - {get_page_count(no_of_rows, page_size)})",
+        min_value=1,
+        max_value=get_page_count(no_of_rows, page_size),
+        value=1,
+        key=key + "_select_page",
     )
 
     columns_to_show = st.multiselect(
         "Select the columns to display",
-        [
-            "all",
-            "show_id",
-            "type",
-            "title",
-            "director",
-            "cast",
-            "country",
-            "date_added",
-            "year_added",
-            "release_year",
-            "rating",
-            "duration",
-            "listed_in",
-            "description",
-        ],
+        ["all"] + COLUMNS,
         default="all",
         key=key + "_select_columns",
     )
 
+    sort_by = st.selectbox(
+        "Select the column to sort by",
+        ["none"] + COLUMNS,
+        key=key + "_select_sort_by",
+    )
+    is_descending = st.checkbox(
+        "Sort in descending order?", False, key=key + "_sort_descending"
+    )
+
     is_dark_theme = st.checkbox(
         "Want Dataframe in Dark Theme?", False, key=key + "_df_style"
     )
-    return no_of_rows_to_show, columns_to_show, is_dark_theme
+    return (
+        int(page_number),
+        page_size,
+        columns_to_show,
+        None if sort_by == "none" else sort_by,
+        not is_descending,
+        is_dark_theme,
+    )
 
 
-# Function to filter Dataframe based on no of rows and list of columns selected
-@st.cache_data
+# Function to filter Dataframe based on the page, list of columns and sort order selected
+#
+# Only the rows of the selected page are taken from the catalog, so this does
+# not depend on its size. row_positions restricts the rows to the results of a
+# search, which are taken from the shared DataFrame.
 def get_filtered_df(
-    results: pd.DataFrame, no_of_rows_to_show: int, columns_to_show: list
+    page_number: int,
+    page_size: int,
+    columns_to_show: list,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+    row_positions: Optional[np.ndarray] = None,
 ) -> pd.DataFrame:
-    if "all" in columns_to_show:
-        filtered_df = results.loc[0:no_of_rows_to_show, :]
+    if "all" in columns_to_show or not columns_to_show:
+        columns = None
     else:
-        filtered_df = results.loc[0:no_of_rows_to_show, columns_to_show]
-
-    return filtered_df
+        columns = columns_to_show
+    if row_positions is None:
+        return query_backend.get_page(
+            page_number, page_size, columns, sort_by, ascending
+        )
+    return get_page(
+        get_netflix_data(),
+        page_number,
+        page_size,
+        columns,
+        sort_by,
+        ascending,
+        row_positions,
+    )
 
 
 # -------------------------------------------------------------------------------------------------
@@ -114,17 +174,44 @@ columns_dict = [
     {"Column Name": "description", "Column Value": "The summary description"},
 ]
 
-st.table(pd.DataFrame(columns_dict))
+with timer("render"):
+    st.table(pd.DataFrame(columns_dict))
 
 st.write(
-    """In order to peek into the data, you can select the number 
-    of rows and the list of columns using the slider and the 
-    multiselect menu given below:"""
+    """In order to peek into the data, you can search the titles and descriptions, 
+    and select the page of rows, the list of columns and the column to sort by 
+    using the menus given below:"""
+)
+search_query = st.text_input(
+    "Search the titles and descriptions (best matches first)",
+    key="netflix_data_search",
 )
-no_of_rows_to_show, columns_to_show, is_dark_theme = get_attributes_to_filter_df(
-    netflix_data, key="netflix_data"
+if search_query.strip():
+    row_positions, _ = search_titles(search_query, MAX_NUMBER_OF_SEARCH_RESULTS)
+    no_of_rows = len(row_positions)
+    st.caption(f"**{no_of_rows}** matching titles")
+else:
+    row_positions = None
+    no_of_rows = query_backend.get_row_count()
+
+(
+    page_number,
+    page_size,
+    columns_to_show,
+    sort_by,
+    ascending,
+    is_dark_theme,
+) = get_attributes_to_filter_df(no_of_rows, key="netflix_data")
+filtered_df = get_filtered_df(
+    page_number,
+    page_size,
+    columns_to_show,
+    sort_by,
+    ascending,
+    row_positions,
 )
-filtered_df = get_filtered_df(netflix_data, no_of_rows_to_show, columns_to_show)
+# Only the rows of the visible page are styled
 if is_dark_theme:
     filtered_df = set_df_styles(filtered_df, "black", "white")
-st.dataframe(filtered_df)
+with timer("render"):
+    st.dataframe(filtered_df)
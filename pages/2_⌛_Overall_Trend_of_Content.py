@@ -1,11 +1,17 @@
 import streamlit as st
-import pandas as pd
-from plotly import express as px
+
+from netflix.aggregates import get_counts_by_type
+from netflix.figures import get_distinct_people_chart, get_release_year_histogram
+from netflix.metrics import set_current_page, timer
+from netflix.sidebar import render_filter_sidebar
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("overall_trend")
 
 # -------------------------------------------------------------------------------------------------
 
-# Load the data file into DataFrame
-netflix_data = pd.read_csv("netflix_clean_data.csv")
+# Get the filter selected in the sidebar - it is kept across pages
+catalog_filter = render_filter_sidebar()
 
 # -------------------------------------------------------------------------------------------------
 
@@ -22,7 +28,9 @@ st.write(
 
 # -------------------------------------------------------------------------------------------------
 # Create subtabs
-subtab_histogram, subtab_data = st.tabs(["**Histogram**", "**Data**"])
+subtab_histogram, subtab_people, subtab_data = st.tabs(
+    ["**Histogram**", "**Directors and cast**", "**Data**"]
+)
 
 with subtab_histogram:
     st.subheader(
@@ -35,37 +43,39 @@ with subtab_histogram:
     else:
         hnorm = None
 
-    fig_release_year_vs_count_of_contents = px.histogram(
-        netflix_data,
-        x="release_year",
-        color="type",
-        labels={"type": "Types of Content on Netflix"},
-        color_discrete_map={"Movie": "DodgerBlue", "TV Show": "Red"},
-        barmode="overlay",
-        histnorm=hnorm,
+    fig_release_year_vs_count_of_contents = get_release_year_histogram(
+        catalog_filter, hnorm
     )
-    fig_release_year_vs_count_of_contents.update_layout(
-        yaxis_title="Number of Releases"
-    )
-    fig_release_year_vs_count_of_contents.update_layout(xaxis_title="Year of Release")
-    st.plotly_chart(
-        fig_release_year_vs_count_of_contents,
-        theme="streamlit",
-        use_container_width=True,
+    with timer("render"):
+        st.plotly_chart(
+            fig_release_year_vs_count_of_contents,
+            theme="streamlit",
+            use_container_width=True,
+        )
+
+with subtab_people:
+    st.subheader("Number of distinct directors and cast members per year of release")
+    # The distinct counts are estimated from sketches compiled with the snapshot
+    fig_distinct_people = get_distinct_people_chart(catalog_filter)
+    with timer("render"):
+        st.plotly_chart(
+            fig_distinct_people, theme="streamlit", use_container_width=True
+        )
+    st.caption(
+        "Estimated with HyperLogLog sketches - within about 2% of the exact counts."
     )
 
 with subtab_data:
     st.subheader("Data related to number of Movies and TV shows released per year")
-    netflix_year_wise_distribution = netflix_data.pivot_table(
-        index="release_year", columns="type", aggfunc="count", values="show_id"
-    )
+    netflix_year_wise_distribution = get_counts_by_type("release_year", catalog_filter)
     netflix_year_wise_distribution = netflix_year_wise_distribution.reset_index()
     netflix_year_wise_distribution.columns = [
         "release_year",
         "no_of_movies",
         "no_of_tv_shows",
     ]
-    st.dataframe(netflix_year_wise_distribution)
+    with timer("render"):
+        st.dataframe(netflix_year_wise_distribution)
 
 # -------------------------------------------------------------------------------------------------
 # Conclusions
@@ -1,11 +1,17 @@
 import streamlit as st
-import pandas as pd
-from plotly import express as px
+
+from netflix.aggregates import get_counts_by_type
+from netflix.figures import get_rating_histogram
+from netflix.metrics import set_current_page, timer
+from netflix.sidebar import render_filter_sidebar
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("rating_popularity")
 
 # -------------------------------------------------------------------------------------------------
 
-# Load the data file into DataFrame
-netflix_data = pd.read_csv("netflix_clean_data.csv")
+# Get the filter selected in the sidebar - it is kept across pages
+catalog_filter = render_filter_sidebar()
 
 # -------------------------------------------------------------------------------------------------
 
@@ -32,36 +38,23 @@ with subtab_histogram:
         hnorm = "percent"
     else:
         hnorm = None
-    fig_rating_vs_count_of_contents = px.histogram(
-        netflix_data,
-        x="rating",
-        color="type",
-        title="Distribution of number of Movies and TV shows based on their ratings",
-        labels={"type": "Types of Content on Netflix"},
-        color_discrete_map={"Movie": "DodgerBlue", "TV Show": "Red"},
-        barmode="overlay",
-        histnorm=hnorm,
-    )
-    fig_rating_vs_count_of_contents.update_layout(
-        yaxis_title="Number of movies / TV Shows"
-    )
-    fig_rating_vs_count_of_contents.update_layout(xaxis_title="TV Ratings")
-    st.plotly_chart(
-        fig_rating_vs_count_of_contents, theme="streamlit", use_container_width=True
-    )
+    fig_rating_vs_count_of_contents = get_rating_histogram(catalog_filter, hnorm)
+    with timer("render"):
+        st.plotly_chart(
+            fig_rating_vs_count_of_contents, theme="streamlit", use_container_width=True
+        )
 
 with subtab_data:
     st.subheader("Data related to number of Movies and TV shows released per rating")
-    netflix_rating_wise_distribution = netflix_data.pivot_table(
-        index="rating", columns="type", aggfunc="count", values="show_id"
-    )
+    netflix_rating_wise_distribution = get_counts_by_type("rating", catalog_filter)
     netflix_rating_wise_distribution = netflix_rating_wise_distribution.reset_index()
     netflix_rating_wise_distribution.columns = [
         "rating",
         "no_of_movies",
         "no_of_tv_shows",
     ]
-    st.dataframe(netflix_rating_wise_distribution)
+    with timer("render"):
+        st.dataframe(netflix_rating_wise_distribution)
 
 # -------------------------------------------------------------------------------------------------
 # Conclusions
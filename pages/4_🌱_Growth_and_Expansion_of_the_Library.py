@@ -1,11 +1,18 @@
 import streamlit as st
-import pandas as pd
-from plotly import express as px
+
+from netflix.aggregates import get_counts_by_type
+from netflix.figures import get_growth_chart, get_year_added_histogram
+from netflix.growth import DEFAULT_GRANULARITY, GRANULARITIES, get_growth_series
+from netflix.metrics import set_current_page, timer
+from netflix.sidebar import render_filter_sidebar
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("library_growth")
 
 # -------------------------------------------------------------------------------------------------
 
-# Load the data file into DataFrame
-netflix_data = pd.read_csv("netflix_clean_data.csv")
+# Get the filter selected in the sidebar - it is kept across pages
+catalog_filter = render_filter_sidebar()
 
 # -------------------------------------------------------------------------------------------------
 
@@ -22,7 +29,9 @@ st.write(
 
 # -------------------------------------------------------------------------------------------------
 # Create subtabs
-subtab_histogram, subtab_data = st.tabs(["**Histogram**", "**Data**"])
+subtab_histogram, subtab_growth, subtab_data = st.tabs(
+    ["**Histogram**", "**Growth over time**", "**Data**"]
+)
 
 with subtab_histogram:
     st.subheader(
@@ -34,33 +43,68 @@ with subtab_histogram:
         hnorm = "percent"
     else:
         hnorm = None
-    fig_year_added_vs_count_of_contents = px.histogram(
-        netflix_data,
-        x="year_added",
-        color="type",
-        title="Frequency of content additions to Netflix over time",
-        labels={"type": "Types of Content on Netflix"},
-        color_discrete_map={"Movie": "DodgerBlue", "TV Show": "Red"},
-        barmode="overlay",
-        histnorm=hnorm,
-    )
-    fig_year_added_vs_count_of_contents.update_layout(
-        yaxis_title="Number of Movies / TV Show"
-    )
-    fig_year_added_vs_count_of_contents.update_layout(
-        xaxis_title="Year added to Netflix"
-    )
-    st.plotly_chart(
-        fig_year_added_vs_count_of_contents, theme="streamlit", use_container_width=True
+    fig_year_added_vs_count_of_contents = get_year_added_histogram(
+        catalog_filter, hnorm
     )
+    with timer("render"):
+        st.plotly_chart(
+            fig_year_added_vs_count_of_contents, theme="streamlit", use_container_width=True
+        )
+
+with subtab_growth:
+    st.subheader("Titles added to Netflix and size of the library over time")
+    # Every number below is looked up in the daily counts of the library and
+    # their running totals, so changing the dates or the buckets is instant
+    growth_series = get_growth_series(catalog_filter)
+    first_date = growth_series.first_date.date()
+    last_date = growth_series.last_date.date()
+    date_col, granularity_col = st.columns([2, 1])
+    with date_col:
+        selected_dates = st.date_input(
+            "Dates added",
+            value=(first_date, last_date),
+            min_value=first_date,
+            max_value=last_date,
+        )
+    with granularity_col:
+        granularity = st.radio(
+            "Buckets",
+            list(GRANULARITIES),
+            index=list(GRANULARITIES).index(DEFAULT_GRANULARITY),
+            horizontal=True,
+        )
+    # The date input returns a single date while the end of the range is picked
+    if not isinstance(selected_dates, (tuple, list)):
+        selected_dates = (selected_dates,)
+    selected_dates = tuple(selected_dates) or (first_date, last_date)
+    start_date, end_date = selected_dates[0], selected_dates[-1]
+
+    library_sizes = growth_series.get_library_size(end_date)
+    additions = growth_series.get_additions(start_date, end_date)
+    metric_cols = st.columns(len(growth_series.types))
+    for metric_col, content_type, library_size, added in zip(
+        metric_cols, growth_series.types, library_sizes, additions
+    ):
+        metric_col.metric(
+            f"{content_type}s in the library on {end_date}",
+            int(library_size),
+            f"{int(added)} added from {start_date}",
+        )
+    if growth_series.undated_counts.sum():
+        st.caption(
+            f"{int(growth_series.undated_counts.sum())} titles without a date added "
+            "are left out"
+        )
+
+    fig_growth = get_growth_chart(catalog_filter, start_date, end_date, granularity)
+    with timer("render"):
+        st.plotly_chart(fig_growth, theme="streamlit", use_container_width=True)
 
 with subtab_data:
     st.subheader(
         "Data related to number of Movies and TV shows added to Netflix per year"
     )
-    netflix_added_year_wise_distribution = netflix_data.pivot_table(
-        index="year_added", columns="type", aggfunc="count", values="show_id"
-    )
+    netflix_added_year_wise_distribution = get_counts_by_type("year_added", catalog_filter)
     netflix_added_year_wise_distribution = (
         netflix_added_year_wise_distribution.reset_index()
     )
@@ -69,7 +113,8 @@ with subtab_data:
         "no_of_movies",
         "no_of_tv_shows",
     ]
-    st.dataframe(netflix_added_year_wise_distribution)
+    with timer("render"):
+        st.dataframe(netflix_added_year_wise_distribution)
 
 # -------------------------------------------------------------------------------------------------
 # Conclusions
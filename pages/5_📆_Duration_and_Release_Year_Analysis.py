@@ -1,11 +1,25 @@
 import streamlit as st
-import pandas as pd
-from plotly import express as px
+
+from netflix.backends import get_query_backend
+from netflix.figures import (
+    get_movies_bands,
+    get_movies_scatter,
+    get_tv_shows_bands,
+    get_tv_shows_scatter,
+)
+from netflix.metrics import set_current_page, timer
+from netflix.sidebar import render_filter_sidebar
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("duration")
 
 # -------------------------------------------------------------------------------------------------
 
-# Load the data file into DataFrame
-netflix_data = pd.read_csv("netflix_clean_data.csv")
+# Get the query backend - the malformed durations are reported from it
+query_backend = get_query_backend()
+
+# Get the filter selected in the sidebar - it is kept across pages
+catalog_filter = render_filter_sidebar()
 
 # -------------------------------------------------------------------------------------------------
 st.title(":calendar: Duration and Release Year Analysis")
@@ -17,45 +31,44 @@ st.write(
     """
 )
 
-# Divide the dataframe - netflix_data into two - netflix_movies and netflix_tv_shows
-netflix_movies = netflix_data[netflix_data["type"] == "Movie"]
-netflix_movies = netflix_movies.reset_index(drop=True)
+# Report the titles whose duration could not be parsed instead of failing
+malformed_durations = query_backend.get_malformed_durations()
+if len(malformed_durations):
+    st.warning(
+        f"{len(malformed_durations)} titles are left out as their duration could "
+        f"not be parsed: {', '.join(map(str, malformed_durations.unique()[:5]))}"
+    )
 
-netflix_tv_shows = netflix_data[netflix_data["type"] == "TV Show"]
-netflix_tv_shows = netflix_tv_shows.reset_index(drop=True)
-
-# Clean up the duration column in both the dataframes - netflix_movies and netflix_tv_shows
-netflix_movies["duration"] = netflix_movies["duration"].str.replace(" min", "")
-netflix_movies["duration"] = netflix_movies["duration"].astype(int)
-
-netflix_tv_shows["duration"] = netflix_tv_shows["duration"].str.replace(" Season", "")
-netflix_tv_shows["duration"] = netflix_tv_shows["duration"].str.replace("s", "")
-netflix_tv_shows["duration"] = netflix_tv_shows["duration"].astype(int)
+# Plot a scatterplot for movies on Netflix - release_year on x-axis and duration on y-axis
+# (a density heatmap once there are too many movies to draw one marker each)
+fig_scatter_movies = get_movies_scatter(catalog_filter)
+with timer("render"):
+    st.plotly_chart(fig_scatter_movies, theme="streamlit", use_container_width=True)
 
+# Plot a scatterplot for TV shows on Netflix - release_year on x-axis and duration on y-axis
+# (a density heatmap once there are too many TV shows to draw one marker each)
+fig_scatter_tv_shows = get_tv_shows_scatter(catalog_filter)
+with timer("render"):
+    st.plotly_chart(fig_scatter_tv_shows, theme="streamlit", use_container_width=True)
 
-# Plot a scatterplot for movies on Netflix - release_year on x-axis and duration on y-axis
-fig_scatter_movies = px.scatter(
-    netflix_movies,
-    x="release_year",
-    y="duration",
-    title="Distribution of duration of Movies against the year of release",
-    height=800,
+# -------------------------------------------------------------------------------------------------
+# Quantile bands of the duration per release year - read from the sketches compiled
+# with the snapshot, so their cost does not depend on the number of titles
+st.subheader("Quantiles of the duration per year of release")
+st.write(
+    """The bands below show the 5th - 95th and 25th - 75th percentiles 
+    of the duration of the titles released every year, and the line 
+    their median duration.
+    """
 )
-fig_scatter_movies.update_layout(yaxis_title="Duration (in mins)")
-fig_scatter_movies.update_layout(xaxis_title="Year of Release")
-st.plotly_chart(fig_scatter_movies, theme="streamlit", use_container_width=True)
 
-# Plot a scatterplot for movies on Netflix - release_year on x-axis and duration on y-axis
-fig_scatter_tv_shows = px.scatter(
-    netflix_tv_shows,
-    x="release_year",
-    y="duration",
-    title="Distribution of duration of TV shows against the year of release",
-    height=800,
-)
-fig_scatter_tv_shows.update_layout(yaxis_title="Duration (no of seasons)")
-fig_scatter_tv_shows.update_layout(xaxis_title="Year of Release")
-st.plotly_chart(fig_scatter_tv_shows, theme="streamlit", use_container_width=True)
+fig_bands_movies = get_movies_bands(catalog_filter)
+with timer("render"):
+    st.plotly_chart(fig_bands_movies, theme="streamlit", use_container_width=True)
+
+fig_bands_tv_shows = get_tv_shows_bands(catalog_filter)
+with timer("render"):
+    st.plotly_chart(fig_bands_tv_shows, theme="streamlit", use_container_width=True)
 
 # -------------------------------------------------------------------------------------------------
 # Conclusions
@@ -0,0 +1,81 @@
+import streamlit as st
+import pandas as pd
+
+from netflix.loader import get_netflix_data
+from netflix.metrics import set_current_page, timer
+from netflix.search import search_titles
+from netflix.sidebar import render_dataset_version
+from netflix.similarity import find_similar_titles
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("similar_titles")
+
+# Show the version of the dataset served - it changes when the data file is reloaded
+render_dataset_version()
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+MAX_NUMBER_OF_SEARCH_RESULTS = 50
+NUMBERS_OF_SIMILAR_TITLES = [5, 10, 25, 50]
+DEFAULT_NUMBER_OF_SIMILAR_TITLES = 10
+COLUMNS = ["type", "title", "director", "release_year", "listed_in", "description"]
+
+# Get the shared DataFrame - the data file is parsed once per server process
+netflix_data = get_netflix_data(COLUMNS)
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+
+
+# Function to get the label of a title in the list of search results
+def get_title_label(row_position: int) -> str:
+    row = netflix_data.iloc[row_position]
+    return f"{row['title']} ({row['type']}, {row['release_year']})"
+
+
+# -------------------------------------------------------------------------------------------------
+st.title("Similar Titles on :red[Netflix]")
+
+st.write(
+    """Pick a movie or tv show to find the titles most similar to it. Titles are
+    compared on the words of their **description**, their **genres**, their
+    **cast** and their **director**."""
+)
+
+search_query = st.text_input(
+    "Search the title to start from", key="similar_titles_search"
+)
+if search_query.strip():
+    row_positions, _ = search_titles(search_query, MAX_NUMBER_OF_SEARCH_RESULTS)
+else:
+    row_positions = []
+
+if not len(row_positions):
+    if search_query.strip():
+        st.caption("No matching titles")
+else:
+    row_position = st.selectbox(
+        "Select the title",
+        [int(position) for position in row_positions],
+        format_func=get_title_label,
+        key="similar_titles_select_title",
+    )
+    no_of_similar_titles = st.selectbox(
+        "Select the number of similar titles",
+        NUMBERS_OF_SIMILAR_TITLES,
+        index=NUMBERS_OF_SIMILAR_TITLES.index(DEFAULT_NUMBER_OF_SIMILAR_TITLES),
+        key="similar_titles_select_count",
+    )
+    is_approximate = st.checkbox(
+        "Use approximate search? (faster on very large catalogs)",
+        False,
+        key="similar_titles_approximate",
+    )
+
+    similar_positions, similarities = find_similar_titles(
+        row_position, no_of_similar_titles, approximate=is_approximate
+    )
+    similar_titles = netflix_data.iloc[similar_positions].reset_index(drop=True)
+    similar_titles.insert(0, "similarity", pd.Series(similarities).round(3))
+    with timer("render"):
+        st.dataframe(similar_titles)
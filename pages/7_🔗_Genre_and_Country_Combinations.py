@@ -0,0 +1,70 @@
+import streamlit as st
+
+from netflix.cooccurrence import (
+    COOCCURRENCE_PAIRS,
+    DEFAULT_PAIR,
+    DEFAULT_TOP_N,
+    get_cooccurrence_matrix,
+)
+from netflix.figures import get_cooccurrence_heatmap
+from netflix.metrics import set_current_page, timer
+from netflix.sidebar import render_filter_sidebar
+
+# Label the timings of this run with the page - see the diagnostics on the home page
+set_current_page("cooccurrence")
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+MIN_TOP_N = 5
+MAX_TOP_N = 40
+
+# Get the filter selected in the sidebar - it is kept across pages
+catalog_filter = render_filter_sidebar()
+
+# -------------------------------------------------------------------------------------------------
+st.title(":link: Genre and Country Combinations on :red[Netflix]")
+
+st.write(
+    """Most titles are listed in several genres and many are produced in
+    several countries. Let's count how often two genres, or a genre and a
+    country, come together on the same title to find the combinations
+    Netflix relies on. Use the sidebar to restrict the titles counted,
+    e.g. to movies or to a range of release years.
+    """
+)
+
+pair = st.radio(
+    "Combinations",
+    list(COOCCURRENCE_PAIRS),
+    index=list(COOCCURRENCE_PAIRS).index(DEFAULT_PAIR),
+    horizontal=True,
+)
+top_n = st.slider(
+    "Number of genres and countries shown",
+    min_value=MIN_TOP_N,
+    max_value=MAX_TOP_N,
+    value=DEFAULT_TOP_N,
+)
+
+# -------------------------------------------------------------------------------------------------
+# Create subtabs
+subtab_heatmap, subtab_data = st.tabs(["**Heatmap**", "**Data**"])
+
+with subtab_heatmap:
+    fig_cooccurrence = get_cooccurrence_heatmap(catalog_filter, pair, top_n)
+    with timer("render"):
+        st.plotly_chart(fig_cooccurrence, theme="streamlit", use_container_width=True)
+    if COOCCURRENCE_PAIRS[pair][0] == COOCCURRENCE_PAIRS[pair][1]:
+        st.caption(
+            "The genres are sorted by their number of titles - the diagonal is "
+            "left blank, see the Data tab for the number of titles of every genre."
+        )
+
+with subtab_data:
+    st.subheader("Number of titles per combination")
+    row_column, column_column = COOCCURRENCE_PAIRS[pair]
+    cooccurrence_counts = get_cooccurrence_matrix(
+        row_column, column_column, catalog_filter
+    ).get_top(top_n)
+    with timer("render"):
+        st.dataframe(cooccurrence_counts)
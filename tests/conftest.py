@@ -0,0 +1,29 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The tests import the netflix package from the project root, and never start
+# the background warm-up or the watcher of the data file
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("NETFLIX_WARMUP", "0")
+os.environ.setdefault("NETFLIX_RELOAD_INTERVAL", "0")
+
+
+# A data file of its own, served by a loader without any dataset version yet - the
+# test writes the file before loading anything
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    from netflix import loader
+
+    data_file = tmp_path / loader.CLEAN_DATA_FILE.name
+    monkeypatch.setattr(loader, "CLEAN_DATA_FILE", data_file)
+    monkeypatch.setattr(loader, "VERSIONS_DIR", tmp_path / "versions")
+    for name in ["_netflix_data", "_load_locks", "_load_stats", "_dataset_versions"]:
+        monkeypatch.setattr(loader, name, {})
+    monkeypatch.setattr(loader, "_dataset_files", {})
+    monkeypatch.setattr(loader, "_active_version", None)
+    monkeypatch.setattr(loader, "_live_versions", frozenset())
+    yield data_file
+    loader.unpin_dataset_version()
@@ -0,0 +1,16 @@
+from netflix.aggregates import get_counts, get_counts_by_type
+from netflix.loader import get_netflix_data
+from netflix.schema import UNKNOWN
+
+
+# The titles without a year_added are counted in an Unknown bin, so the counts of
+# every dimension add up to the number of titles
+def test_counts_keep_unknown_years_added():
+    netflix_data = get_netflix_data(["type", "release_year", "year_added", "rating"])
+    for dimension in ["release_year", "year_added", "rating"]:
+        assert get_counts(dimension)["count"].sum() == len(netflix_data)
+
+    counts_by_type = get_counts_by_type("year_added")
+    assert counts_by_type.index[-1] == UNKNOWN
+    unknown_counts = netflix_data[netflix_data["year_added"].isna()]["type"]
+    assert counts_by_type.loc[UNKNOWN].fillna(0).sum() == len(unknown_counts) > 0
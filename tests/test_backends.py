@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from netflix.backends import PandasBackend, QueryBackend, create_query_backend
+from netflix.filters import CatalogFilter
+from netflix.loader import CLEAN_DATA_FILE
+from netflix.snapshot import compile_snapshot
+
+FILTERS = [
+    None,
+    CatalogFilter(types=("Movie",)),
+    CatalogFilter(countries=("India",), release_years=(2010, 2020)),
+    CatalogFilter(genres=("Dramas", "Comedies"), years_added=(2018, 2021)),
+    CatalogFilter(types=("TV Show",), ratings=("TV-MA", "TV-14")),
+]
+DURATIONS = [("Movie", "duration_minutes"), ("TV Show", "season_count")]
+
+# Durations of some rows that cannot be parsed - a missing one included
+MALFORMED_DURATIONS = {10: "", 20: "1 hr", 30: "45 mins"}
+
+# Pages of the explorer - (page number, page size, columns, sort by, ascending)
+PAGES = [
+    (1, 25, None, None, True),
+    (120, 25, ["title", "type"], None, True),
+    (121, 25, ["title"], None, True),
+    (3, 50, ["title", "rating"], "rating", False),
+    (40, 50, ["show_id", "title"], "title", True),
+    (2, 100, ["title", "date_added"], "date_added", True),
+    (30, 100, ["title", "date_added"], "date_added", False),
+    (5, 20, ["release_year", "director"], "director", False),
+]
+
+
+# The query backends of a catalog with a fresh snapshot - every engine installed
+@pytest.fixture
+def query_backends(data_file):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False)
+    raw_rows = raw_rows.iloc[:3000]
+    raw_rows.loc[MALFORMED_DURATIONS.keys(), "duration"] = list(
+        MALFORMED_DURATIONS.values()
+    )
+    raw_rows.to_csv(data_file, index=False)
+    compile_snapshot(data_file)
+    query_backends = {"pandas": PandasBackend()}
+    for name in ["duckdb", "polars"]:
+        pytest.importorskip(name)
+        query_backends[name] = create_query_backend(name)
+        assert query_backends[name].name == name
+    return query_backends
+
+
+# Function to sort the rows of a frame, so engines returning rows in another
+# order compare equal
+def _sort_rows(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.sort_values(list(frame.columns), kind="stable").reset_index(drop=True)
+
+
+# A backend must implement every query of the pages
+def test_query_backend_is_abstract():
+    with pytest.raises(TypeError):
+        QueryBackend()
+
+
+# Every engine returns the same cubes, daily counts, durations, row count and
+# malformed durations as pandas
+@pytest.mark.parametrize("catalog_filter", FILTERS)
+def test_query_backends_agree(query_backends, catalog_filter):
+    pandas_backend = query_backends["pandas"]
+    expected_cube = _sort_rows(pandas_backend.get_count_cube(catalog_filter))
+    expected_daily_counts = _sort_rows(pandas_backend.get_daily_counts(catalog_filter))
+    assert len(expected_cube)
+    for name, query_backend in query_backends.items():
+        pd.testing.assert_frame_equal(
+            _sort_rows(query_backend.get_count_cube(catalog_filter)), expected_cube
+        )
+        pd.testing.assert_frame_equal(
+            _sort_rows(query_backend.get_daily_counts(catalog_filter)),
+            expected_daily_counts,
+        )
+        for content_type, duration_column in DURATIONS:
+            pd.testing.assert_frame_equal(
+                _sort_rows(
+                    query_backend.get_durations(
+                        content_type, duration_column, catalog_filter
+                    )
+                ),
+                _sort_rows(
+                    pandas_backend.get_durations(
+                        content_type, duration_column, catalog_filter
+                    )
+                ),
+            )
+        assert query_backend.get_row_count() == 3000
+        pd.testing.assert_series_equal(
+            _sort_rows(query_backend.get_malformed_durations().to_frame())["duration"],
+            _sort_rows(pandas_backend.get_malformed_durations().to_frame())["duration"],
+        )
+
+
+# Every engine returns the same pages of rows as pandas, sorted or not
+@pytest.mark.parametrize("page", PAGES)
+def test_query_backend_pages_agree(query_backends, page):
+    expected_page = query_backends["pandas"].get_page(*page)
+    assert len(expected_page) == (0 if page[0] == 121 else page[1])
+    for name, query_backend in query_backends.items():
+        pd.testing.assert_frame_equal(query_backend.get_page(*page), expected_page)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from netflix import diff
+from netflix.aggregates import COUNT_COLUMN
+from netflix.diff import KEY_COLUMN, KEY_HASH_KEYS, diff_catalogs
+from netflix.loader import CLEAN_DATA_FILE, read_netflix_data
+
+NO_OF_ROWS = 200
+REMOVED_ROWS = [0, 17, 42, 99, 150]
+ADDED_ROWS = list(range(NO_OF_ROWS, NO_OF_ROWS + 7))
+
+
+@pytest.fixture(scope="module")
+def raw_data():
+    return pd.read_csv(
+        CLEAN_DATA_FILE, dtype=str, keep_default_na=False, nrows=NO_OF_ROWS + 10
+    )
+
+
+# Two small versions of a catalog - titles removed, added and modified - written
+# to CSV files
+@pytest.fixture
+def catalog_paths(raw_data, tmp_path):
+    old_data = raw_data.iloc[:NO_OF_ROWS].copy()
+    new_data = pd.concat([old_data.drop(index=REMOVED_ROWS), raw_data.iloc[ADDED_ROWS]])
+    new_data.loc[[1, 2], "rating"] = "NC-17"
+    new_data.loc[[3, 4], "release_year"] = "1950"
+    new_data.loc[5, "description"] = "A new description"
+    old_path, new_path = tmp_path / "old.csv", tmp_path / "new.csv"
+    old_data.to_csv(old_path, index=False)
+    new_data.sample(frac=1, random_state=0).to_csv(new_path, index=False)
+    return old_path, new_path
+
+
+# Function to count the titles of a catalog per value of a dimension and type
+def _count_by_type(catalog_path, dimension: str) -> pd.DataFrame:
+    netflix_data = read_netflix_data(catalog_path, ["type", dimension])
+    return (
+        netflix_data.astype(object)
+        .groupby([dimension, "type"], dropna=False)
+        .size()
+        .unstack(fill_value=0)
+    )
+
+
+# Function to check the titles and delta counts of the diff of catalog_paths
+def _check_diff(catalog_diff, raw_data) -> None:
+    assert sorted(catalog_diff.added[KEY_COLUMN]) == sorted(
+        raw_data.iloc[ADDED_ROWS][KEY_COLUMN]
+    )
+    assert sorted(catalog_diff.removed[KEY_COLUMN]) == sorted(
+        raw_data.iloc[REMOVED_ROWS][KEY_COLUMN]
+    )
+    modified = catalog_diff.modified.set_index(KEY_COLUMN)["changed_columns"]
+    assert modified.to_dict() == {
+        raw_data.loc[1, KEY_COLUMN]: "rating",
+        raw_data.loc[2, KEY_COLUMN]: "rating",
+        raw_data.loc[3, KEY_COLUMN]: "release_year",
+        raw_data.loc[4, KEY_COLUMN]: "release_year",
+        raw_data.loc[5, KEY_COLUMN]: "description",
+    }
+    assert catalog_diff.unchanged_rows == NO_OF_ROWS - len(REMOVED_ROWS) - 5
+
+
+# The diff has the titles added, removed and modified, and its delta counts are
+# the counts of the new catalog minus the ones of the old catalog
+def test_diff_catalogs(catalog_paths, raw_data):
+    old_path, new_path = catalog_paths
+    catalog_diff = diff_catalogs(old_path, new_path)
+    _check_diff(catalog_diff, raw_data)
+
+    delta_counts = catalog_diff.get_delta_counts_by_type("type")
+    type_counts = (
+        _count_by_type(new_path, "type").sum() - _count_by_type(old_path, "type").sum()
+    )
+    for content_type, delta_count in type_counts.items():
+        assert delta_counts[content_type].sum() == delta_count
+    assert catalog_diff.delta_cube[COUNT_COLUMN].sum() == len(ADDED_ROWS) - len(
+        REMOVED_ROWS
+    )
+
+    for dimension in ["release_year", "rating"]:
+        expected_counts = _count_by_type(new_path, dimension).sub(
+            _count_by_type(old_path, dimension), fill_value=0
+        )
+        expected_counts = expected_counts[(expected_counts != 0).any(axis=1)]
+        delta_counts = catalog_diff.get_delta_counts_by_type(dimension)
+        for content_type in expected_counts.columns:
+            expected = expected_counts[content_type]
+            actual = delta_counts.get(content_type, pd.Series(dtype="int64"))
+            actual = actual.reindex(expected.index.astype(actual.index.dtype))
+            assert np.array_equal(actual.fillna(0).to_numpy(), expected.to_numpy())
+
+
+# A duplicated show_id is reported with its value
+def test_duplicated_show_ids_are_reported(raw_data, tmp_path):
+    old_path = tmp_path / "old.csv"
+    pd.concat([raw_data.iloc[:20], raw_data.iloc[[7]]]).to_csv(old_path, index=False)
+    with pytest.raises(ValueError, match=raw_data.loc[7, KEY_COLUMN]):
+        diff_catalogs(old_path, old_path)
+
+
+# Different show_ids sharing a hash are told apart by their values - in a catalog
+# by hashing them again with another key, and across catalogs by reading them
+def test_show_ids_sharing_a_hash(catalog_paths, raw_data, monkeypatch):
+    hash_values = diff._hash_values
+    removed_id = raw_data.loc[REMOVED_ROWS[0], KEY_COLUMN]
+    added_id = raw_data.loc[ADDED_ROWS[0], KEY_COLUMN]
+
+    # With the first hash key every show_id of a catalog shares one of 16 hashes
+    def colliding_hash_values(values, hash_key=KEY_HASH_KEYS[0]):
+        hashes = hash_values(values, hash_key)
+        if getattr(values, "name", None) == KEY_COLUMN and hash_key == KEY_HASH_KEYS[0]:
+            return hashes % np.uint64(16)
+        return hashes
+
+    monkeypatch.setattr(diff, "_hash_values", colliding_hash_values)
+    _check_diff(diff_catalogs(*catalog_paths), raw_data)
+
+    # An added title sharing the hash of a removed one
+    def shared_hash_values(values, hash_key=KEY_HASH_KEYS[0]):
+        hashes = hash_values(values, hash_key)
+        if getattr(values, "name", None) == KEY_COLUMN:
+            is_added = (values.astype(object) == added_id).to_numpy()
+            hashes = hashes.copy()
+            hashes[is_added] = hash_values(pd.Series([removed_id]), hash_key)[0]
+        return hashes
+
+    monkeypatch.setattr(diff, "_hash_values", shared_hash_values)
+    _check_diff(diff_catalogs(*catalog_paths), raw_data)
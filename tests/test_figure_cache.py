@@ -0,0 +1,92 @@
+import plotly.graph_objects as go
+import pytest
+
+from netflix import charts, figure_cache
+from netflix.figure_cache import get_cached_figure
+from netflix.filters import CatalogFilter
+
+
+# An empty in-memory cache, and no disk cache
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(figure_cache, "_figures", figure_cache.OrderedDict())
+    monkeypatch.setattr(figure_cache, "_cache_bytes", 0)
+    monkeypatch.setattr(figure_cache, "CACHE_DIR", None)
+
+
+# Builder of figures that counts its calls - every figure has bars of its own
+class FigureBuilder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self) -> go.Figure:
+        self.calls += 1
+        return go.Figure(go.Bar(x=[1, 2, 3], y=[self.calls] * 3))
+
+
+# Function to get a figure of the test page from the cache
+def _get_figure(build, chart_id="chart", catalog_filter=None, histnorm=None):
+    return get_cached_figure("page", chart_id, build, catalog_filter, histnorm=histnorm)
+
+
+# A figure is only rebuilt when its filter, parameters, settings or dataset
+# version change
+def test_figure_cache_key(monkeypatch):
+    build = FigureBuilder()
+    figure = _get_figure(build)
+    assert _get_figure(build) is figure
+    assert _get_figure(build, catalog_filter=CatalogFilter()) is figure
+    assert build.calls == 1
+
+    movies = CatalogFilter(types=("Movie",))
+    for changed_call in [
+        lambda: _get_figure(build, histnorm="percent"),
+        lambda: _get_figure(build, catalog_filter=movies),
+        lambda: _get_figure(build, chart_id="other_chart"),
+    ]:
+        calls = build.calls
+        assert changed_call() is not figure
+        assert build.calls == calls + 1
+        assert changed_call() is changed_call()
+        assert build.calls == calls + 1
+
+    monkeypatch.setattr(charts, "SERVER_SIDE_BINNING", not charts.SERVER_SIDE_BINNING)
+    assert _get_figure(build) is not figure
+    monkeypatch.setattr(figure_cache, "get_dataset_version", lambda: "other")
+    assert _get_figure(build) is not figure
+    assert build.calls == 6
+
+
+# The least recently used figures are evicted to stay within MAX_CACHE_BYTES
+def test_figure_cache_eviction(monkeypatch):
+    build = FigureBuilder()
+    spec_bytes = len(build().to_json())
+    monkeypatch.setattr(figure_cache, "MAX_CACHE_BYTES", 2 * spec_bytes)
+    first, second = _get_figure(build, "first"), _get_figure(build, "second")
+    assert _get_figure(build, "first") is first
+    _get_figure(build, "third")
+    assert figure_cache._cache_bytes <= figure_cache.MAX_CACHE_BYTES
+    assert len(figure_cache._figures) == 2
+
+    # The second figure was the least recently used one
+    assert _get_figure(build, "first") is first
+    assert _get_figure(build, "second") is not second
+
+
+# A figure kept on disk is read back after the memory is cleared, and the oldest
+# specs are removed above MAX_DISK_CACHE_BYTES
+def test_figure_disk_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(figure_cache, "CACHE_DIR", str(tmp_path))
+    build = FigureBuilder()
+    figure = _get_figure(build)
+    figure_cache._figures.clear()
+    figure_cache._cache_bytes = 0
+
+    assert _get_figure(build).to_dict() == figure.to_dict()
+    assert build.calls == 1
+
+    spec_bytes = len(figure.to_json())
+    monkeypatch.setattr(figure_cache, "MAX_DISK_CACHE_BYTES", 2 * spec_bytes)
+    for chart_id in ["first", "second", "third"]:
+        _get_figure(build, chart_id)
+    assert len(list(tmp_path.glob("*" + figure_cache.SPEC_SUFFIX))) == 2
@@ -0,0 +1,22 @@
+import numpy as np
+
+from netflix import filters
+from netflix.filters import CatalogFilter, get_filter_mask
+from netflix.loader import get_netflix_data
+
+
+# The masks of single dimensions are kept in a bounded LRU cache, as are the
+# combined masks
+def test_dimension_masks_are_bounded(monkeypatch):
+    monkeypatch.setattr(filters, "MAX_CACHED_DIMENSION_MASKS", 4)
+    monkeypatch.setattr(filters, "MAX_CACHED_MASKS", 4)
+    for release_year in range(2000, 2012):
+        get_filter_mask(CatalogFilter(release_years=(release_year, release_year)))
+    assert len(filters._dimension_masks) <= 4
+    assert len(filters._filter_masks) <= 4
+
+    # The most recently used selections are kept, and an evicted mask is rebuilt
+    assert any(key[2] == (2011, 2011) for key in filters._dimension_masks)
+    mask = get_filter_mask(CatalogFilter(release_years=(2000, 2000)))
+    release_years = get_netflix_data(["release_year"])["release_year"]
+    assert np.array_equal(mask, (release_years == 2000).to_numpy())
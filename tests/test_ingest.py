@@ -0,0 +1,148 @@
+import pandas as pd
+import pytest
+
+from netflix.ingest import IngestStats, get_manifest_path, run_ingest
+from netflix.loader import RAW_DATA_FILE
+
+# Raw rows of the fixture - the first ones of the Kaggle dump, then the ones
+# added by the second version of the dump
+NO_OF_ROWS = 400
+NO_OF_NEW_ROWS = 25
+
+
+@pytest.fixture(scope="module")
+def raw_data() -> pd.DataFrame:
+    return pd.read_csv(
+        RAW_DATA_FILE, dtype=str, keep_default_na=False, nrows=NO_OF_ROWS
+    )
+
+
+@pytest.fixture(scope="module")
+def new_raw_data() -> pd.DataFrame:
+    return pd.read_csv(
+        RAW_DATA_FILE,
+        dtype=str,
+        keep_default_na=False,
+        skiprows=range(1, NO_OF_ROWS + 1),
+        nrows=NO_OF_NEW_ROWS,
+    )
+
+
+# Function to get the second version of the dump - some rows changed, some
+# removed and some added at the end
+def _get_changed_raw_data(
+    raw_data: pd.DataFrame, new_raw_data: pd.DataFrame
+) -> pd.DataFrame:
+    changed_raw_data = raw_data.copy()
+    changed_raw_data.loc[10:19, "rating"] = "TV-MA"
+    changed_raw_data.loc[20:24, "director"] = ""
+    changed_raw_data.loc[25:29, "date_added"] = "January 1, 2022"
+    changed_raw_data.loc[30:34, "duration"] = "1 Season"
+    changed_raw_data = changed_raw_data.drop(index=[0, 5, 50, 51, 52, 399])
+    return pd.concat([changed_raw_data, new_raw_data], ignore_index=True)
+
+
+# Function to ingest a first version of a raw dump, then a second version both
+# incrementally and fully
+#
+# Checks that both runs write the same files, and returns the stats of the
+# incremental run.
+def _ingest_both_ways(
+    tmp_path, raw_data: pd.DataFrame, changed_raw_data: pd.DataFrame
+) -> IngestStats:
+    raw_path = tmp_path / "raw.csv"
+    incremental_path = tmp_path / "incremental.csv"
+    full_path = tmp_path / "full.csv"
+
+    raw_data.to_csv(raw_path, index=False)
+    run_ingest(raw_path, incremental_path, chunksize=64)
+
+    changed_raw_data.to_csv(raw_path, index=False)
+    ingest_stats = run_ingest(
+        raw_path, incremental_path, chunksize=64, incremental=True
+    )
+    run_ingest(raw_path, full_path, chunksize=64)
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(incremental_path, dtype=str, keep_default_na=False),
+        pd.read_csv(full_path, dtype=str, keep_default_na=False),
+    )
+    pd.testing.assert_frame_equal(
+        pd.read_csv(get_manifest_path(incremental_path), dtype=str),
+        pd.read_csv(get_manifest_path(full_path), dtype=str),
+    )
+    return ingest_stats
+
+
+def test_incremental_ingest_equals_full_rebuild(tmp_path, raw_data, new_raw_data):
+    changed_raw_data = _get_changed_raw_data(raw_data, new_raw_data)
+    ingest_stats = _ingest_both_ways(tmp_path, raw_data, changed_raw_data)
+
+    # The rows kept whose content changed, and the new ones, are cleaned again
+    kept_raw_data = changed_raw_data.iloc[: -len(new_raw_data)]
+    old_raw_data = raw_data.set_index("show_id").loc[kept_raw_data["show_id"]]
+    no_of_changed_rows = int(
+        (kept_raw_data.set_index("show_id") != old_raw_data).any(axis=1).sum()
+    )
+    assert no_of_changed_rows > 0
+    assert ingest_stats.rows_read == len(changed_raw_data)
+    assert ingest_stats.rows_removed == 6
+    assert ingest_stats.rows_cleaned == no_of_changed_rows + NO_OF_NEW_ROWS
+    assert ingest_stats.rows_reused == len(changed_raw_data) - ingest_stats.rows_cleaned
+
+
+# The Kaggle dump lists the newest titles first - new rows are written at their
+# position in the raw file, not at the end
+def test_incremental_ingest_keeps_the_raw_order(tmp_path, raw_data):
+    changed_raw_data = raw_data.copy()
+    changed_raw_data.loc[100:104, "description"] = "A new description"
+    changed_raw_data = changed_raw_data.drop(index=[150, 151])
+    changed_raw_data = pd.concat(
+        [
+            changed_raw_data.iloc[:60],
+            raw_data.iloc[:5].assign(show_id=lambda rows: rows["show_id"] + "-new"),
+            changed_raw_data.iloc[60:],
+        ]
+    )
+    ingest_stats = _ingest_both_ways(tmp_path, raw_data.iloc[20:], changed_raw_data)
+    assert ingest_stats.rows_cleaned == 20 + 5 + 5
+    assert ingest_stats.rows_removed == 2
+
+
+# Rows of the previous run moved around in the raw file are rebuilt in full
+def test_incremental_ingest_of_reordered_rows(tmp_path, raw_data):
+    changed_raw_data = pd.concat([raw_data.iloc[200:], raw_data.iloc[:200]])
+    ingest_stats = _ingest_both_ways(tmp_path, raw_data, changed_raw_data)
+    assert ingest_stats.rows_cleaned == len(raw_data)
+
+
+# show_ids match the rows of two runs, so a duplicated one is reported
+def test_incremental_ingest_of_duplicated_show_ids(tmp_path, raw_data):
+    raw_path = tmp_path / "raw.csv"
+    clean_path = tmp_path / "clean.csv"
+    raw_data.to_csv(raw_path, index=False)
+    run_ingest(raw_path, clean_path, chunksize=64)
+
+    pd.concat([raw_data, raw_data.iloc[[7]]]).to_csv(raw_path, index=False)
+    show_id = raw_data.loc[7, "show_id"]
+    with pytest.raises(ValueError, match=f"'{show_id}' at rows 7 and {NO_OF_ROWS}"):
+        run_ingest(raw_path, clean_path, chunksize=64, incremental=True)
+
+    # A full rebuild keeps them, but the next incremental run cannot match them
+    run_ingest(raw_path, clean_path, chunksize=64)
+    with pytest.raises(ValueError, match="manifest"):
+        run_ingest(raw_path, clean_path, chunksize=64, incremental=True)
+
+
+def test_incremental_ingest_without_changes_reuses_every_row(tmp_path, raw_data):
+    raw_path = tmp_path / "raw.csv"
+    clean_path = tmp_path / "clean.csv"
+    raw_data.to_csv(raw_path, index=False)
+    run_ingest(raw_path, clean_path, chunksize=64)
+    clean_data = clean_path.read_text()
+
+    ingest_stats = run_ingest(raw_path, clean_path, chunksize=64, incremental=True)
+
+    assert ingest_stats.rows_cleaned == 0
+    assert ingest_stats.rows_reused == len(raw_data)
+    assert clean_path.read_text() == clean_data
@@ -0,0 +1,21 @@
+import logging
+import socket
+
+from netflix import metrics
+from netflix.metrics import start_metrics_server
+
+
+# A port that cannot be bound is only tried, and reported, once per process
+def test_metrics_server_bind_failure_is_reported_once(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_server_failed", False)
+    with socket.socket() as other_server:
+        other_server.bind(("127.0.0.1", 0))
+        other_server.listen()
+        port = other_server.getsockname()[1]
+        with caplog.at_level(logging.WARNING, logger=metrics.__name__):
+            for _ in range(3):
+                start_metrics_server(port)
+    assert metrics._server is None
+    assert len(caplog.records) == 1
+    assert str(port) in caplog.records[0].getMessage()
@@ -0,0 +1,138 @@
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from netflix import loader, reload
+from netflix.indexes import build_inverted_index, compile_indexes, get_inverted_index
+from netflix.loader import (
+    CLEAN_DATA_FILE,
+    add_dataset_version,
+    get_data_file_version,
+    get_dataset_file,
+    get_dataset_version,
+    get_load_stats,
+    get_netflix_data,
+    pin_dataset_version,
+    read_netflix_data,
+    retire_dataset_version,
+)
+
+
+# Function to replace a data file the way the ingest does - a new file moved over it
+def _replace_data_file(raw_rows: pd.DataFrame, path, mtime_ns: int) -> None:
+    temporary_path = path.with_name(path.name + ".tmp")
+    raw_rows.to_csv(temporary_path, index=False)
+    os.utime(temporary_path, ns=(mtime_ns, mtime_ns))
+    os.replace(temporary_path, path)
+
+
+# A version pinned during the grace period of a reload loads its own file, even
+# for the columns and artifacts it had not loaded before the file was replaced
+def test_lazy_loads_read_the_file_of_their_version(data_file):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False)
+    _replace_data_file(raw_rows.iloc[:300], data_file, 1_600_000_000 * 10**9)
+    compile_indexes(data_file, ["cast"])
+    old_version = pin_dataset_version()
+    assert len(get_netflix_data(["type"])) == 300
+
+    # A new file and its indexes replace the old ones, and a reload adds its version
+    _replace_data_file(raw_rows.iloc[:200], data_file, 1_700_000_000 * 10**9)
+    compile_indexes(data_file, ["cast"])
+    new_version = get_data_file_version(data_file)
+    add_dataset_version(new_version, None)
+
+    old_data = read_netflix_data(get_dataset_file(old_version))
+    assert len(get_netflix_data(["title", "cast"])) == 300
+    assert get_netflix_data(["title"])["title"].equals(old_data["title"])
+    expected_index = build_inverted_index(old_data["cast"], "cast")
+    assert np.array_equal(get_inverted_index("cast").row_ids, expected_index.row_ids)
+    assert get_load_stats(["title"]).rows == 300
+
+    pin_dataset_version(new_version)
+    assert get_dataset_version() == new_version
+    assert len(get_netflix_data(["title"])) == 200
+    assert get_inverted_index("cast").row_ids.max() < 200
+    assert get_load_stats(["title"]).rows == 200
+    assert get_load_stats(["title"]).version == new_version
+
+    # Retiring the old version drops its files, and nothing is loaded for it anymore
+    loader.activate_dataset_version(new_version)
+    old_version_dir = get_dataset_file(old_version).parent
+    retire_dataset_version(old_version)
+    assert not old_version_dir.exists()
+    with pytest.raises(ValueError):
+        get_dataset_file(old_version)
+
+
+# A data file replaced between its version is taken and it is linked is not
+# served under that version
+def test_dataset_version_of_a_replaced_file_is_refused(data_file):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False, nrows=50)
+    _replace_data_file(raw_rows, data_file, 1_600_000_000 * 10**9)
+    pin_dataset_version()
+    _replace_data_file(raw_rows.iloc[:40], data_file, 1_700_000_000 * 10**9)
+    new_version = get_data_file_version(data_file)
+    _replace_data_file(raw_rows.iloc[:30], data_file, 1_800_000_000 * 10**9)
+    with pytest.raises(ValueError):
+        add_dataset_version(new_version, None)
+    assert new_version not in loader.get_live_dataset_versions()
+
+
+# Raised to stop the watcher loop of a test
+class _StopWatching(Exception):
+    pass
+
+
+# A data file whose reload failed is retried, with backoff, until it is swapped in
+def test_failed_reload_is_retried(data_file, monkeypatch):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False, nrows=50)
+    _replace_data_file(raw_rows, data_file, 1_600_000_000 * 10**9)
+    old_version = pin_dataset_version()
+    _replace_data_file(raw_rows.iloc[:40], data_file, 1_700_000_000 * 10**9)
+    new_version = get_data_file_version(data_file)
+
+    # The watcher runs on a fake clock, and stops after 20 seconds
+    clock = [0.0]
+
+    def sleep(seconds: float) -> None:
+        if clock[0] >= 20:
+            raise _StopWatching
+        clock[0] += seconds
+
+    monkeypatch.setattr(
+        reload,
+        "time",
+        SimpleNamespace(
+            sleep=sleep, time=lambda: clock[0], perf_counter=time.perf_counter
+        ),
+    )
+    monkeypatch.setattr(reload, "RELOAD_INTERVAL", 1.0)
+    monkeypatch.setattr(reload.os, "setpriority", lambda *args: None)
+    monkeypatch.setattr(
+        reload, "get_data_file_version", lambda: get_data_file_version(data_file)
+    )
+    monkeypatch.setattr(
+        reload,
+        "get_data_file_path",
+        lambda csv_path=data_file: loader.get_data_file_path(csv_path),
+    )
+
+    # The first three builds of the new version fail
+    build_times = []
+
+    def build_dataset_version(dataset_version: str) -> None:
+        build_times.append(clock[0])
+        if len(build_times) <= 3:
+            raise RuntimeError("Build failed")
+
+    monkeypatch.setattr(reload, "build_dataset_version", build_dataset_version)
+    with pytest.raises(_StopWatching):
+        reload._watch_data_file()
+
+    assert build_times == [1.0, 2.0, 4.0, 8.0]
+    assert loader.get_active_dataset_version() == new_version
+    assert old_version in loader.get_live_dataset_versions()
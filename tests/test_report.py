@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pandas as pd
+
+from netflix.loader import CLEAN_DATA_FILE
+from netflix.report import REPORT_FILE, export_reports, get_report_names
+
+
+# Every catalog gets its own report name, even when the file names and their
+# directories are the same
+def test_report_names_are_unique():
+    assert get_report_names([Path("/data/us.csv"), Path("/data/in.csv")]) == [
+        "us",
+        "in",
+    ]
+    assert get_report_names([Path("/us/data.csv"), Path("/in/data.csv")]) == [
+        "us_data",
+        "in_data",
+    ]
+    assert get_report_names([Path("/a/x/data.csv"), Path("/b/x/data.csv")]) == [
+        "x_data",
+        "x_data_2",
+    ]
+    assert get_report_names([Path("foo.csv"), Path("foo.arrow")]) == [
+        "foo",
+        "foo_2",
+    ]
+    names = get_report_names(
+        [Path("/a/Foo.csv"), Path("/b/foo.csv"), Path("foo_2.csv"), Path("/c/foo.csv")]
+    )
+    assert len({name.casefold() for name in names}) == 4
+
+
+# Catalogs with the same directory and file names are reported separately
+def test_export_reports_of_catalogs_with_the_same_names(tmp_path):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False)
+    catalog_paths = []
+    for region, no_of_rows in [("a", 100), ("b", 50)]:
+        catalog_path = tmp_path / region / "monthly" / "data.csv"
+        catalog_path.parent.mkdir(parents=True)
+        raw_rows.iloc[:no_of_rows].to_csv(catalog_path, index=False)
+        catalog_paths.append(catalog_path)
+
+    reports = export_reports(catalog_paths, tmp_path / "reports", processes=1)
+    assert [report.name for report in reports] == ["monthly_data", "monthly_data_2"]
+    assert [report.rows for report in reports] == [100, 50]
+    for report in reports:
+        assert (tmp_path / "reports" / report.name / REPORT_FILE).exists()
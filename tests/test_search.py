@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from netflix.search import (
+    BM25_B,
+    BM25_K1,
+    TITLE_WEIGHT,
+    build_search_index,
+    search_titles,
+    tokenize,
+)
+
+CORPUS = pd.DataFrame(
+    {
+        "title": [
+            "Space Cowboys",
+            "The Cook",
+            "Lost in Space, Again!",
+            "Ocean Deep",
+            None,
+        ],
+        "description": [
+            "Retired pilots go back to orbit.",
+            "A chef travels through space and time to cook one last meal.",
+            "A family is lost in space.",
+            "Divers explore the ocean, the deep ocean and its space.",
+            "A cook without a title.",
+        ],
+    }
+)
+
+
+# Function to score every doc of CORPUS for a query, term by term as in BM25
+def _get_bm25_scores(query_terms) -> np.ndarray:
+    docs = [
+        tokenize(pd.Series([title])).tolist() * TITLE_WEIGHT
+        + tokenize(pd.Series([description])).tolist()
+        for title, description in zip(CORPUS["title"], CORPUS["description"])
+    ]
+    doc_lengths = np.array([len(doc) for doc in docs])
+    scores = np.zeros(len(docs))
+    for term in query_terms:
+        term_counts = np.array([doc.count(term) for doc in docs])
+        doc_frequency = (term_counts > 0).sum()
+        idf = np.log1p((len(docs) - doc_frequency + 0.5) / (doc_frequency + 0.5))
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / doc_lengths.mean())
+        scores += idf * term_counts * (BM25_K1 + 1) / (term_counts + length_norm)
+    return scores
+
+
+# Tokens are lowercase runs of letters and digits, one row per token of every text
+def test_tokenize():
+    tokens = tokenize(
+        pd.Series(["Lost in Space, Again!", None, "R2-D2"], index=[5, 6, 7])
+    )
+    assert tokens.tolist() == ["lost", "in", "space", "again", "r2", "d2"]
+    assert tokens.index.tolist() == [0, 0, 0, 0, 2, 2]
+
+
+# The postings of every term list its docs in order, with their term counts
+def test_search_index_postings():
+    search_index = build_search_index(CORPUS)
+    assert list(search_index.terms) == sorted(search_index.terms)
+    position = int(np.searchsorted(search_index.terms, "space"))
+    start, stop = search_index.offsets[position], search_index.offsets[position + 1]
+    assert search_index.doc_ids[start:stop].tolist() == [0, 1, 2, 3]
+    assert search_index.term_counts[start:stop].tolist() == [
+        TITLE_WEIGHT,
+        1,
+        TITLE_WEIGHT + 1,
+        1,
+    ]
+    assert search_index.doc_lengths[0] == 2 * TITLE_WEIGHT + 6
+
+
+# Matches are ranked by their BM25 score, ties by position
+def test_search_ranking():
+    search_index = build_search_index(CORPUS)
+    for query, query_terms in [
+        ("space", ["space"]),
+        ("Deep OCEAN", ["deep", "ocean"]),
+        ("cook space space", ["cook", "space"]),
+    ]:
+        expected_scores = _get_bm25_scores(query_terms)
+        doc_ids, scores = search_index.search(query)
+        expected_doc_ids = np.lexsort((np.arange(len(CORPUS)), -expected_scores))
+        expected_doc_ids = expected_doc_ids[expected_scores[expected_doc_ids] > 0]
+        assert doc_ids.tolist() == expected_doc_ids.tolist()
+        assert np.allclose(scores, expected_scores[doc_ids], rtol=1e-5)
+
+    # A title match outweighs a description match, and only the best are kept
+    doc_ids, _ = search_index.search("space")
+    assert sorted(doc_ids[:2]) == [0, 2]
+    best_doc_ids, _ = search_index.search("space", no_of_results=2)
+    assert best_doc_ids.tolist() == doc_ids[:2].tolist()
+
+
+# A query without any indexed term matches nothing
+def test_search_without_matches():
+    search_index = build_search_index(CORPUS)
+    for query in ["", "!!!", "zebra", "spaces"]:
+        doc_ids, scores = search_index.search(query)
+        assert len(doc_ids) == len(scores) == 0
+    doc_ids, scores = search_titles("qwxzvk")
+    assert len(doc_ids) == len(scores) == 0
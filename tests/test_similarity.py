@@ -0,0 +1,76 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from netflix.loader import CLEAN_DATA_FILE
+from netflix.similarity import (
+    compile_title_vectors,
+    find_similar_titles,
+    find_similar_titles_batch,
+    get_title_vectors,
+    measure_approximate_search,
+    read_title_vectors,
+)
+
+NO_OF_QUERIES = 200
+
+
+@pytest.fixture(scope="module")
+def row_ids():
+    no_of_titles = get_title_vectors().shape[0]
+    return np.random.RandomState(0).choice(no_of_titles, NO_OF_QUERIES, replace=False)
+
+
+# Exact search ranks the titles by their exact cosine similarity
+def test_exact_search_matches_cosine(row_ids):
+    title_vectors = get_title_vectors()
+    best_ids, best_scores = find_similar_titles_batch(row_ids, 10)
+
+    similarities = (title_vectors[row_ids] @ title_vectors.T).toarray()
+    similarities[np.arange(len(row_ids)), row_ids] = -np.inf
+    expected_scores = -np.sort(-similarities, axis=1)[:, :10]
+    np.testing.assert_allclose(best_scores, expected_scores, atol=1e-6)
+    np.testing.assert_allclose(
+        np.take_along_axis(similarities, best_ids, axis=1), best_scores, atol=1e-6
+    )
+    assert not (best_ids == row_ids[:, np.newaxis]).any()
+
+
+# Approximate search finds most of the exact top 10 while comparing a fraction of
+# the catalog
+def test_approximate_search_recall(row_ids):
+    recall, candidate_share = measure_approximate_search(row_ids, 10)
+    assert recall >= 0.85
+    assert candidate_share <= 0.2
+
+    # Its scores are exact, the candidates are only a subset of the titles
+    row_id = int(row_ids[0])
+    best_ids, best_scores = find_similar_titles(row_id, 10, approximate=True)
+    title_vectors = get_title_vectors()
+    scores = (title_vectors[best_ids] @ title_vectors[row_id].T).toarray().ravel()
+    np.testing.assert_allclose(best_scores, scores, atol=1e-6)
+
+
+# The compiled title vectors are read back, memory-mapped, as long as their CSV
+# file is unchanged
+def test_compiled_title_vectors(tmp_path, row_ids):
+    csv_path = tmp_path / CLEAN_DATA_FILE.name
+    shutil.copy(CLEAN_DATA_FILE, csv_path)
+    compile_title_vectors(csv_path)
+
+    title_vectors = read_title_vectors(csv_path)
+    assert (title_vectors != get_title_vectors()).nnz == 0
+    for array in [title_vectors.data, title_vectors.indices, title_vectors.indptr]:
+        assert not array.flags.writeable
+        while not isinstance(array, np.memmap):
+            array = array.base
+    for best_ids, expected_ids in zip(
+        find_similar_titles_batch(row_ids[:20], 10, title_vectors),
+        find_similar_titles_batch(row_ids[:20], 10),
+    ):
+        np.testing.assert_array_equal(best_ids, expected_ids)
+
+    with open(csv_path, "a") as file:
+        file.write("\n")
+    assert read_title_vectors(csv_path) is None
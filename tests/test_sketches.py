@@ -0,0 +1,26 @@
+import pytest
+
+from netflix.figures import get_movies_bands, get_tv_shows_bands
+from netflix.filters import CatalogFilter
+from netflix.sketches import BAND_QUANTILES, get_grouped_sketches
+
+# Filters keeping no title, or no title with a duration of one of the types
+EMPTY_FILTERS = [
+    CatalogFilter(types=("TV Show",), genres=("Dramas",)),
+    CatalogFilter(release_years=(2021, 2021), years_added=(2008, 2008)),
+]
+
+
+# The duration quantiles of an empty selection are empty, and the duration bands
+# of page 5 are empty figures
+@pytest.mark.parametrize("catalog_filter", EMPTY_FILTERS)
+def test_duration_quantiles_of_empty_selections(catalog_filter):
+    duration_quantiles = get_grouped_sketches(
+        "release_year", catalog_filter
+    ).get_duration_quantiles()
+    assert duration_quantiles.empty
+    assert list(duration_quantiles.columns[2:]) == list(BAND_QUANTILES)
+
+    for fig in [get_movies_bands(catalog_filter), get_tv_shows_bands(catalog_filter)]:
+        assert all(len(trace.x) == 0 for trace in fig.data)
+        assert fig.layout.annotations
@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+import pytest
+
+from netflix.loader import (
+    CLEAN_DATA_FILE,
+    get_load_stats,
+    get_netflix_data,
+    read_netflix_data,
+)
+from netflix.schema import ALL_COLUMNS, CATALOG_COLUMNS
+from netflix.snapshot import compile_snapshot, get_snapshot_path, read_snapshot
+
+pytest.importorskip("pyarrow")
+
+
+# A small cleaned CSV file and its snapshot
+@pytest.fixture
+def csv_path(data_file):
+    raw_rows = pd.read_csv(CLEAN_DATA_FILE, dtype=str, keep_default_na=False)
+    raw_rows.iloc[:200].to_csv(data_file, index=False)
+    assert compile_snapshot(data_file) == get_snapshot_path(data_file)
+    return data_file
+
+
+# The snapshot holds the same typed catalog as the CSV file
+def test_snapshot_round_trip(csv_path):
+    for columns in [None, ALL_COLUMNS]:
+        pd.testing.assert_frame_equal(
+            read_snapshot(csv_path, columns), read_netflix_data(csv_path, columns)
+        )
+
+
+# Only the requested columns are read, in schema order whatever the order asked
+def test_snapshot_column_projection(csv_path):
+    netflix_data = read_snapshot(csv_path, ["season_count", "type", "release_year"])
+    assert list(netflix_data.columns) == ["type", "release_year", "season_count"]
+    pd.testing.assert_frame_equal(
+        netflix_data,
+        read_netflix_data(csv_path, ["type", "release_year", "season_count"]),
+    )
+    assert list(read_snapshot(csv_path).columns) == CATALOG_COLUMNS
+
+
+# A snapshot of older content is not used - the loader reads the CSV file - but
+# one of the same content touched since compilation still is
+def test_stale_snapshot_falls_back_to_csv(csv_path):
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert read_snapshot(csv_path, ["type"]) is not None
+
+    raw_rows = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    raw_rows.iloc[:150].to_csv(csv_path, index=False)
+    assert read_snapshot(csv_path, ["type"]) is None
+    assert len(get_netflix_data(["type"])) == 150
+    assert get_load_stats(["type"]).source == "csv"